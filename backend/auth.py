@@ -1,7 +1,10 @@
 from datetime import datetime, timedelta
 from typing import Optional
+import hashlib
+import json
+import secrets
+import uuid
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 import os
 from dotenv import load_dotenv
 
@@ -9,21 +12,40 @@ load_dotenv()
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from . import models, schemas, database
+from sqlalchemy.orm import Session, make_transient_to_detached
+from . import models, schemas, database, passwords, profiling, cache
 
 # SECRET_KEY should be in .env in production
 SECRET_KEY = os.getenv("SECRET_KEY", "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+pwd_context = passwords.pwd_context
+
+def _hash_pool_busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server busy, please retry",
+        headers={"Retry-After": "1"},
+    )
+
+def verify_password_and_update(plain_password, hashed_password):
+    """Verify on the hashing pool; also returns a replacement hash if the stored one is outdated."""
+    try:
+        return passwords.verify_and_update(plain_password, hashed_password)
+    except passwords.HashPoolBusy:
+        raise _hash_pool_busy()
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    valid, _ = verify_password_and_update(plain_password, hashed_password)
+    return valid
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    try:
+        return passwords.hash_password(password)
+    except passwords.HashPoolBusy:
+        raise _hash_pool_busy()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -35,6 +57,74 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _refresh_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def _invalid_refresh_token():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def create_refresh_token(db: Session, user_id, family_id=None) -> str:
+    """Stage a new opaque refresh token for the user (caller commits)."""
+    now = datetime.utcnow()
+    # Opportunistically drop this user's expired tokens so the revocation list stays small
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.user_id == user_id,
+        models.RefreshToken.expires_at < now
+    ).delete(synchronize_session=False)
+
+    token = secrets.token_urlsafe(32)
+    db.add(models.RefreshToken(
+        token_hash=_refresh_digest(token),
+        user_id=user_id,
+        family_id=family_id or uuid.uuid4(),
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        revoked=False
+    ))
+    return token
+
+def rotate_refresh_token(db: Session, token: str):
+    """Swap a valid refresh token for a new one. Returns (user, new_refresh_token)."""
+    row = db.query(models.RefreshToken).filter(
+        models.RefreshToken.token_hash == _refresh_digest(token)
+    ).first()
+    if not row or row.expires_at < datetime.utcnow():
+        raise _invalid_refresh_token()
+    # Revoke only if still live: of two concurrent refreshes with one token, exactly one wins
+    claimed = not row.revoked and db.query(models.RefreshToken).filter(
+        models.RefreshToken.token_hash == row.token_hash,
+        models.RefreshToken.revoked.is_(False)
+    ).update({"revoked": True}, synchronize_session=False)
+    if not claimed:
+        # A rotated token came back: assume it leaked and kill every token of that login
+        db.query(models.RefreshToken).filter(
+            models.RefreshToken.family_id == row.family_id
+        ).update({"revoked": True}, synchronize_session=False)
+        db.commit()
+        raise _invalid_refresh_token()
+
+    user = db.query(models.User).filter(models.User.id == row.user_id).first()
+    if user is None:
+        db.rollback()
+        raise _invalid_refresh_token()
+
+    new_token = create_refresh_token(db, row.user_id, row.family_id)
+    db.commit()
+    return user, new_token
+
+def revoke_refresh_token(db: Session, token: str):
+    row = db.query(models.RefreshToken).filter(
+        models.RefreshToken.token_hash == _refresh_digest(token)
+    ).first()
+    if row:
+        db.query(models.RefreshToken).filter(
+            models.RefreshToken.family_id == row.family_id
+        ).update({"revoked": True}, synchronize_session=False)
+        db.commit()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 def get_db():
@@ -50,17 +140,43 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    with profiling.phase("auth"):
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            email: str = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+            token_data = schemas.TokenData(email=email)
+        except JWTError:
             raise credentials_exception
-        token_data = schemas.TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
-    if user is None:
-        raise credentials_exception
+        user = _load_user(db, token_data.email)
+        if user is None:
+            raise credentials_exception
+        return user
+
+# Columns kept in the user cache; the rest (password_hash) load on access if ever needed
+_CACHED_USER_FIELDS = ("id", "email", "display_name", "created_at", "settings")
+
+def _load_user(db: Session, email: str):
+    """The user for a token, from the shared cache when possible (invalidated on any User change)."""
+    key = f"user:{email}"
+    data = cache.get(key)
+    if data is not None:
+        fields = json.loads(data)
+        fields["id"] = uuid.UUID(fields["id"])
+        if fields["created_at"]:
+            fields["created_at"] = datetime.fromisoformat(fields["created_at"])
+        user = models.User(**fields)
+        make_transient_to_detached(user)
+        # Attach without a SELECT so endpoints can still modify and commit it
+        return db.merge(user, load=False)
+
+    user = db.query(models.User).filter(models.User.email == email).first()
+    if user is not None:
+        fields = {name: getattr(user, name) for name in _CACHED_USER_FIELDS}
+        fields["id"] = str(fields["id"])
+        fields["created_at"] = fields["created_at"].isoformat() if fields["created_at"] else None
+        cache.put(key, json.dumps(fields).encode())
     return user
 
 async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
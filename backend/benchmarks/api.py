@@ -0,0 +1,282 @@
+"""End-to-end API benchmark.
+
+Boots the app with uvicorn against a generated dataset (see backend.generate_data) and drives a
+realistic traffic mix from concurrent async clients, each logged in as a different generated
+user. Reports throughput and p50/p95/p99 latency per endpoint and saves everything as JSON so
+runs can be compared across commits.
+
+    python -m backend.benchmarks.api --generate-users 200 --clients 32 --duration 30
+    DATABASE_URL=postgresql://localhost/wm python -m backend.benchmarks.api --users 100000 --workers 4
+    python -m backend.benchmarks.api --compare bench_results/old.json bench_results/new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from ..generate_data import PASSWORD
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (operation, weight) - roughly what the mobile app sends during a day
+TRAFFIC_MIX = [
+    ("login", 2),
+    ("dashboard_me", 8),
+    ("dashboard_nutrition_day", 12),
+    ("dashboard_trends", 8),
+    ("dashboard_plans", 6),
+    ("set_logging", 16),
+    ("food_search", 14),
+    ("food_logging", 10),
+    ("history_workouts", 10),
+    ("history_stats", 6),
+    ("history_exercise", 8),
+]
+
+FOOD_QUERIES = ["chicken", "rice", "egg", "milk", "oat", "beef", "apple", "yogurt", "雞", "飯"]
+
+class Client:
+    def __init__(self, http: httpx.AsyncClient, email: str, rng: random.Random, catalog: dict):
+        self.http = http
+        self.email = email
+        self.rng = rng
+        self.catalog = catalog
+        self.headers = {}
+        self.workout_id = None
+        self.set_order = 0
+
+    async def login(self):
+        resp = await self.http.post("/auth/login", data={"username": self.email, "password": PASSWORD})
+        if resp.status_code == 200:
+            self.headers = {"Authorization": f"Bearer {resp.json()['access_token']}"}
+        return resp
+
+    async def run(self, op: str):
+        rng, http, h = self.rng, self.http, self.headers
+        if op == "login":
+            return await self.login()
+        if op == "dashboard_me":
+            return await http.get("/user/me", headers=h)
+        if op == "dashboard_nutrition_day":
+            return await http.get("/nutrition/day", headers=h)
+        if op == "dashboard_trends":
+            return await http.get("/user/trends", headers=h)
+        if op == "dashboard_plans":
+            return await http.get("/training/plans", headers=h)
+        if op == "set_logging":
+            if self.workout_id is None or self.set_order >= 20:
+                resp = await http.post("/training/session/start", params={"plan_id": "benchmark"}, headers=h)
+                self.workout_id = resp.json()["id"]
+                self.set_order = 0
+            self.set_order += 1
+            return await http.post("/training/set", headers=h, json={
+                "workout_id": self.workout_id,
+                "exercise_id": rng.choice(self.catalog["exercises"]),
+                "set_order": self.set_order,
+                "weight_kg": rng.choice([40, 60, 80, 100]),
+                "reps": rng.randint(5, 12),
+                "rpe": rng.choice([7, 7.5, 8, 8.5, 9]),
+            })
+        if op == "food_search":
+            return await http.get("/nutrition/foods", params={"q": rng.choice(FOOD_QUERIES), "limit": 20})
+        if op == "food_logging":
+            return await http.post("/nutrition/log_from_food", headers=h, params={
+                "food_id": rng.choice(self.catalog["foods"]), "servings": rng.choice([0.5, 1, 1.5, 2]),
+            })
+        if op == "history_workouts":
+            return await http.get("/training/history", headers=h, params={"limit": 20, "offset": rng.choice([0, 0, 20, 40])})
+        if op == "history_stats":
+            return await http.get("/user/history", headers=h, params={"limit": 30, "offset": rng.choice([0, 0, 30])})
+        if op == "history_exercise":
+            return await http.get(f"/training/exercise/{rng.choice(self.catalog['exercises'])}/history", headers=h)
+        raise ValueError(op)
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+async def drive(base_url: str, args) -> dict:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as http:
+        catalog = {
+            "exercises": [e["id"] for e in (await http.get("/training/exercises", params={"limit": 200})).json()],
+            "foods": [f["id"] for f in (await http.get("/nutrition/foods", params={"limit": 200})).json()],
+        }
+        clients = [
+            Client(http, f"user{rng.randrange(args.users)}@example.com", random.Random(rng.random()), catalog)
+            for _ in range(args.clients)
+        ]
+        await asyncio.gather(*(c.login() for c in clients))
+        if not all(c.headers for c in clients):
+            raise SystemExit("Login failed - was the dataset generated with backend.generate_data?")
+
+        ops, weights = zip(*TRAFFIC_MIX)
+        samples = {op: [] for op in ops}
+        errors = {op: 0 for op in ops}
+        measure_from = time.perf_counter() + args.warmup
+        stop_at = measure_from + args.duration
+
+        async def worker(client: Client):
+            while True:
+                now = time.perf_counter()
+                if now >= stop_at:
+                    return
+                op = client.rng.choices(ops, weights)[0]
+                start = time.perf_counter()
+                try:
+                    resp = await client.run(op)
+                    ok = resp.status_code < 400
+                except (httpx.HTTPError, KeyError, ValueError):
+                    ok = False
+                elapsed = time.perf_counter() - start
+                if start >= measure_from:
+                    samples[op].append(elapsed)
+                    if not ok:
+                        errors[op] += 1
+
+        await asyncio.gather(*(worker(c) for c in clients))
+
+    endpoints = {}
+    for op in ops:
+        values = sorted(samples[op])
+        endpoints[op] = {
+            "requests": len(values),
+            "errors": errors[op],
+            "rps": round(len(values) / args.duration, 2),
+            "p50_ms": round(percentile(values, 50) * 1000, 2) if values else None,
+            "p95_ms": round(percentile(values, 95) * 1000, 2) if values else None,
+            "p99_ms": round(percentile(values, 99) * 1000, 2) if values else None,
+        }
+    total = sum(e["requests"] for e in endpoints.values())
+    return {"total_requests": total, "total_rps": round(total / args.duration, 2), "endpoints": endpoints}
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def boot_server(database_url: str, port: int, workers: int) -> subprocess.Popen:
+    # Every simulated user logs in from 127.0.0.1, which the per-IP rate limits would throttle
+    env = dict(os.environ, DATABASE_URL=database_url, RATE_LIMIT_ENABLED="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=REPO_ROOT, env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/").status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        if proc.poll() is not None:
+            raise SystemExit("Server exited during start-up")
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("Server did not start within 60s")
+
+def print_report(result: dict):
+    print(f"{'endpoint':<26} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for op, e in result["endpoints"].items():
+        fmt = lambda v: f"{v:>8.1f}" if v is not None else f"{'-':>8}"
+        print(f"{op:<26} {e['requests']:>7} {e['errors']:>5} {e['rps']:>8.1f} {fmt(e['p50_ms'])} {fmt(e['p95_ms'])} {fmt(e['p99_ms'])}")
+    print(f"{'total':<26} {result['total_requests']:>7} {'':>5} {result['total_rps']:>8.1f}")
+
+def compare(old_path: str, new_path: str):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    print(f"{'endpoint':<26} {'rps':>16} {'p95 ms':>18} {'p99 ms':>18}")
+    for op, n in new["endpoints"].items():
+        o = old["endpoints"].get(op)
+        if not o:
+            continue
+        cells = []
+        for key in ("rps", "p95_ms", "p99_ms"):
+            if o[key] and n[key] is not None:
+                cells.append(f"{n[key]:>8.1f} ({(n[key] / o[key] - 1) * 100:+5.0f}%)")
+            else:
+                cells.append(f"{'-':>16}")
+        print(f"{op:<26} {cells[0]:>16} {cells[1]:>18} {cells[2]:>18}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end API benchmark")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--generate-users", type=int, default=0, help="generate a fresh SQLite dataset with N users")
+    parser.add_argument("--days", type=int, default=180, help="history per generated user")
+    parser.add_argument("--users", type=int, default=None, help="number of users in an existing dataset")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="benchmark an already running server instead of booting one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=os.path.join(REPO_ROOT, "bench_results"))
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    tmpdir = None
+    if args.generate_users:
+        tmpdir = tempfile.mkdtemp(prefix="wm_bench_")
+        args.database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        args.users = args.generate_users
+        subprocess.check_call(
+            [sys.executable, "-m", "backend.generate_data", "--users", str(args.generate_users),
+             "--days", str(args.days), "--database-url", args.database_url],
+            cwd=REPO_ROOT,
+        )
+    if not args.users:
+        parser.error("--users is required with an existing dataset")
+
+    proc = None
+    base_url = args.url
+    if not base_url:
+        if not args.database_url:
+            parser.error("--database-url, DATABASE_URL or --generate-users is required")
+        proc = boot_server(args.database_url, args.port, args.workers)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        result = asyncio.run(drive(base_url, args))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+    result.update({
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "config": {
+            "clients": args.clients, "duration": args.duration, "warmup": args.warmup, "workers": args.workers,
+            "users": args.users, "seed": args.seed,
+            "database": args.database_url.split(":", 1)[0] if args.database_url else "external",
+        },
+    })
+    print_report(result)
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{result['timestamp'].replace(':', '')}_{result['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Login throughput benchmark for the password hashing pool.
+
+Runs argon2 verifications (the CPU cost of one /auth/login) through the same process
+pool the API uses, for increasing worker counts, and reports logins/sec per core.
+
+    python -m backend.benchmarks.password_hashing --logins 200
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from backend import passwords
+
+def run(workers: int, logins: int, hashed: str) -> float:
+    # Threads stand in for request handlers, each blocking on the process pool
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Warm the workers so process start-up is not measured
+        list(pool.map(passwords._verify_and_update, ["x"] * workers, [hashed] * workers))
+        with ThreadPoolExecutor(max_workers=workers * 4) as clients:
+            start = time.perf_counter()
+            results = list(clients.map(
+                lambda _: pool.submit(passwords._verify_and_update, "benchmark-password", hashed).result(),
+                range(logins),
+            ))
+            elapsed = time.perf_counter() - start
+    assert all(valid for valid, _ in results)
+    return logins / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=100, help="verifications per run")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    hashed = passwords._hash("benchmark-password")
+    print(
+        f"argon2 time_cost={passwords.ARGON2_TIME_COST} "
+        f"memory_cost={passwords.ARGON2_MEMORY_COST}KiB parallelism={passwords.ARGON2_PARALLELISM}"
+    )
+    print(f"{'workers':>8} {'logins/s':>10} {'per core':>10}")
+    workers = 1
+    while workers <= args.max_workers:
+        rate = run(workers, args.logins, hashed)
+        print(f"{workers:>8} {rate:>10.1f} {rate / workers:>10.1f}")
+        workers *= 2
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Response serialization micro-benchmark.
+
+Compares how a large /nutrition/foods response was encoded before (raw ORM rows through
+jsonable_encoder + json.dumps) with the slim response model path FastAPI now takes
+(validate from attributes, dump straight to JSON bytes in pydantic-core).
+
+    python -m backend.benchmarks.serialization --sizes 100 1000 10000
+"""
+import argparse
+import json
+import time
+import uuid
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from backend import models, schemas
+
+def make_foods(n: int):
+    return [
+        models.FoodItem(
+            id=uuid.uuid4(),
+            name=f"Food {i}",
+            name_zh=f"食物 {i}",
+            calories=100.0 + i % 400,
+            protein_g=10.5,
+            carbs_g=20.25,
+            fat_g=3.0,
+            serving_size="100g",
+            serving_size_zh="100克",
+            category="protein",
+        )
+        for i in range(n)
+    ]
+
+def before(foods) -> bytes:
+    return json.dumps(jsonable_encoder(foods)).encode()
+
+adapter = TypeAdapter(List[schemas.FoodItem])
+
+def after(foods) -> bytes:
+    return adapter.dump_json(adapter.validate_python(foods, from_attributes=True))
+
+def best_of(fn, foods, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(foods)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'before ms':>10} {'after ms':>10} {'speedup':>8} {'bytes before':>13} {'bytes after':>12}")
+    for n in args.sizes:
+        foods = make_foods(n)
+        t_before = best_of(before, foods, args.repeat)
+        t_after = best_of(after, foods, args.repeat)
+        print(
+            f"{n:>8} {t_before * 1000:>10.2f} {t_after * 1000:>10.2f} {t_before / t_after:>7.1f}x "
+            f"{len(before(foods)):>13} {len(after(foods)):>12}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Time-to-first-request benchmark.
+
+Starts uvicorn repeatedly and measures, from process spawn, how long until a DB-backed
+endpoint first answers 200. Also prints the app's own start-up phase breakdown
+(app_startup_phase_seconds from /metrics) of the last run.
+
+    python -m backend.benchmarks.startup --runs 5
+    DATABASE_URL=postgresql://localhost/wm python -m backend.benchmarks.startup
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def time_to_first_request(port: int, path: str, timeout: float = 60.0):
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=REPO_ROOT,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}{path}").status_code == 200:
+                    elapsed = time.perf_counter() - start
+                    phases = httpx.get(f"http://127.0.0.1:{port}/metrics").text
+                    return elapsed, phases
+            except httpx.HTTPError:
+                pass
+            if proc.poll() is not None:
+                raise SystemExit("Server exited during start-up")
+            time.sleep(0.01)
+        raise SystemExit(f"No response within {timeout:.0f}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time to first request")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--path", default="/training/exercises", help="first request to wait for")
+    args = parser.parse_args()
+
+    timings = []
+    phases = ""
+    for _ in range(args.runs):
+        elapsed, phases = time_to_first_request(args.port, args.path)
+        timings.append(elapsed)
+        print(f"  {elapsed * 1000:.0f} ms")
+    print(f"time to first request: median {statistics.median(timings) * 1000:.0f} ms, min {min(timings) * 1000:.0f} ms")
+    for line in phases.splitlines():
+        if line.startswith("app_startup_phase_seconds{"):
+            print("  " + line)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Shared cache for user lookups, catalog pages, nutrition targets, plan details and AI context.
+
+Two backends, chosen by CACHE_URL:
+
+- memory (default)   in-process LRU with TTLs; right for a single worker
+- redis://host/db    any Redis-compatible server, shared by every worker. Each worker also
+                     keeps a small near-cache (CACHE_LOCAL_TTL) in front of it; deletes are
+                     published on a pub/sub channel so all near-caches drop the key at once.
+                     If the subscription drops, the near-cache is cleared and rebuilt.
+
+Values are bytes (usually ready-to-send JSON). Invalidation is automatic: a session hook
+collects the keys affected by every flushed User, UserStats, Workouts, WorkoutSets, FoodLog,
+DailyLog, TrainingPlan, PlanExercise, Exercises and FoodItem change and deletes them after
+the commit. Code that
+writes with bulk statements (which skip the ORM) calls invalidate_on_commit() itself.
+
+Whole groups (a catalog, one user's targets or plans) are versioned by a generation token
+stored in the cache under gen:<group>; deleting it orphans every key built from it.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from fastapi import Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import metrics, models
+
+logger = logging.getLogger(__name__)
+
+CACHE_URL = os.getenv("CACHE_URL", "memory")
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "30"))
+INVALIDATION_CHANNEL = os.getenv("CACHE_CHANNEL", "workout-monster:cache-invalidate")
+
+class LocalCache:
+    """Thread-safe LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float]):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisCache:
+    """Redis (or compatible) backend with a per-worker near-cache kept coherent via pub/sub."""
+
+    def __init__(self, url: str):
+        import redis  # optional dependency, only needed when CACHE_URL points at Redis
+
+        self._errors = (redis.RedisError, OSError)
+        self.redis = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        # The subscriber blocks waiting for messages, so it gets its own client without a read timeout
+        self.subscriber = redis.Redis.from_url(url, socket_connect_timeout=0.5, health_check_interval=30)
+        self.near = LocalCache(CACHE_MAX_ENTRIES)
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # Started lazily (and again after a fork) so every worker process has its own subscriber
+        if self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid != os.getpid():
+                self._listener_pid = os.getpid()
+                threading.Thread(target=self._listen, name="cache-invalidation", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            pubsub = self.subscriber.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything cached before the subscription was up may have missed a delete
+                self.near.clear()
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.near.delete(json.loads(message["data"]))
+            except self._errors as e:
+                logger.warning("Cache invalidation subscription lost (%s), retrying", e)
+                self.near.clear()
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+    def get(self, key: str) -> Optional[bytes]:
+        self._ensure_listener()
+        value = self.near.get(key)
+        if value is not None:
+            return value
+        try:
+            value = self.redis.get(key)
+        except self._errors as e:
+            logger.warning("Cache get failed: %s", e)
+            return None
+        if value is not None:
+            self.near.set(key, value, CACHE_LOCAL_TTL)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float]):
+        self._ensure_listener()
+        try:
+            self.redis.set(key, value, px=int(ttl * 1000) if ttl else None)
+        except self._errors as e:
+            logger.warning("Cache set failed: %s", e)
+            return
+        self.near.set(key, value, min(ttl, CACHE_LOCAL_TTL) if ttl else CACHE_LOCAL_TTL)
+
+    def delete(self, keys: Iterable[str]):
+        keys = list(keys)
+        self.near.delete(keys)
+        try:
+            self.redis.delete(*keys)
+            self.redis.publish(INVALIDATION_CHANNEL, json.dumps(keys))
+        except self._errors as e:
+            logger.warning("Cache invalidation failed: %s", e)
+
+def _make_backend(url: str):
+    if url == "memory":
+        return LocalCache(CACHE_MAX_ENTRIES)
+    return RedisCache(url)
+
+backend = _make_backend(CACHE_URL)
+
+# ---------- Cache API ----------
+
+def _namespace(key: str) -> str:
+    return key.split(":", 1)[0]
+
+def get(key: str) -> Optional[bytes]:
+    value = backend.get(key)
+    metrics.CACHE_REQUESTS.inc(_namespace(key), "hit" if value is not None else "miss")
+    return value
+
+def put(key: str, value: bytes, ttl: Optional[float] = CACHE_TTL_SECONDS):
+    backend.set(key, value, ttl)
+
+def invalidate(keys: Iterable[str]):
+    keys = list(keys)
+    if keys:
+        backend.delete(keys)
+
+def get_or_set(key: str, build: Callable[[], bytes], ttl: Optional[float] = CACHE_TTL_SECONDS) -> bytes:
+    value = get(key)
+    if value is None:
+        value = build()
+        put(key, value, ttl)
+    return value
+
+def cached_response(key: str, build: Callable, adapter, ttl: Optional[float] = CACHE_TTL_SECONDS) -> Response:
+    """JSON response for key; on a miss build() runs and its result is validated and serialized by
+    the pydantic TypeAdapter, so hits skip the database and serialization entirely."""
+    data = get_or_set(key, lambda: adapter.dump_json(adapter.validate_python(build(), from_attributes=True)), ttl)
+    return Response(data, media_type="application/json")
+
+def generation(group: str) -> str:
+    """Current version token of a group of keys; invalidating generation_key(group) starts a new one."""
+    key = f"gen:{group}"
+    value = backend.get(key)
+    if value is None:
+        # Two workers racing here just produce two short-lived generations
+        value = uuid.uuid4().hex[:12].encode()
+        backend.set(key, value, None)
+    return value.decode()
+
+def generation_key(group: str) -> str:
+    return f"gen:{group}"
+
+# ---------- Invalidation on commit ----------
+
+_PENDING = "cache_invalidations"
+
+def invalidate_on_commit(db: Session, *keys: str):
+    """Delete keys once the session's transaction commits (dropped on rollback)."""
+    db.info.setdefault(_PENDING, set()).update(keys)
+
+def _plan_owner(session: Session, plan_id):
+    plan = session.identity_map.get(session.identity_key(models.TrainingPlan, plan_id))
+    if plan is not None:
+        return plan.user_id
+    return session.execute(
+        select(models.TrainingPlan.user_id).where(models.TrainingPlan.id == plan_id)
+    ).scalar()
+
+def _workout_owner(session: Session, workout_id):
+    workout = session.identity_map.get(session.identity_key(models.Workouts, workout_id))
+    if workout is not None:
+        return workout.user_id
+    return session.execute(
+        select(models.Workouts.user_id).where(models.Workouts.id == workout_id)
+    ).scalar()
+
+def _keys_for(session: Session, obj):
+    if isinstance(obj, models.User):
+        return [f"user:{obj.email}", generation_key(f"targets:{obj.id}"), generation_key(f"aidata:{obj.id}")]
+    if isinstance(obj, (models.UserStats, models.Workouts)):
+        return [generation_key(f"targets:{obj.user_id}"), generation_key(f"aidata:{obj.user_id}")]
+    if isinstance(obj, (models.FoodLog, models.DailyLog)):
+        return [generation_key(f"aidata:{obj.user_id}")]
+    if isinstance(obj, models.WorkoutSets):
+        return [generation_key(f"aidata:{_workout_owner(session, obj.workout_id)}")]
+    if isinstance(obj, models.TrainingPlan):
+        return [generation_key(f"plans:{obj.user_id}")]
+    if isinstance(obj, models.PlanExercise):
+        return [generation_key(f"plans:{_plan_owner(session, obj.plan_id)}")]
+    if isinstance(obj, models.Exercises):
+        return [generation_key("catalog:exercises")]
+    if isinstance(obj, models.FoodItem):
+        return [generation_key("catalog:foods")]
+    return []
+
+def _after_flush(session, flush_context):
+    keys = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        keys.update(_keys_for(session, obj))
+    if keys:
+        invalidate_on_commit(session, *keys)
+
+def _after_commit(session):
+    invalidate(session.info.pop(_PENDING, ()))
+
+def _after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+def install(session_factory):
+    event.listen(session_factory, "after_flush", _after_flush)
+    event.listen(session_factory, "after_commit", _after_commit)
+    event.listen(session_factory, "after_soft_rollback", lambda session, previous: _after_rollback(session))
@@ -0,0 +1,155 @@
+"""AI coach conversation memory.
+
+/ai/chat sends the model the last AI_MEMORY_WINDOW exchanges of the conversation verbatim,
+plus a running summary of everything before them. Once AI_MEMORY_SUMMARY_BATCH exchanges
+have slid out of the window, an ai.summarize job folds just those exchanges into the
+summary (one short LLM call on the delta, never the whole conversation), so prompts stay
+bounded however long a conversation runs.
+
+Each exchange is one row holding zlib-compressed JSON. A user keeps at most
+AI_MEMORY_MAX_CONVERSATIONS conversations and AI_MEMORY_MAX_BYTES of stored exchanges:
+beyond that the least recently used conversations are deleted, then the already-summarized
+exchanges of the current one.
+"""
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from . import jobs, models
+
+AI_MEMORY_WINDOW = int(os.getenv("AI_MEMORY_WINDOW", "6"))
+AI_MEMORY_SUMMARY_BATCH = int(os.getenv("AI_MEMORY_SUMMARY_BATCH", "4"))
+AI_MEMORY_SUMMARY_CHARS = int(os.getenv("AI_MEMORY_SUMMARY_CHARS", "1500"))
+AI_MEMORY_MAX_CONVERSATIONS = int(os.getenv("AI_MEMORY_MAX_CONVERSATIONS", "20"))
+AI_MEMORY_MAX_BYTES = int(os.getenv("AI_MEMORY_MAX_BYTES", str(256 * 1024)))
+
+TITLE_CHARS = 80
+
+def pack(message: str, reply: str) -> bytes:
+    return zlib.compress(json.dumps([message, reply], ensure_ascii=False).encode(), 6)
+
+def unpack(body: bytes) -> tuple:
+    message, reply = json.loads(zlib.decompress(body))
+    return message, reply
+
+def get(db: Session, user_id, conversation_id) -> Optional[models.Conversation]:
+    return db.query(models.Conversation).filter(
+        models.Conversation.id == conversation_id,
+        models.Conversation.user_id == user_id
+    ).first()
+
+def start(db: Session, user_id, first_message: str) -> models.Conversation:
+    now = datetime.utcnow()
+    conversation = models.Conversation(
+        user_id=user_id, title=" ".join(first_message.split())[:TITLE_CHARS],
+        summarized_turns=0, turns=0, bytes=0, created_at=now, updated_at=now,
+    )
+    db.add(conversation)
+    db.flush()
+    return conversation
+
+def window(db: Session, conversation: models.Conversation) -> list:
+    """The recent exchanges as model chat history (oldest first)."""
+    rows = db.execute(
+        select(models.ConversationTurn.body).where(
+            models.ConversationTurn.conversation_id == conversation.id,
+            models.ConversationTurn.seq > conversation.turns - AI_MEMORY_WINDOW
+        ).order_by(models.ConversationTurn.seq)
+    ).scalars().all()
+    history = []
+    for body in rows:
+        message, reply = unpack(body)
+        history.append({"role": "user", "parts": [message]})
+        history.append({"role": "model", "parts": [reply]})
+    return history
+
+def append(db: Session, conversation: models.Conversation, message: str, reply: str):
+    """Store an exchange (staged in db's transaction) and queue the summary and eviction work it makes due."""
+    C = models.Conversation
+    body = pack(message, reply)
+    # Increment in SQL so two messages sent at once cannot take the same seq
+    seq = db.execute(
+        update(C).where(C.id == conversation.id)
+        .values(turns=C.turns + 1, bytes=C.bytes + len(body), updated_at=datetime.utcnow())
+        .returning(C.turns)
+        .execution_options(synchronize_session=False)
+    ).scalar_one()
+    db.add(models.ConversationTurn(conversation_id=conversation.id, seq=seq, body=body, created_at=datetime.utcnow()))
+    db.expire(conversation)
+
+    if seq - AI_MEMORY_WINDOW - (conversation.summarized_turns or 0) >= AI_MEMORY_SUMMARY_BATCH:
+        # The job summarizes whatever has left the window by the time it runs, so one per conversation suffices
+        jobs.enqueue(db, "ai.summarize", {"conversation_id": conversation.id},
+                     user_id=conversation.user_id, key=f"ai.summarize:{conversation.id}")
+    _evict(db, conversation)
+
+def _evict(db: Session, current: models.Conversation):
+    C, T = models.Conversation, models.ConversationTurn
+    kept_bytes, evicted = 0, []
+    for i, (conversation_id, size) in enumerate(db.execute(
+        select(C.id, C.bytes).where(C.user_id == current.user_id).order_by(C.updated_at.desc())
+    )):
+        if conversation_id != current.id and (
+            i >= AI_MEMORY_MAX_CONVERSATIONS or kept_bytes + (size or 0) > AI_MEMORY_MAX_BYTES
+        ):
+            evicted.append(conversation_id)
+        else:
+            kept_bytes += size or 0
+    if evicted:
+        db.execute(delete(T).where(T.conversation_id.in_(evicted)))
+        db.execute(delete(C).where(C.id.in_(evicted)))
+    if kept_bytes > AI_MEMORY_MAX_BYTES and current.summarized_turns:
+        # Still over: the current conversation's summarized exchanges only live on in its summary
+        freed = db.execute(
+            select(func.coalesce(func.sum(func.length(T.body)), 0))
+            .where(T.conversation_id == current.id, T.seq <= current.summarized_turns)
+        ).scalar()
+        if freed:
+            db.execute(delete(T).where(T.conversation_id == current.id, T.seq <= current.summarized_turns))
+            db.execute(update(C).where(C.id == current.id).values(bytes=C.bytes - freed)
+                       .execution_options(synchronize_session=False))
+
+def delete_conversation(db: Session, conversation: models.Conversation):
+    db.execute(delete(models.ConversationTurn).where(models.ConversationTurn.conversation_id == conversation.id))
+    db.delete(conversation)
+
+# ---------- Summaries ----------
+
+def summary_prompt(summary: Optional[str], exchanges: list) -> str:
+    lines = [
+        "You maintain the memory of a fitness coaching chat. Update the summary below with the new "
+        "exchanges. Keep the user's goals, preferences, injuries, plans and anything they asked to be "
+        f"remembered; drop small talk. Reply with the updated summary only, under {AI_MEMORY_SUMMARY_CHARS} "
+        "characters, in the language of the conversation.",
+        "",
+        "Summary so far:",
+        summary or "(none)",
+        "",
+        "New exchanges:",
+    ]
+    for message, reply in exchanges:
+        lines.append(f"User: {message}")
+        lines.append(f"Coach: {reply}")
+    return "\n".join(lines)
+
+def summarize(db: Session, conversation: models.Conversation, generate) -> int:
+    """Fold the exchanges that left the window since the last summary into it, using
+    generate(prompt) -> text; returns how many were folded in."""
+    T = models.ConversationTurn
+    done, upto = conversation.summarized_turns or 0, conversation.turns - AI_MEMORY_WINDOW
+    if upto <= done:
+        return 0
+    exchanges = [
+        unpack(body) for body in db.execute(
+            select(T.body).where(T.conversation_id == conversation.id, T.seq > done, T.seq <= upto).order_by(T.seq)
+        ).scalars()
+    ]
+    if exchanges:
+        conversation.summary = generate(summary_prompt(conversation.summary, exchanges)).strip()[:AI_MEMORY_SUMMARY_CHARS]
+    conversation.summarized_turns = upto
+    return upto - done
@@ -29,3 +29,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def upsert(db, model):
+    """INSERT for model's table that supports .on_conflict_do_update/do_nothing on the session's
+    database (Postgres on Render, SQLite locally)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
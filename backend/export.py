@@ -0,0 +1,194 @@
+"""Full-account data export, streamed.
+
+Each dataset is read through a server-side cursor (stream_results + yield_per), so rows are
+fetched in batches and written straight out. Memory stays flat however many years of
+history the account holds. Two formats:
+
+- ndjson  one JSON object per line, tagged with its dataset: {"type": "workout_sets", ...}
+- csv     a zip archive with one CSV file per dataset, built as the response streams
+
+Credentials kept in the user's settings (SECRET_SETTINGS) are left out of every export.
+
+Used by GET /user/export, and by support from the command line:
+
+    python -m backend.export --email someone@example.com --format csv > export.zip
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import uuid
+import zipfile
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from . import models
+from .database import SessionLocal
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("application/zip", "zip"),
+}
+
+YIELD_PER = 1000
+CHUNK_BYTES = 64 * 1024
+
+# Credentials kept in User.settings: never written to an export
+SECRET_SETTINGS = {"gemini_api_key"}
+
+def _datasets(user_id):
+    """(name, select) for every dataset in the export, in a stable order."""
+    w, s, e = models.Workouts.__table__, models.WorkoutSets.__table__, models.Exercises.__table__
+    p, pe = models.TrainingPlan.__table__, models.PlanExercise.__table__
+    u = models.User.__table__
+    stats, daily, food = models.UserStats.__table__, models.DailyLog.__table__, models.FoodLog.__table__
+    return [
+        ("profile", select(u.c.id, u.c.email, u.c.display_name, u.c.created_at, u.c.settings).where(u.c.id == user_id)),
+        ("user_stats", select(stats).where(stats.c.user_id == user_id).order_by(stats.c.date)),
+        ("workouts", select(w).where(w.c.user_id == user_id).order_by(w.c.start_time)),
+        ("workout_sets", select(
+            s.c.id, s.c.workout_id, s.c.exercise_id, e.c.name.label("exercise_name"),
+            s.c.set_order, s.c.weight_kg, s.c.reps, s.c.rpe, s.c.is_warmup,
+        ).join(w, s.c.workout_id == w.c.id).outerjoin(e, s.c.exercise_id == e.c.id)
+         .where(w.c.user_id == user_id).order_by(w.c.start_time, s.c.set_order)),
+        ("daily_log", select(daily).where(daily.c.user_id == user_id).order_by(daily.c.date)),
+        ("food_log", select(food).where(food.c.user_id == user_id).order_by(food.c.time)),
+        ("training_plans", select(p).where(p.c.user_id == user_id).order_by(p.c.created_at)),
+        ("plan_exercises", select(
+            pe.c.id, pe.c.plan_id, pe.c.day_name, pe.c.day_name_zh, pe.c.order,
+            pe.c.exercise_id, e.c.name.label("exercise_name"), pe.c.sets, pe.c.reps_min, pe.c.reps_max,
+        ).join(p, pe.c.plan_id == p.c.id).outerjoin(e, pe.c.exercise_id == e.c.id)
+         .where(p.c.user_id == user_id).order_by(pe.c.plan_id, pe.c.day_name, pe.c.order)),
+    ]
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+def _public_settings(settings):
+    if not isinstance(settings, dict):
+        return settings
+    return {k: v for k, v in settings.items() if k not in SECRET_SETTINGS}
+
+def _stream_rows(db, query):
+    """Yield (columns, rows) batches from a server-side cursor, secrets removed from settings."""
+    result = db.connection().execution_options(stream_results=True, yield_per=YIELD_PER).execute(query)
+    try:
+        columns = list(result.keys())
+        scrub = columns.index("settings") if "settings" in columns else None
+        for batch in result.partitions():
+            if scrub is not None:
+                batch = [
+                    tuple(_public_settings(v) if i == scrub else v for i, v in enumerate(row)) for row in batch
+                ]
+            yield columns, batch
+    finally:
+        result.close()
+
+def _ndjson(db, user_id):
+    buf = []
+    size = 0
+    for name, query in _datasets(user_id):
+        for columns, batch in _stream_rows(db, query):
+            for row in batch:
+                record = {"type": name}
+                record.update((c, _value(v)) for c, v in zip(columns, row))
+                line = json.dumps(record, ensure_ascii=False) + "\n"
+                buf.append(line)
+                size += len(line)
+                if size >= CHUNK_BYTES:
+                    yield "".join(buf).encode()
+                    buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode()
+
+class _DrainBuffer(io.RawIOBase):
+    """Write-only sink for ZipFile; the streamed zip is drained from it between writes.
+
+    It has no tell()/seek(), so ZipFile writes data descriptors instead of seeking back.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+def _csv_cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return _value(value)
+
+def _csv_zip(db, user_id):
+    sink = _DrainBuffer()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, query in _datasets(user_id):
+            with archive.open(f"{name}.csv", "w", force_zip64=True) as raw:
+                out = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                writer = csv.writer(out)
+                header_written = False
+                for columns, batch in _stream_rows(db, query):
+                    if not header_written:
+                        writer.writerow(columns)
+                        header_written = True
+                    writer.writerows([_csv_cell(v) for v in row] for row in batch)
+                    out.flush()
+                    if sink.size >= CHUNK_BYTES:
+                        yield sink.drain()
+                out.flush()
+                out.detach()
+            yield sink.drain()
+    yield sink.drain()
+
+def stream_export(user_id, fmt: str):
+    """Generator of response body chunks; opens (and always closes) its own session.
+
+    The session is owned by the generator rather than the request, so it lives exactly as
+    long as the response is streaming.
+    """
+    db = SessionLocal()
+    try:
+        writer = _ndjson if fmt == "ndjson" else _csv_zip
+        for chunk in writer(db, user_id):
+            if chunk:
+                yield chunk
+    finally:
+        db.close()
+
+def export_filename(fmt: str) -> str:
+    return f"workout-monster-export-{date.today():%Y%m%d}.{FORMATS[fmt][1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Export one account's data")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        user = db.query(models.User).filter(models.User.email == args.email).first()
+        if not user:
+            raise SystemExit(f"No user with email {args.email}")
+        user_id = user.id
+    for chunk in stream_export(user_id, args.format):
+        sys.stdout.buffer.write(chunk)
+    sys.stdout.buffer.flush()
+
+if __name__ == "__main__":
+    main()
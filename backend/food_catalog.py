@@ -0,0 +1,250 @@
+"""Read-only, memory-mapped food catalog for national-database-sized food lists.
+
+`python -m backend.food_catalog build` packs food_items into one file; with FOOD_CATALOG_PATH
+pointing at it, food search, lookups and the macro math of /log_from_food and /meals read
+from the file instead of the database. Every worker maps the same file, so the pages are
+shared through the OS page cache and a worker's own memory barely grows with the catalog.
+
+File layout (little-endian, every section 8-byte aligned):
+
+    header      magic, version, record count, build time, then (offset, length) per section
+    macros      float64 columns: calories[n], protein_g[n], carbs_g[n], fat_g[n]
+    text        uint32 offsets[n * 5 + 1] into a UTF-8 blob holding, per record, name,
+                name_zh, serving_size, serving_size_zh, category ("" is None)
+    categories  uint16 category number per record (0 = none) and the category names
+    ids         16-byte UUID per record, plus the same UUIDs sorted with their record
+                numbers for binary-search lookups
+    search      lowercased "name\\0name_zh\\0" per record and uint32 start offsets; a search
+                is a substring scan of this blob (mmap.find, no copies), same as ILIKE '%q%'
+
+Records are sorted by name, so search results come out alphabetically. The file is
+replaced atomically on rebuild and picked up by every worker within
+FOOD_CATALOG_CHECK_SECONDS.
+"""
+import argparse
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from typing import Optional
+
+from sqlalchemy import func, select
+
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+FOOD_CATALOG_PATH = os.getenv("FOOD_CATALOG_PATH")  # unset: serve the catalog from the database
+FOOD_CATALOG_CHECK_SECONDS = float(os.getenv("FOOD_CATALOG_CHECK_SECONDS", "5"))
+
+MAGIC = b"WMFC"
+VERSION = 1
+SECTIONS = ("macros", "text_offsets", "text", "category_ids", "category_names",
+            "record_ids", "sorted_ids", "sorted_records", "search_offsets", "search")
+_HEADER = struct.Struct("<4sIIQ")
+_SECTION = struct.Struct("<QQ")
+TEXT_FIELDS = ("name", "name_zh", "serving_size", "serving_size_zh", "category")
+
+# Same attribute names as models.FoodItem, so callers can use either
+CatalogFood = namedtuple("CatalogFood", ("id", "name", "name_zh", "calories", "protein_g", "carbs_g",
+                                         "fat_g", "serving_size", "serving_size_zh", "category"))
+
+class FoodCatalog:
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = None
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self.built_at = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} food catalog")
+        view = memoryview(self._mm)
+        spans = {}
+        for i, name in enumerate(SECTIONS):
+            offset, length = _SECTION.unpack_from(self._mm, _HEADER.size + i * _SECTION.size)
+            spans[name] = (offset, offset + length)
+            setattr(self, f"_{name}", view[offset:offset + length])
+        n = self.count
+        # Typed zero-copy views over the mapped pages
+        self._macros = self._macros.cast("d")
+        self._text_offsets = self._text_offsets.cast("I")
+        self._category_ids = self._category_ids.cast("H")
+        self._sorted_records = self._sorted_records.cast("I")
+        self._search_offsets = self._search_offsets.cast("I")
+        self._categories = [None] + bytes(self._category_names).decode().split("\n") if n else [None]
+        self._category_numbers = {name: i for i, name in enumerate(self._categories) if name}
+        self._search_span = spans["search"]
+        self._columns = [self._macros[c * n:(c + 1) * n] for c in range(4)]
+
+    def __len__(self):
+        return self.count
+
+    def _string(self, record: int, field: int) -> Optional[str]:
+        i = record * len(TEXT_FIELDS) + field
+        value = bytes(self._text[self._text_offsets[i]:self._text_offsets[i + 1]]).decode()
+        return value or None
+
+    def record(self, i: int) -> CatalogFood:
+        calories, protein, carbs, fat = (column[i] for column in self._columns)
+        return CatalogFood(
+            uuid.UUID(bytes=bytes(self._record_ids[i * 16:(i + 1) * 16])),
+            self._string(i, 0), self._string(i, 1), calories, protein, carbs, fat,
+            self._string(i, 2), self._string(i, 3), self._string(i, 4),
+        )
+
+    def get(self, food_id: uuid.UUID) -> Optional[CatalogFood]:
+        key = food_id.bytes
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self._sorted_ids[mid * 16:(mid + 1) * 16]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and bytes(self._sorted_ids[lo * 16:(lo + 1) * 16]) == key:
+            return self.record(self._sorted_records[lo])
+        return None
+
+    def search(self, q: Optional[str] = None, category: Optional[str] = None, limit: int = 50) -> list:
+        wanted = None
+        if category:
+            wanted = self._category_numbers.get(category)
+            if wanted is None:
+                return []
+        results = []
+        if not q:
+            for i in range(self.count):
+                if len(results) >= limit:
+                    break
+                if wanted is None or self._category_ids[i] == wanted:
+                    results.append(self.record(i))
+            return results
+
+        needle = q.lower().encode()
+        start, end = self._search_span
+        pos = start
+        while len(results) < limit:
+            pos = self._mm.find(needle, pos, end)
+            if pos < 0:
+                break
+            i = bisect_right(self._search_offsets, pos - start) - 1
+            if wanted is None or self._category_ids[i] == wanted:
+                results.append(self.record(i))
+            pos = start + self._search_offsets[i + 1]  # one hit per record
+        return results
+
+# ---------- Serving ----------
+
+_current = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+def current() -> Optional[FoodCatalog]:
+    """The mapped catalog (reopened when the file is rebuilt), or None to use the database."""
+    global _current, _checked_at
+    if not FOOD_CATALOG_PATH:
+        return None
+    now = time.monotonic()
+    if _checked_at and now - _checked_at < FOOD_CATALOG_CHECK_SECONDS:
+        return _current
+    with _lock:
+        if not _checked_at or now - _checked_at >= FOOD_CATALOG_CHECK_SECONDS:
+            _checked_at = now
+            try:
+                mtime = os.stat(FOOD_CATALOG_PATH).st_mtime
+                if _current is None or mtime != _current.mtime:
+                    catalog = FoodCatalog(FOOD_CATALOG_PATH)
+                    catalog.mtime = mtime
+                    _current = catalog
+                    logger.info("Food catalog %s mapped (%d foods)", FOOD_CATALOG_PATH, len(catalog))
+            except (OSError, ValueError) as e:
+                # Keep serving the previous file (or the database) until a valid one appears
+                logger.warning("Food catalog unavailable: %s", e)
+    return _current
+
+# ---------- Building ----------
+
+def _pad(out, position: int) -> int:
+    padding = -position % 8
+    out.write(b"\0" * padding)
+    return position + padding
+
+def build(path: str = None) -> int:
+    """Write food_items to a catalog file (atomically replacing it); returns the food count."""
+    path = path or FOOD_CATALOG_PATH or "./food_catalog.bin"
+    t = models.FoodItem.__table__
+    columns = [array("d") for _ in range(4)]
+    text_offsets, text = array("I", [0]), bytearray()
+    search_offsets, search = array("I", [0]), bytearray()
+    category_ids, categories = array("H"), {}
+    record_ids = bytearray()
+
+    with SessionLocal() as db:
+        result = db.connection().execution_options(stream_results=True, yield_per=5000).execute(
+            select(t.c.id, t.c.name, t.c.name_zh, t.c.calories, t.c.protein_g, t.c.carbs_g, t.c.fat_g,
+                   t.c.serving_size, t.c.serving_size_zh, t.c.category)
+            .order_by(func.lower(t.c.name), t.c.id)
+        )
+        for row in result:
+            record_ids += row.id.bytes
+            for column, value in zip(columns, (row.calories, row.protein_g, row.carbs_g, row.fat_g)):
+                column.append(value or 0.0)
+            for field in TEXT_FIELDS:
+                text += (getattr(row, field) or "").encode()
+                text_offsets.append(len(text))
+            category_ids.append(categories.setdefault(row.category, len(categories) + 1) if row.category else 0)
+            search += f"{(row.name or '').lower()}\0{(row.name_zh or '').lower()}\0".encode()
+            search_offsets.append(len(search))
+
+    count = len(category_ids)
+    by_id = sorted(range(count), key=lambda i: record_ids[i * 16:(i + 1) * 16])
+    sections = {
+        "macros": b"".join(column.tobytes() for column in columns),
+        "text_offsets": text_offsets.tobytes(),
+        "text": bytes(text),
+        "category_ids": category_ids.tobytes(),
+        "category_names": "\n".join(sorted(categories, key=categories.get)).encode(),
+        "record_ids": bytes(record_ids),
+        "sorted_ids": b"".join(record_ids[i * 16:(i + 1) * 16] for i in by_id),
+        "sorted_records": array("I", by_id).tobytes(),
+        "search_offsets": search_offsets.tobytes(),
+        "search": bytes(search),
+    }
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as out:
+        position = _HEADER.size + len(SECTIONS) * _SECTION.size
+        out.write(b"\0" * position)
+        spans = []
+        for name in SECTIONS:
+            position = _pad(out, position)
+            out.write(sections[name])
+            spans.append((position, len(sections[name])))
+            position += len(sections[name])
+        out.seek(0)
+        out.write(_HEADER.pack(MAGIC, VERSION, count, int(time.time())))
+        for span in spans:
+            out.write(_SECTION.pack(*span))
+    os.replace(tmp, path)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped food catalog")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="pack food_items into a catalog file")
+    build_parser.add_argument("--out", default=None, help="defaults to FOOD_CATALOG_PATH or ./food_catalog.bin")
+    args = parser.parse_args()
+    if args.command == "build":
+        start = time.perf_counter()
+        count = build(args.out)
+        print(f"{count} foods written in {time.perf_counter() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
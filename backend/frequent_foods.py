@@ -0,0 +1,133 @@
+"""Per-user recent & frequent foods, for one-tap logging without a search.
+
+Every food log adds 1 to the food's count, and counts decay with a half-life of
+FREQUENT_FOODS_HALF_LIFE_DAYS, so a food eaten daily last month ranks below one eaten
+daily this week. The decayed count is stored as
+
+    rank = log2(sum over logs of 2 ** (logged_at - EPOCH) / half_life)
+
+which orders foods the same way at any point in time, so an index on (user_id, rank) serves
+the top foods directly, and a new log updates it in O(1): rank = log2(2**rank + 2**now).
+Each user keeps at most FREQUENT_FOODS_MAX foods; the lowest-ranked one is dropped.
+
+record() is called by every endpoint and job that logs food. MyFitnessPal imports are
+skipped: they hold per-meal totals, not foods. forget() takes a deleted log back out:
+rank = log2(2**rank - 2**logged_at), dropping the food once nothing is left.
+"""
+import math
+import os
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+FREQUENT_FOODS_HALF_LIFE_DAYS = float(os.getenv("FREQUENT_FOODS_HALF_LIFE_DAYS", "14"))
+FREQUENT_FOODS_MAX = int(os.getenv("FREQUENT_FOODS_MAX", "50"))
+
+EPOCH = datetime(2024, 1, 1)
+
+def _half_lives(when: datetime) -> float:
+    return (when - EPOCH).total_seconds() / (FREQUENT_FOODS_HALF_LIFE_DAYS * 86400)
+
+def _log2_add(a: float, b: float) -> float:
+    """log2(2**a + 2**b) without overflowing."""
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+def food_key(food_id, name: str) -> str:
+    return f"food:{food_id}" if food_id else f"name:{name.strip().lower()}"
+
+def record(db: Session, user_id, entries: Iterable[dict], when: datetime = None):
+    """Count logged foods (dicts with name, calories, protein, carbs, fats and optionally
+    food_id and servings); staged in db's transaction."""
+    when = when or datetime.utcnow()
+    point = _half_lives(when)
+    by_key = {}
+    for entry in entries:
+        by_key.setdefault(food_key(entry.get("food_id"), entry["name"]), []).append(entry)
+    if not by_key:
+        return
+
+    existing = {
+        row.food_key: row for row in db.query(models.FrequentFood).filter(
+            models.FrequentFood.user_id == user_id,
+            models.FrequentFood.food_key.in_(by_key)
+        )
+    }
+    added = 0
+    for key, logged in by_key.items():
+        last = logged[-1]
+        row = existing.get(key)
+        if row is None:
+            row = models.FrequentFood(user_id=user_id, food_key=key, food_id=last.get("food_id"), rank=None)
+            db.add(row)
+            added += 1
+        for _ in logged:
+            row.rank = point if row.rank is None else _log2_add(row.rank, point)
+        row.name = last["name"]
+        row.servings = last.get("servings")
+        row.calories = last["calories"]
+        row.protein = last["protein"]
+        row.carbs = last["carbs"]
+        row.fats = last["fats"]
+        row.last_logged_at = when
+    if added:
+        _trim(db, user_id)
+
+def _log2_sub(a: float, b: float) -> float:
+    """log2(2**a - 2**b), or None when nothing is left."""
+    if b >= a - 1e-9:
+        return None
+    return a + math.log2(1 - 2 ** (b - a))
+
+def forget(db: Session, user_id, log: models.FoodLog):
+    """Take a deleted food log back out of its food's count; staged in db's transaction.
+
+    Logs do not keep their food key, so the entry is found by name: the log's own name (free-form
+    logs), else the food after a "Meal: " prefix (meals and catalog logs).
+    """
+    names = [log.name or ""]
+    if ": " in names[0]:
+        names.append(names[0].split(": ", 1)[1])
+    keys = [food_key(None, name) for name in names]
+    rows = db.query(models.FrequentFood).filter(
+        models.FrequentFood.user_id == user_id,
+        or_(models.FrequentFood.food_key.in_(keys),
+            and_(models.FrequentFood.food_id.isnot(None), models.FrequentFood.name.in_(names)))
+    ).all()
+    if not rows:
+        return
+    by_key = {row.food_key: row for row in rows}
+    row = next((by_key[key] for key in keys if key in by_key), rows[0])
+    row.rank = _log2_sub(row.rank, _half_lives(log.time or datetime.utcnow()))
+    if row.rank is None:
+        db.delete(row)
+
+def _trim(db: Session, user_id):
+    db.flush()
+    count = db.execute(
+        select(func.count()).where(models.FrequentFood.user_id == user_id)
+    ).scalar()
+    if count > FREQUENT_FOODS_MAX:
+        for row in db.query(models.FrequentFood).filter(
+            models.FrequentFood.user_id == user_id
+        ).order_by(models.FrequentFood.rank).limit(count - FREQUENT_FOODS_MAX):
+            db.delete(row)
+
+def top(db: Session, user_id, limit: int = 20, now: datetime = None) -> list:
+    """The user's highest-ranked foods, each with its current decayed log count."""
+    point = _half_lives(now or datetime.utcnow())
+    rows = db.query(models.FrequentFood).filter(
+        models.FrequentFood.user_id == user_id
+    ).order_by(models.FrequentFood.rank.desc()).limit(limit).all()
+    return [
+        {
+            "food_id": row.food_id, "name": row.name, "servings": row.servings,
+            "calories": row.calories, "protein": row.protein, "carbs": row.carbs, "fats": row.fats,
+            "score": round(2 ** (row.rank - point), 3), "last_logged_at": row.last_logged_at,
+        }
+        for row in rows
+    ]
@@ -0,0 +1,393 @@
+"""Synthetic dataset generator for realistic scale testing.
+
+Bulk-generates users who follow a TrainingPlan (workouts and sets with progressive overload),
+log food most days (FoodLog + matching DailyLog) and weigh in regularly (UserStats). History
+ends on --end-date (default today), and the output is deterministic for a given --seed and
+--end-date. Rows are written in chunks with executemany inserts (SQLite) or COPY (PostgreSQL),
+so memory stays flat however many users are generated.
+
+The tables the app derives as data is logged (user_rollups, personal_records, training_load)
+are then built for the generated users, as the rebuild commands of backend.rollups, backend.prs
+and backend.workload would; --skip-derived leaves them empty.
+
+    python -m backend.generate_data --users 1000 --days 365
+    python -m backend.generate_data --users 1000 --seed 7 --end-date 2025-06-30
+    DATABASE_URL=postgresql://localhost/wm python -m backend.generate_data --users 1000000 --days 180 --workers 8
+
+All generated users share the password "password" (one precomputed argon2 hash).
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import time
+import uuid
+from datetime import datetime, date, timedelta
+from multiprocessing import Pool
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session
+
+from . import models, prs, rollups, workload
+from .database import DATABASE_URL
+from .seed_exercises import exercises_data
+from .seed_foods import foods_data
+from .routers.user import calculate_tdee
+
+PASSWORD = "password"
+
+# Table write order respects foreign keys within one flush
+TABLES = ["users", "training_plans", "plan_exercises", "workouts", "workout_sets", "user_stats", "daily_log", "food_log"]
+
+PLAN_TEMPLATES = {
+    "Upper / Lower": {
+        "Upper A": ["Barbell Bench Press", "Barbell Row", "Overhead Press", "Lat Pulldown", "Barbell Curl"],
+        "Lower A": ["Barbell Squat", "Romanian Deadlift", "Leg Press", "Leg Curl", "Plank"],
+        "Upper B": ["Incline Dumbbell Press", "Pull Up", "Lateral Raise", "Seated Cable Row", "Tricep Pushdown"],
+        "Lower B": ["Deadlift", "Lunges", "Leg Extension", "Leg Curl", "Hanging Leg Raise"],
+    },
+    "Push / Pull / Legs": {
+        "Push": ["Barbell Bench Press", "Overhead Press", "Incline Dumbbell Press", "Lateral Raise", "Tricep Pushdown"],
+        "Pull": ["Deadlift", "Pull Up", "Barbell Row", "Face Pull", "Hammer Curl"],
+        "Legs": ["Barbell Squat", "Romanian Deadlift", "Leg Press", "Leg Curl", "Crunch"],
+    },
+    "Full Body": {
+        "Full Body A": ["Barbell Squat", "Barbell Bench Press", "Barbell Row", "Plank"],
+        "Full Body B": ["Deadlift", "Overhead Press", "Lat Pulldown", "Lunges"],
+    },
+}
+
+# Typical starting working weight (kg) for an average trainee, by equipment
+START_WEIGHT = {"barbell": 50.0, "dumbbell": 16.0, "machine": 45.0, "cable": 25.0, "bodyweight": 0.0}
+
+ACTIVITY_LEVELS = ["sedentary", "lightly_active", "moderately_active", "very_active"]
+GOALS = ["cut", "maintain", "bulk"]
+GOAL_DRIFT_KG_PER_DAY = {"cut": -0.06, "maintain": 0.0, "bulk": 0.03}
+
+DERIVE_BATCH = 100  # users per commit while building the derived tables
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+def ensure_catalogs(engine) -> dict:
+    """Seed missing exercises/foods in bulk and return what the generator needs from them."""
+    exercises = models.Exercises.__table__
+    foods = models.FoodItem.__table__
+    with engine.begin() as conn:
+        existing = {row.name for row in conn.execute(select(exercises.c.name))}
+        missing = [
+            {"id": uuid.uuid5(uuid.NAMESPACE_URL, f"exercise:{ex['name']}"), "name": ex["name"], "name_zh": ex.get("name_zh"), "type": ex["type"],
+             "primary_muscle": ex["primary_muscle"], "equipment": ex.get("equipment"), "description": None}
+            for ex in exercises_data if ex["name"] not in existing
+        ]
+        if missing:
+            conn.execute(exercises.insert(), missing)
+
+        existing = {row.name for row in conn.execute(select(foods.c.name))}
+        missing = [
+            {"id": uuid.uuid5(uuid.NAMESPACE_URL, f"food:{f['name']}"), "name": f["name"], "name_zh": f.get("name_zh"), "calories": f["calories"],
+             "protein_g": f["protein_g"], "carbs_g": f["carbs_g"], "fat_g": f["fat_g"],
+             "serving_size": f["serving_size"], "serving_size_zh": f.get("serving_size_zh"), "category": f.get("category")}
+            for f in foods_data if f["name"] not in existing
+        ]
+        if missing:
+            conn.execute(foods.insert(), missing)
+
+        equipment = {ex["name"]: ex.get("equipment") for ex in exercises_data}
+        exercise_rows = {
+            row.name: (row.id, row.type, equipment.get(row.name, "barbell"))
+            for row in conn.execute(select(exercises.c.id, exercises.c.name, exercises.c.type))
+        }
+        food_rows = [
+            (row.name, row.calories, row.protein_g, row.carbs_g, row.fat_g)
+            for row in conn.execute(select(foods.c.name, foods.c.calories, foods.c.protein_g, foods.c.carbs_g, foods.c.fat_g))
+        ]
+    return {"exercises": exercise_rows, "foods": food_rows}
+
+# ---------- Row generation ----------
+
+def generate_user(index: int, seed: int, days: int, today: date, catalog: dict, password_hash: str):
+    """Yield (table, row) pairs for one user, deterministically from (seed, index)."""
+    rng = random.Random(seed * 1_000_003 + index)
+    user_id = _uuid(rng)
+    start_day = today - timedelta(days=days)
+
+    gender = rng.choice(["male", "female"])
+    age = rng.randint(18, 60)
+    height = rng.gauss(176 if gender == "male" else 163, 7)
+    weight = rng.gauss(82 if gender == "male" else 65, 10)
+    activity = rng.choice(ACTIVITY_LEVELS)
+    goal = rng.choice(GOALS)
+    strength = max(0.4, rng.gauss(1.0, 0.3))
+
+    yield "users", {
+        "id": user_id,
+        "email": f"user{index}@example.com",
+        "password_hash": password_hash,
+        "display_name": f"User {index}",
+        "created_at": datetime.combine(start_day, datetime.min.time()),
+        "settings": {"age": age, "gender": gender, "height": round(height, 1), "activity_level": activity, "goal": goal},
+    }
+
+    # Training plan from a template
+    template_name = rng.choice(list(PLAN_TEMPLATES))
+    plan_id = _uuid(rng)
+    yield "training_plans", {
+        "id": plan_id, "user_id": user_id, "name": template_name, "name_zh": None, "description": None,
+        "is_active": True, "created_at": datetime.combine(start_day, datetime.min.time()),
+    }
+    plan_days = []
+    working_weight = {}
+    for day_name, names in PLAN_TEMPLATES[template_name].items():
+        day_exercises = []
+        for order, name in enumerate(names, start=1):
+            if name not in catalog["exercises"]:
+                continue
+            exercise_id, ex_type, equipment = catalog["exercises"][name]
+            n_sets = rng.choice([3, 3, 4]) if ex_type == "compound" else rng.choice([2, 3])
+            reps_min, reps_max = (5, 8) if ex_type == "compound" else (8, 12)
+            yield "plan_exercises", {
+                "id": _uuid(rng), "plan_id": plan_id, "exercise_id": exercise_id, "day_name": day_name,
+                "day_name_zh": None, "sets": n_sets, "reps_min": reps_min, "reps_max": reps_max, "order": order,
+            }
+            day_exercises.append((exercise_id, ex_type, n_sets, reps_min, reps_max))
+            working_weight.setdefault(exercise_id, START_WEIGHT.get(equipment, 20.0) * strength)
+        plan_days.append((day_name, day_exercises))
+
+    training_weekdays = set(rng.sample(range(7), min(7, max(2, int(rng.gauss(len(plan_days) + 0.5, 1))))))
+    rotation = 0
+    tdee = calculate_tdee(age, gender, height, weight, activity)
+    calories_target = tdee + {"cut": -500, "maintain": 0, "bulk": 300}[goal]
+    adherence = rng.uniform(0.6, 0.98)
+    next_weigh_in = 0
+
+    for offset in range(days):
+        day = start_day + timedelta(days=offset)
+        weight += GOAL_DRIFT_KG_PER_DAY[goal] + rng.gauss(0, 0.15)
+
+        if offset >= next_weigh_in:
+            yield "user_stats", {
+                "id": _uuid(rng), "user_id": user_id, "date": day, "weight_kg": round(weight, 1),
+                "waist_cm": round(weight * 0.95 + rng.gauss(0, 1.5), 1) if rng.random() < 0.3 else None,
+                "body_fat_pct": None, "tdee_current": round(tdee),
+            }
+            next_weigh_in = offset + rng.choice([1, 1, 2, 3, 7])
+
+        is_training_day = day.weekday() in training_weekdays and rng.random() < 0.9
+        if is_training_day:
+            day_name, day_exercises = plan_days[rotation % len(plan_days)]
+            rotation += 1
+            start = datetime.combine(day, datetime.min.time()) + timedelta(hours=rng.randint(6, 21), minutes=rng.randint(0, 59))
+            workout_id = _uuid(rng)
+            yield "workouts", {
+                "id": workout_id, "user_id": user_id, "start_time": start,
+                "end_time": start + timedelta(minutes=rng.randint(40, 95)), "notes": f"Started {day_name}",
+                "readiness_score": None,
+            }
+            set_order = 0
+            for exercise_id, ex_type, n_sets, reps_min, reps_max in day_exercises:
+                work = working_weight[exercise_id]
+                if ex_type == "compound" and work > 20 and rng.random() < 0.5:
+                    set_order += 1
+                    yield "workout_sets", {
+                        "id": _uuid(rng), "workout_id": workout_id, "exercise_id": exercise_id, "set_order": set_order,
+                        "weight_kg": round(work * 0.5 / 2.5) * 2.5, "reps": reps_max, "rpe": None, "is_warmup": True,
+                    }
+                for _ in range(n_sets):
+                    set_order += 1
+                    rpe = min(10.0, max(6.0, round(rng.gauss(8.0, 0.8) * 2) / 2))
+                    yield "workout_sets", {
+                        "id": _uuid(rng), "workout_id": workout_id, "exercise_id": exercise_id, "set_order": set_order,
+                        "weight_kg": round(work / 2.5) * 2.5, "reps": rng.randint(reps_min, reps_max), "rpe": rpe,
+                        "is_warmup": False,
+                    }
+                # Progressive overload with the occasional deload
+                working_weight[exercise_id] = work * (0.9 if rng.random() < 0.02 else 1 + rng.uniform(0, 0.012))
+
+        if rng.random() < adherence:
+            totals = [0, 0, 0, 0]
+            for _ in range(rng.randint(2, 6)):
+                name, calories, protein, carbs, fat = rng.choice(catalog["foods"])
+                servings = rng.choice([0.5, 1, 1, 1.5, 2, 2.5])
+                macros = [int(calories * servings), int(protein * servings), int(carbs * servings), int(fat * servings)]
+                totals = [a + b for a, b in zip(totals, macros)]
+                yield "food_log", {
+                    "id": _uuid(rng), "user_id": user_id, "name": f"{rng.choice(['Breakfast', 'Lunch', 'Dinner', 'Snack'])}: {name}",
+                    "calories": macros[0], "protein": macros[1], "carbs": macros[2], "fats": macros[3], "date": day,
+                    "time": datetime.combine(day, datetime.min.time()) + timedelta(hours=rng.randint(7, 22), minutes=rng.randint(0, 59)),
+                }
+            target = calories_target + (200 if is_training_day else -200)
+            protein_t, fats_t = weight * 2.2, weight * 0.8
+            yield "daily_log", {
+                "id": _uuid(rng), "user_id": user_id, "date": day,
+                "calories_target": int(target), "calories_actual": totals[0],
+                "protein_target": int(protein_t), "protein_actual": totals[1],
+                "carbs_target": int((target - (protein_t * 4 + fats_t * 9)) / 4), "carbs_actual": totals[2],
+                "fats_target": int(fats_t), "fats_actual": totals[3],
+                "training_day": is_training_day,
+            }
+
+# ---------- Bulk writing ----------
+
+class BulkWriter:
+    """Buffers rows per table and writes them with COPY (PostgreSQL) or executemany (others)."""
+
+    def __init__(self, engine, chunk_rows: int):
+        self.engine = engine
+        self.chunk_rows = chunk_rows
+        self.use_copy = engine.dialect.name == "postgresql"
+        self.buffers = {name: [] for name in TABLES}
+        self.buffered = 0
+        self.written = {name: 0 for name in TABLES}
+
+    def add(self, table: str, row: dict):
+        self.buffers[table].append(row)
+        self.buffered += 1
+
+    def maybe_flush(self):
+        # Only called between users, so every flush is referentially complete
+        if self.buffered >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.buffered:
+            return
+        with self.engine.begin() as conn:
+            for name in TABLES:
+                rows = self.buffers[name]
+                if not rows:
+                    continue
+                if self.use_copy:
+                    self._copy(conn, name, rows)
+                else:
+                    conn.execute(models.Base.metadata.tables[name].insert(), rows)
+                self.written[name] += len(rows)
+                self.buffers[name] = []
+        self.buffered = 0
+
+    def _copy(self, conn, name, rows):
+        columns = list(rows[0])
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([_csv_value(row[c]) for c in columns])
+        buf.seek(0)
+        quoted = ", ".join(f'"{c}"' for c in columns)
+        cursor = conn.connection.cursor()
+        cursor.copy_expert(f"COPY {name} ({quoted}) FROM STDIN WITH (FORMAT csv)", buf)
+
+def _csv_value(value):
+    if value is None:
+        return None  # csv writes an empty unquoted field, which COPY reads as NULL
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+def _make_engine(url: str):
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+
+        @event.listens_for(engine, "connect")
+        def _fast_sqlite(dbapi_conn, _):
+            cursor = dbapi_conn.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=OFF")
+            cursor.close()
+        return engine
+    return create_engine(url)
+
+def _generate_range(args):
+    url, first, last, seed, days, today, catalog, password_hash, chunk_rows = args
+    engine = _make_engine(url)
+    writer = BulkWriter(engine, chunk_rows)
+    user_ids = []
+    for index in range(first, last):
+        for table, row in generate_user(index, seed, days, today, catalog, password_hash):
+            writer.add(table, row)
+            if table == "users":
+                user_ids.append(row["id"])
+        writer.maybe_flush()
+    writer.flush()
+    engine.dispose()
+    return writer.written, user_ids
+
+def _derive_range(args):
+    """Build the derived tables of some generated users, committing every DERIVE_BATCH users."""
+    url, user_ids = args
+    engine = _make_engine(url)
+    with Session(engine) as db:
+        for i, user_id in enumerate(user_ids, start=1):
+            rollups.refresh(db, user_id)
+            prs.rebuild(db, user_id)
+            workload.recompute(db, user_id)
+            if i % DERIVE_BATCH == 0:
+                db.commit()
+        db.commit()
+    engine.dispose()
+    return len(user_ids)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Workout Monster dataset")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--start-user", type=int, default=0, help="first user index (to append to an existing dataset)")
+    parser.add_argument("--days", type=int, default=365, help="days of history per user")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None,
+                        help="last day of generated history, YYYY-MM-DD (default today)")
+    parser.add_argument("--skip-derived", action="store_true",
+                        help="do not build rollups, personal records and training load")
+    parser.add_argument("--workers", type=int, default=1, help="parallel processes (PostgreSQL only)")
+    parser.add_argument("--chunk-rows", type=int, default=50000, help="rows buffered per bulk write")
+    parser.add_argument("--database-url", default=DATABASE_URL)
+    args = parser.parse_args()
+
+    url = args.database_url
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    engine = _make_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    catalog = ensure_catalogs(engine)
+    engine.dispose()
+
+    from .passwords import pwd_context
+    password_hash = pwd_context.hash(PASSWORD)
+
+    workers = args.workers if not url.startswith("sqlite") else 1
+    today = args.end_date or date.today()
+    first, last = args.start_user, args.start_user + args.users
+    step = -(-args.users // workers)
+    ranges = [
+        (url, lo, min(lo + step, last), args.seed, args.days, today, catalog, password_hash, args.chunk_rows)
+        for lo in range(first, last, step)
+    ]
+
+    started = time.perf_counter()
+    if workers == 1:
+        results = [_generate_range(r) for r in ranges]
+    else:
+        with Pool(workers) as pool:
+            results = pool.map(_generate_range, ranges)
+    elapsed = time.perf_counter() - started
+
+    totals = {name: sum(written[name] for written, _ in results) for name in TABLES}
+    for name in TABLES:
+        print(f"{name:>16}: {totals[name]:>12,}")
+    print(f"{sum(totals.values()):,} rows in {elapsed:.1f}s ({sum(totals.values()) / elapsed:,.0f} rows/s)")
+
+    if args.skip_derived:
+        return
+    started = time.perf_counter()
+    derive = [(url, user_ids) for _, user_ids in results if user_ids]
+    if workers == 1:
+        derived = sum(_derive_range(r) for r in derive)
+    else:
+        with Pool(workers) as pool:
+            derived = sum(pool.map(_derive_range, derive))
+    print(f"Rollups, personal records and training load built for {derived:,} users "
+          f"in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""Streaming importer for third-party training and diet logs.
+
+Supported exports (detected from the CSV header, or forced with `source`):
+
+- strong  Strong app "Export Data" CSV (one row per set)
+- hevy    Hevy "Export Workouts" CSV (one row per set)
+- mfp     MyFitnessPal "Nutrition" export (one row per meal per day)
+
+The file is read row by row through csv.DictReader and inserted in chunks with executemany, so
+memory does not grow with the file (only with the number of distinct workouts, for grouping).
+Exercise names are matched against Exercises.name / name_zh through an in-memory index that
+ignores case, word order and an equipment suffix ("Bench Press (Barbell)" == "Barbell Bench
+Press"); names that still do not match are added to the catalog. Workouts and meals that
+already exist (same start time / same day and meal) are skipped, so re-importing a file is
+harmless. DailyLog totals are recomputed once, for the imported date range, at the end.
+
+Everything is staged in the caller's transaction, so an import lands entirely or not at all:
+POST /user/import commits it, and the import_file job leaves it to the job runner, which
+commits it together with the job's status (renewing the job's lease between chunks).
+"""
+import csv
+import io
+import itertools
+import re
+import uuid
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import cache, models, prs, rollups, workload
+
+CHUNK_ROWS = 2000
+LB_TO_KG = 0.45359237
+
+class ImportFormatError(ValueError):
+    """The file is not a supported export (or not the one requested)."""
+
+# ---------- Exercise name index ----------
+
+def _key(name: str) -> str:
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") else w for w in re.findall(r"\w+", name.lower())]
+    return " ".join(sorted(words))
+
+def _name_keys(name: str):
+    """Lookup keys, most specific first: "Bench Press (Barbell)" -> barbell bench press, bench press."""
+    name = name.strip()
+    match = re.match(r"^(.*?)\s*\((.*?)\)$", name)
+    if match:
+        return [_key(f"{match.group(2)} {match.group(1)}"), _key(match.group(1))]
+    return [_key(name)]
+
+class ExerciseIndex:
+    """Maps free-text exercise names to Exercises ids, adding unknown names to the catalog."""
+
+    def __init__(self, db: Session):
+        self.ids = {}
+        self.created = []
+        for exercise_id, name, name_zh in db.execute(
+            select(models.Exercises.id, models.Exercises.name, models.Exercises.name_zh)
+        ):
+            for candidate in (name, name_zh):
+                if candidate:
+                    self.ids.setdefault(_key(candidate), exercise_id)
+
+    def resolve(self, name: str, source: str, writer: "_ChunkedInserts"):
+        keys = _name_keys(name)
+        exercise_id = next((self.ids[k] for k in keys if k in self.ids), None)
+        if exercise_id is None:
+            exercise_id = self.ids[keys[0]] = uuid.uuid4()
+            writer.add(models.Exercises, {"id": exercise_id, "name": name.strip(), "description": f"Imported from {source}"})
+            self.created.append(name.strip())
+        return exercise_id
+
+# ---------- Row parsing ----------
+
+_DATETIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%d %b %Y, %H:%M", "%b %d, %Y, %I:%M %p", "%Y-%m-%d")
+
+def _parse_datetime(value: str) -> datetime:
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        pass
+    for fmt in _DATETIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised date: {value!r}")
+
+def _number(value):
+    if value is None:
+        return None
+    value = value.strip().replace(",", "")
+    if not value:
+        return None
+    return float(value)
+
+def _duration(value: str) -> timedelta:
+    """Strong durations: "1h 5m", "45m", "3600s" or plain seconds."""
+    value = (value or "").strip()
+    if value.isdigit():
+        return timedelta(seconds=int(value))
+    parts = dict((unit, int(n)) for n, unit in re.findall(r"(\d+)\s*([hms])", value))
+    return timedelta(hours=parts.get("h", 0), minutes=parts.get("m", 0), seconds=parts.get("s", 0))
+
+def detect_source(fieldnames) -> str:
+    fields = {f.strip().lower() for f in fieldnames or ()}
+    if {"exercise name", "set order", "weight", "reps"} <= fields:
+        return "strong"
+    if {"exercise_title", "start_time", "reps"} <= fields:
+        return "hevy"
+    if {"date", "meal", "calories"} <= fields:
+        return "mfp"
+    raise ImportFormatError("Unrecognised file: expected a Strong, Hevy or MyFitnessPal CSV export")
+
+def _strong_set(row, weight_factor):
+    """One Strong row as a set dict (shared shape with _hevy_set)."""
+    start = _parse_datetime(row["Date"])
+    order = (row.get("Set Order") or "").strip()
+    return {
+        "start": start,
+        "title": row.get("Workout Name") or None,
+        "end": start + _duration(row.get("Duration")) if row.get("Duration") else None,
+        "exercise": row["Exercise Name"],
+        "set_order": int(order) if order.isdigit() else None,
+        "is_warmup": order.upper() == "W",
+        "weight": _number(row.get("Weight")),
+        "weight_factor": weight_factor,
+        "reps": _number(row.get("Reps")),
+        "rpe": _number(row.get("RPE")),
+    }
+
+def _hevy_set(row, weight_factor):
+    weight, factor = _number(row.get("weight_kg")), 1.0
+    if weight is None and row.get("weight_lbs") is not None:
+        weight, factor = _number(row.get("weight_lbs")), LB_TO_KG
+    index = _number(row.get("set_index"))
+    return {
+        "start": _parse_datetime(row["start_time"]),
+        "title": row.get("title") or None,
+        "end": _parse_datetime(row["end_time"]) if row.get("end_time") else None,
+        "exercise": row["exercise_title"],
+        "set_order": int(index) + 1 if index is not None else None,
+        "is_warmup": (row.get("set_type") or "").strip().lower() == "warmup",
+        "weight": weight,
+        "weight_factor": factor,
+        "reps": _number(row.get("reps")),
+        "rpe": _number(row.get("rpe")),
+    }
+
+# ---------- Import ----------
+
+class _ChunkedInserts:
+    """Buffers rows per model and writes them with one executemany per model per chunk."""
+
+    def __init__(self, db: Session, order, on_chunk=None):
+        self.db = db
+        self.order = order  # parents first, so every chunk satisfies its foreign keys
+        self.on_chunk = on_chunk
+        self.rows = {model: [] for model in order}
+        self.buffered = 0
+
+    def add(self, model, row: dict):
+        self.rows[model].append(row)
+        self.buffered += 1
+        if self.buffered >= CHUNK_ROWS:
+            self.flush()
+
+    def flush(self):
+        for model in self.order:
+            if self.rows[model]:
+                self.db.execute(insert(model), self.rows[model])
+                self.rows[model] = []
+        self.buffered = 0
+        if self.on_chunk:
+            self.on_chunk()
+
+def _widen(summary, day: date):
+    summary["first_date"] = min(summary["first_date"] or day, day)
+    summary["last_date"] = max(summary["last_date"] or day, day)
+
+def _import_sets(db, user_id, reader, source, weight_unit, summary, on_chunk):
+    parse = _strong_set if source == "strong" else _hevy_set
+    weight_factor = LB_TO_KG if weight_unit == "lb" else 1.0
+    exercises = ExerciseIndex(db)
+    existing = {
+        start for (start,) in db.execute(select(models.Workouts.start_time).where(models.Workouts.user_id == user_id))
+    }
+    workouts = {}  # start time -> [workout id, next set order]; bounded by workouts, not rows
+    writer = _ChunkedInserts(db, [models.Exercises, models.Workouts, models.WorkoutSets], on_chunk)
+    touched = set()  # exercise ids
+
+    for row in reader:
+        summary["rows"] += 1
+        try:
+            parsed = parse(row, weight_factor)
+        except (KeyError, ValueError):
+            summary["skipped"] += 1
+            continue
+        start = parsed["start"]
+        if start in existing or parsed["reps"] is None:  # already imported, or a cardio/timed set
+            summary["skipped"] += 1
+            continue
+
+        workout = workouts.get(start)
+        if workout is None:
+            workout = workouts[start] = [uuid.uuid4(), 1]
+            writer.add(models.Workouts, {
+                "id": workout[0], "user_id": user_id, "start_time": start, "end_time": parsed["end"],
+                "notes": f"Imported from {source}" + (f": {parsed['title']}" if parsed["title"] else ""),
+            })
+            summary["workouts"] += 1
+            _widen(summary, start.date())
+
+        weight = parsed["weight"]
+        exercise_id = exercises.resolve(parsed["exercise"], source, writer)
+        touched.add(exercise_id)
+        writer.add(models.WorkoutSets, {
+            "id": uuid.uuid4(),
+            "workout_id": workout[0],
+            "exercise_id": exercise_id,
+            "set_order": parsed["set_order"] or workout[1],
+            "weight_kg": round(weight * parsed["weight_factor"], 2) if weight is not None else 0.0,
+            "reps": int(parsed["reps"]),
+            "rpe": parsed["rpe"],
+            "is_warmup": parsed["is_warmup"],
+        })
+        workout[1] += 1
+        summary["sets"] += 1
+
+    writer.flush()
+    summary["created_exercises"] = exercises.created
+    # Bulk inserts skip record_set() and add_set(), so refresh the records and day loads they touched
+    prs.rebuild(db, user_id, touched)
+    if summary["first_date"]:
+        workload.recompute(db, user_id, summary["first_date"], summary["last_date"])
+
+def _import_food(db, user_id, reader, summary, on_chunk):
+    existing = {
+        (day, name) for day, name in db.execute(
+            select(models.FoodLog.date, models.FoodLog.name).where(models.FoodLog.user_id == user_id)
+        )
+    }
+    writer = _ChunkedInserts(db, [models.FoodLog], on_chunk)
+    for row in reader:
+        summary["rows"] += 1
+        try:
+            day = _parse_datetime(row["Date"]).date()
+            meal = (row.get("Meal") or "Food").strip()
+            calories = _number(row.get("Calories"))
+        except (KeyError, ValueError):
+            summary["skipped"] += 1
+            continue
+        if calories is None or (day, meal) in existing:
+            summary["skipped"] += 1
+            continue
+        # MyFitnessPal already writes one row per meal per day, so each becomes one entry
+        writer.add(models.FoodLog, {
+            "id": uuid.uuid4(), "user_id": user_id, "name": meal, "date": day,
+            "time": datetime.combine(day, datetime.min.time()),
+            "calories": round(calories),
+            "protein": round(_number(row.get("Protein (g)")) or 0),
+            "carbs": round(_number(row.get("Carbohydrates (g)")) or 0),
+            "fats": round(_number(row.get("Fat (g)")) or 0),
+        })
+        summary["food_logs"] += 1
+        _widen(summary, day)
+    writer.flush()
+
+def _as_date(value) -> date:
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+def recompute_daily_logs(db: Session, user_id, first: date, last: date) -> int:
+    """Rebuild DailyLog actuals and training_day for [first, last] from FoodLog and Workouts."""
+    food = models.FoodLog
+    totals = {
+        _as_date(day): (cal or 0, protein or 0, carbs or 0, fats or 0)
+        for day, cal, protein, carbs, fats in db.execute(
+            select(food.date, func.sum(food.calories), func.sum(food.protein), func.sum(food.carbs), func.sum(food.fats))
+            .where(food.user_id == user_id, food.date >= first, food.date <= last)
+            .group_by(food.date)
+        )
+    }
+    workout_day = func.date(models.Workouts.start_time)
+    training_days = {
+        _as_date(day) for (day,) in db.execute(
+            select(workout_day).where(
+                models.Workouts.user_id == user_id,
+                models.Workouts.start_time >= datetime.combine(first, datetime.min.time()),
+                models.Workouts.start_time < datetime.combine(last + timedelta(days=1), datetime.min.time()),
+            ).distinct()
+        )
+    }
+    existing = {
+        day: log_id for log_id, day in db.execute(
+            select(models.DailyLog.id, models.DailyLog.date)
+            .where(models.DailyLog.user_id == user_id, models.DailyLog.date >= first, models.DailyLog.date <= last)
+        )
+    }
+
+    updates, inserts = [], []
+    for day in set(totals) | training_days | set(existing):
+        cal, protein, carbs, fats = totals.get(day, (0, 0, 0, 0))
+        values = {
+            "calories_actual": cal, "protein_actual": protein, "carbs_actual": carbs, "fats_actual": fats,
+            "training_day": day in training_days,
+        }
+        if day in existing:
+            updates.append({"id": existing[day], **values})
+        else:
+            inserts.append({"id": uuid.uuid4(), "user_id": user_id, "date": day, **values})
+    if updates:
+        db.execute(update(models.DailyLog), updates)
+    if inserts:
+        db.execute(insert(models.DailyLog), inserts)
+    # Bulk statements skip the session hook that keeps rollups current
+    rollups.touch(db, user_id, first, last)
+    return len(updates) + len(inserts)
+
+def import_file(db: Session, user_id, binary_file, source: str = "auto", weight_unit: str = "kg",
+                on_chunk=None) -> dict:
+    """Stage one export file's rows for user_id in db's transaction (the caller commits, or rolls
+    back on an error); returns a summary. on_chunk() runs after each chunk is written."""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    sample = text.readline()
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+    except csv.Error:
+        delimiter = ","
+    reader = csv.DictReader(itertools.chain([sample], text), delimiter=delimiter)
+    detected = detect_source(reader.fieldnames)
+    if source != "auto" and source != detected:
+        raise ImportFormatError(f"File looks like a {detected} export, not {source}")
+
+    summary = {
+        "source": detected, "rows": 0, "skipped": 0, "workouts": 0, "sets": 0, "food_logs": 0,
+        "created_exercises": [], "daily_logs_recomputed": 0, "first_date": None, "last_date": None,
+    }
+    try:
+        if detected == "mfp":
+            _import_food(db, user_id, reader, summary, on_chunk)
+        else:
+            _import_sets(db, user_id, reader, detected, weight_unit, summary, on_chunk)
+        if summary["first_date"]:
+            summary["daily_logs_recomputed"] = recompute_daily_logs(db, user_id, summary["first_date"], summary["last_date"])
+        # Bulk inserts skip the ORM events that normally invalidate these
+        cache.invalidate_on_commit(db, cache.generation_key(f"targets:{user_id}"), cache.generation_key(f"aidata:{user_id}"))
+        if summary["created_exercises"]:
+            cache.invalidate_on_commit(db, cache.generation_key("catalog:exercises"))
+    finally:
+        text.detach()
+    return summary
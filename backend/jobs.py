@@ -0,0 +1,301 @@
+"""Background jobs: deferred side effects that should not hold up a request.
+
+Jobs are rows in background_jobs, staged in the caller's transaction, so a job exists exactly
+when the request's own writes committed. Workers claim them with a conditional UPDATE (safe
+with any number of threads and processes), highest priority first, and hold a lease
+(JOB_LEASE_SECONDS) so the jobs of a crashed worker are picked up again.
+
+- retries     a failing job runs again up to max_attempts times, with exponential backoff;
+              handlers raise JobFailed for errors that retrying cannot fix
+- priorities  PRIORITY_HIGH for side effects the user is waiting to see, PRIORITY_LOW for bulk work
+- keys        enqueue(key=...) returns the queued or running job with that key instead of adding another
+- commits     a handler that does not commit itself runs exactly once: the job is marked done in
+              the same transaction as its writes
+- leases      a handler that can outlive its lease calls the function heartbeat(job) returns
+              between batches, which extends the lease while the job makes progress
+
+Handlers are registered with @handler(kind) in backend.tasks. JOB_WORKERS threads run them in
+each app process (default 1); set it to 0 to run them in a separate worker instead:
+
+    python -m backend.jobs worker --threads 2
+
+Import uploads and export results live in JOB_FILES_DIR, so every API instance and worker
+must see the same directory (a shared volume) once they run on more than one machine.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, event, or_, select, update
+
+from . import metrics, models
+from .database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "600"))
+JOB_RETRY_SECONDS = float(os.getenv("JOB_RETRY_SECONDS", "10"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_FILES_DIR = os.getenv("JOB_FILES_DIR", "./job_files")
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+ACTIVE = ("queued", "running")
+CLAIM_BATCH = 5
+PURGE_INTERVAL = 3600
+
+class JobFailed(Exception):
+    """Permanent failure: the job is marked failed without further retries."""
+
+_HANDLERS = {}
+
+def handler(kind: str):
+    """Register fn(db, job) -> JSON-able result as the handler for a job kind."""
+    def register(fn):
+        _HANDLERS[kind] = fn
+        return fn
+    return register
+
+def _load_handlers():
+    from . import tasks  # noqa: F401  (registers the handlers)
+
+def job_file(name: str) -> str:
+    """Path for a file a job reads or produces (uploads to import, finished exports)."""
+    os.makedirs(JOB_FILES_DIR, exist_ok=True)
+    return os.path.join(JOB_FILES_DIR, os.path.basename(name))
+
+# ---------- Enqueue ----------
+
+_PENDING = "jobs_enqueued"
+_wakeup = threading.Event()
+
+def enqueue(db, kind: str, payload: dict, *, user_id=None, key: Optional[str] = None,
+            priority: int = PRIORITY_NORMAL, max_attempts: int = 3, delay: float = 0) -> models.BackgroundJob:
+    """Stage a job in db's transaction (the caller commits) and return it."""
+    if key is not None:
+        # The partial unique index on key backs this up if two requests race
+        existing = db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.key == key,
+            models.BackgroundJob.status.in_(ACTIVE)
+        ).first()
+        if existing:
+            return existing
+    now = datetime.utcnow()
+    job = models.BackgroundJob(
+        id=uuid.uuid4(),
+        kind=kind,
+        user_id=user_id,
+        key=key,
+        payload=jsonable_encoder(payload),
+        priority=priority,
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_at=now + timedelta(seconds=delay),
+        created_at=now,
+    )
+    db.add(job)
+    db.info[_PENDING] = True
+    return job
+
+def install(session_factory):
+    """Wake this process's workers as soon as a transaction that enqueued jobs commits."""
+    def after_commit(session):
+        if session.info.pop(_PENDING, False):
+            _wakeup.set()
+
+    event.listen(session_factory, "after_commit", after_commit)
+    event.listen(session_factory, "after_soft_rollback", lambda session, previous: session.info.pop(_PENDING, None))
+
+# ---------- Running ----------
+
+def _claim(db) -> Optional[uuid.UUID]:
+    J = models.BackgroundJob
+    now = datetime.utcnow()
+    ready = or_(
+        and_(J.status == "queued", J.run_at <= now),
+        and_(J.status == "running", J.locked_until < now),  # lease of a lost worker ran out
+    )
+    candidates = db.execute(
+        select(J.id).where(ready).order_by(J.priority.desc(), J.run_at).limit(CLAIM_BATCH)
+    ).scalars().all()
+    for job_id in candidates:
+        # Only one worker's UPDATE can still match; the others move on to the next candidate
+        claimed = db.execute(
+            update(J).where(J.id == job_id, ready).values(
+                status="running",
+                attempts=J.attempts + 1,
+                locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS),
+            )
+        ).rowcount
+        db.commit()
+        if claimed:
+            return job_id
+    return None
+
+def run_one() -> bool:
+    """Claim and run the next due job; False when there was none."""
+    with SessionLocal() as db:
+        job_id = _claim(db)
+        if job_id is None:
+            return False
+        job = db.get(models.BackgroundJob, job_id)
+        kind = job.kind
+        start = time.perf_counter()
+        try:
+            fn = _HANDLERS.get(kind)
+            if fn is None:
+                raise JobFailed(f"No handler for job kind {kind!r}")
+            if job.attempts > job.max_attempts:
+                raise JobFailed("Abandoned by its worker too many times")
+            result = fn(db, job)
+            job.status = "done"
+            job.result = jsonable_encoder(result)
+            job.error = None
+            job.locked_until = None
+            job.finished_at = datetime.utcnow()
+            db.commit()
+            outcome = "done"
+        except Exception as e:
+            db.rollback()
+            job = db.get(models.BackgroundJob, job_id)
+            job.error = f"{type(e).__name__}: {e}"[:2000]
+            job.locked_until = None
+            if isinstance(e, JobFailed) or job.attempts >= job.max_attempts:
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+                outcome = "failed"
+                logger.error("Job %s (%s) failed: %s", job_id, kind, job.error)
+            else:
+                job.status = "queued"
+                job.run_at = datetime.utcnow() + timedelta(seconds=JOB_RETRY_SECONDS * 2 ** (job.attempts - 1))
+                outcome = "retry"
+                logger.warning("Job %s (%s) attempt %d failed, retrying: %s", job_id, kind, job.attempts, job.error)
+            db.commit()
+        metrics.JOBS.inc(kind, outcome)
+        metrics.JOB_DURATION.observe(time.perf_counter() - start, kind)
+    return True
+
+def heartbeat(job) -> Callable[[], None]:
+    """A function for a long handler to call between batches: once a third of the lease has
+    passed it extends the lease, from its own session since the handler's transaction is still
+    open, so no other worker takes the job over while it is making progress."""
+    job_id = job.id
+    renewed = time.monotonic()
+
+    def beat():
+        nonlocal renewed
+        if time.monotonic() - renewed < JOB_LEASE_SECONDS / 3:
+            return
+        renewed = time.monotonic()
+        if engine.dialect.name == "sqlite":
+            return  # one writer at a time: no worker can claim anything while the handler's transaction writes
+        with SessionLocal() as db:
+            db.execute(
+                update(models.BackgroundJob)
+                .where(models.BackgroundJob.id == job_id, models.BackgroundJob.status == "running")
+                .values(locked_until=datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS))
+            )
+            db.commit()
+    return beat
+
+def _job_files(job) -> list:
+    return [f for f in ((job.payload or {}).get("file"), (job.result or {}).get("file")) if f]
+
+def purge_finished(days: int = JOB_RETENTION_DAYS) -> int:
+    """Delete jobs finished more than `days` ago, with their files."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    with SessionLocal() as db:
+        old = db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.status.in_(("done", "failed")),
+            models.BackgroundJob.finished_at < cutoff
+        ).all()
+        for job in old:
+            for name in _job_files(job):
+                try:
+                    os.remove(job_file(name))
+                except FileNotFoundError:
+                    pass
+            db.delete(job)
+        db.commit()
+    return len(old)
+
+class Worker:
+    """Threads polling for jobs; woken early when this process enqueues one."""
+
+    def __init__(self, threads: int):
+        self.threads = threads
+        self._stop = threading.Event()
+        self._threads = []
+        self._next_purge = 0.0
+
+    def start(self):
+        _load_handlers()
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                if run_one():
+                    continue
+                if time.monotonic() >= self._next_purge:
+                    self._next_purge = time.monotonic() + PURGE_INTERVAL
+                    purge_finished()
+            except Exception:
+                # e.g. the database is briefly unreachable; the job's lease covers a lost claim
+                logger.exception("Job worker error")
+            _wakeup.wait(JOB_POLL_SECONDS)
+            _wakeup.clear()
+
+    def stop(self, timeout: float = 10):
+        """Let running jobs finish (up to timeout); unfinished ones are resumed after their lease."""
+        self._stop.set()
+        _wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+def start_in_process() -> Optional[Worker]:
+    return Worker(JOB_WORKERS).start() if JOB_WORKERS > 0 else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Workout Monster background jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="run jobs until interrupted")
+    worker.add_argument("--threads", type=int, default=1)
+    sub.add_parser("purge", help="delete finished jobs older than JOB_RETENTION_DAYS")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # The same session hooks the API installs, so job writes invalidate caches and update rollups
+    from . import cache, rollups
+    cache.install(SessionLocal)
+    install(SessionLocal)
+    rollups.install(SessionLocal)
+    if args.command == "purge":
+        print(f"Deleted {purge_finished()} jobs")
+        return
+    runner = Worker(args.threads).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        runner.stop()
+
+if __name__ == "__main__":
+    # Run from the imported module: backend.tasks registers its handlers (and wakes workers) there
+    from backend import jobs
+    jobs.main()
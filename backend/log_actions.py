@@ -0,0 +1,138 @@
+"""Logging from AI chat replies: parse every log_action block, validate, apply in one go.
+
+The coach appends fenced blocks to its reply, one JSON object per line (a JSON array or a
+single object per block is accepted too):
+
+    ```log_action
+    {"type": "food_log", "name": "eggs", "calories": 150, "protein": 12, "carbs": 1, "fats": 10}
+    {"type": "food_log", "name": "rice", "calories": 200, "protein": 4, "carbs": 45, "fats": 0}
+    {"type": "body_stat", "weight_kg": 80}
+    ```
+
+parse() strips the blocks from the visible reply and validates each action against
+schemas.FoodLogAction / BodyStatAction; malformed or invalid entries are counted, never
+half-applied. apply() writes all of them in the caller's transaction, through the same
+DailyLog increment as /nutrition/meals and the same frequent-foods index as every food log.
+"""
+import json
+import logging
+import re
+from datetime import date, datetime
+from typing import Annotated
+
+from pydantic import Field, TypeAdapter, ValidationError
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import cache, frequent_foods, models, rollups, schemas
+
+logger = logging.getLogger(__name__)
+
+MAX_ACTIONS = 20
+
+_BLOCK = re.compile(r"```log_action[ \t]*\n?(.*?)(?:```|\Z)", re.S)
+_ACTION = TypeAdapter(Annotated[schemas.LogAction, Field(discriminator="type")])
+
+def _candidates(block: str) -> list:
+    block = block.strip()
+    if not block:
+        return []
+    try:
+        value = json.loads(block)
+        return value if isinstance(value, list) else [value]
+    except json.JSONDecodeError:
+        pass
+    candidates = []
+    for line in block.splitlines():
+        line = line.strip().rstrip(",")
+        if not line:
+            continue
+        try:
+            candidates.append(json.loads(line))
+        except json.JSONDecodeError:
+            candidates.append(None)  # counted as rejected
+    return candidates
+
+def parse(text: str) -> tuple:
+    """(reply without the blocks, valid actions, number of rejected entries)."""
+    actions, rejected = [], 0
+    for block in _BLOCK.findall(text):
+        for candidate in _candidates(block):
+            try:
+                actions.append(_ACTION.validate_python(candidate))
+            except ValidationError as e:
+                rejected += 1
+                logger.warning("Rejected log_action %r: %s", candidate, e.errors(include_url=False))
+    if len(actions) > MAX_ACTIONS:
+        rejected += len(actions) - MAX_ACTIONS
+        actions = actions[:MAX_ACTIONS]
+    return _BLOCK.sub("", text).strip(), actions, rejected
+
+def validate(raw: list) -> list:
+    """Actions from a job payload back into schema objects (raises ValidationError)."""
+    return [_ACTION.validate_python(action) for action in raw]
+
+def add_to_daily_log(db: Session, user_id, day: date, totals: dict):
+    """Add calories/protein/carbs/fats to the day's DailyLog (created if missing); staged in db's transaction."""
+    # The UPDATE bypasses the session hooks: rollups take the day's sums before it
+    rollups.watch(db, user_id, day)
+    # Increment in SQL so concurrent logging for the same day cannot lose an update
+    updated = db.execute(
+        update(models.DailyLog)
+        .where(models.DailyLog.user_id == user_id, models.DailyLog.date == day)
+        .values(
+            calories_actual=models.DailyLog.calories_actual + totals["calories"],
+            protein_actual=models.DailyLog.protein_actual + totals["protein"],
+            carbs_actual=models.DailyLog.carbs_actual + totals["carbs"],
+            fats_actual=models.DailyLog.fats_actual + totals["fats"],
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        db.add(models.DailyLog(
+            user_id=user_id,
+            date=day,
+            calories_actual=totals["calories"],
+            protein_actual=totals["protein"],
+            carbs_actual=totals["carbs"],
+            fats_actual=totals["fats"]
+        ))
+    cache.invalidate_on_commit(db, cache.generation_key(f"aidata:{user_id}"))
+
+def apply(db: Session, user_id, actions: list, day: date, when: datetime) -> list:
+    """Stage every action in db's transaction (the caller commits once); returns what was logged."""
+    logged, eaten = [], []
+    totals = {"calories": 0, "protein": 0, "carbs": 0, "fats": 0}
+    stats = None
+    for action in actions:
+        if action.type == "food_log":
+            entry = {
+                "name": action.name, "calories": round(action.calories), "protein": round(action.protein),
+                "carbs": round(action.carbs), "fats": round(action.fats),
+            }
+            fl = models.FoodLog(user_id=user_id, date=day, time=when, **entry)
+            db.add(fl)
+            for field in totals:
+                totals[field] += entry[field]
+            eaten.append(entry)
+            logged.append({"type": "food_log", **entry})
+        else:
+            if stats is None:
+                stats = db.query(models.UserStats).filter(
+                    models.UserStats.user_id == user_id,
+                    models.UserStats.date == day
+                ).first()
+            if stats is None:
+                # Get current TDEE estimate
+                user = db.get(models.User, user_id)
+                settings = (user.settings if user else None) or {}
+                stats = models.UserStats(user_id=user_id, date=day, tdee_current=float(settings.get("tdee", 2000)))
+                db.add(stats)
+            values = action.model_dump(exclude={"type"}, exclude_none=True)
+            for field, value in values.items():
+                setattr(stats, field, value)
+            logged.append({"type": "body_stat", **values})
+    if eaten:
+        add_to_daily_log(db, user_id, day, totals)
+        frequent_foods.record(db, user_id, eaten, when)
+    return logged
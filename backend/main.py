@@ -1,13 +1,48 @@
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine
-from . import models
+from fastapi.responses import PlainTextResponse
+import httpx
+from .database import engine, SessionLocal
+from . import cache, jobs, passwords, metrics, querydebug, profiling, ratelimit, rollups, startup
 from .routers import auth, user, training, nutrition, ai
 
-models.Base.metadata.create_all(bind=engine)
+metrics.instrument_engine(engine)
+querydebug.instrument_engine(engine)
+cache.install(SessionLocal)
+jobs.install(SessionLocal)
+rollups.install(SessionLocal)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema check and warm-up happen here, not at import, and are timed per phase
+    timer = startup.PhaseTimer()
+    timer.record("import", _imported - _import_started)
+    startup.run(timer)
+    # One pooled client for outbound calls (Google userinfo) instead of a new TLS handshake per request
+    app.state.http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(5.0, connect=3.0),
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=10),
+    )
+    app.state.job_worker = jobs.start_in_process()
+    timer.report()
+    yield
+    await app.state.http_client.aclose()
+    if app.state.job_worker:
+        app.state.job_worker.stop()
+    passwords.shutdown()
 
-app = FastAPI(title="Workout Monster API")
+app = FastAPI(title="Workout Monster API", lifespan=lifespan)
 
+# Middleware added last runs first: metrics > CORS > admission > profiling > routes
+# Profiling runs inside metrics so it can read the request's DB time
+app.add_middleware(profiling.ProfilingMiddleware)
+# Shed load before any routing or DB work; still inside metrics so 503s are counted
+app.add_middleware(ratelimit.AdmissionMiddleware)
+# Outside admission control, so its 503s carry CORS headers and browsers can read and retry them
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for dev
@@ -15,6 +50,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(user.router)
@@ -25,3 +61,10 @@ app.include_router(ai.router)
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Workout Monster API"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """Prometheus scrape endpoint (per worker process)"""
+    return metrics.render_metrics()
+
+_imported = time.perf_counter()
@@ -0,0 +1,189 @@
+"""Per-route request latency and DB query instrumentation, exposed in Prometheus text format.
+
+MetricsMiddleware times every request and labels it with the route template
+("/training/plans/{plan_id}", never the raw path). SQLAlchemy cursor hooks count the
+queries and DB time of the request currently in flight via a context variable, which
+also reaches sync endpoints running in the threadpool.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+class RequestStats:
+    """Mutable per-request accumulator shared by the middleware and the DB hooks."""
+    __slots__ = ("scope", "queries", "db_time", "statements")
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}  # statement -> executions, used by the N+1 detector
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Gauge:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self._lock:
+            for labels, row in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, row):
+                    lines.append(f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} {row[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {row[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {row[-1]}")
+        return lines
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency", ("method", "route"))
+REQUEST_QUERIES = Histogram("db_queries_per_request", "DB queries issued per request", ("method", "route"), QUERY_COUNT_BUCKETS)
+REQUEST_DB_TIME = Histogram("db_time_per_request_seconds", "Time spent in DB queries per request", ("method", "route"))
+QUERIES = Counter("db_queries_total", "All DB queries, including ones outside requests")
+QUERY_TIME = Counter("db_query_seconds_total", "Total time spent in DB queries")
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by key namespace and result", ("namespace", "result"))
+STARTUP_PHASES = Gauge("app_startup_phase_seconds", "Time spent in each start-up phase of this worker", ("phase",))
+
+RATE_LIMITED = Counter("rate_limited_total", "Requests rejected with 429 by rate limit budget", ("budget",))
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Requests shed with 503 by admission control", ("lane",))
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests holding an admission slot in this worker", ("lane",))
+JOBS = Counter("background_jobs_total", "Background job runs by kind and outcome (done, retry, failed)", ("kind", "outcome"))
+JOB_DURATION = Histogram("background_job_duration_seconds", "Background job run time", ("kind",))
+
+REGISTRY = [REQUESTS, REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, QUERIES, QUERY_TIME, CACHE_REQUESTS, STARTUP_PHASES,
+            RATE_LIMITED, ADMISSION_REJECTED, IN_FLIGHT, JOBS, JOB_DURATION]
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ---------- SQLAlchemy hooks ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+    QUERIES.inc()
+    QUERY_TIME.inc(amount=elapsed)
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+# ---------- ASGI middleware ----------
+
+def route_template(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware overhead) recording per-route metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            # The router fills scope["route"] in place once it has matched
+            route = route_template(scope)
+            method = scope["method"]
+            REQUESTS.inc(method, route, str(status_code))
+            REQUEST_LATENCY.observe(elapsed, method, route)
+            REQUEST_QUERIES.observe(stats.queries, method, route)
+            REQUEST_DB_TIME.observe(stats.db_time, method, route)
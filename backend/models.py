@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Date, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Date, JSON, LargeBinary, Index, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -99,6 +99,52 @@ class FoodLog(Base):
 
     user = relationship("User")
 
+class UserRollup(Base):
+    """Weekly or monthly sums per user, maintained by backend.rollups."""
+    __tablename__ = "user_rollups"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    period = Column(String)  # "week" (starting Monday) or "month"
+    period_start = Column(Date)
+    days_logged = Column(Integer, default=0)  # days with food logged
+    calories_sum = Column(Integer, default=0)
+    protein_sum = Column(Integer, default=0)
+    calories_target_sum = Column(Integer, default=0)  # over the logged days
+    protein_target_sum = Column(Integer, default=0)
+    calorie_days_on_target = Column(Integer, default=0)
+    protein_days_on_target = Column(Integer, default=0)
+    workouts = Column(Integer, default=0)
+    training_days = Column(Integer, default=0)
+    sets = Column(Integer, default=0)
+    volume_kg = Column(Float, default=0)  # weight x reps of working sets
+    training_minutes = Column(Float, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("uq_user_rollups_period", "user_id", "period", "period_start", unique=True),
+    )
+
+class FrequentFood(Base):
+    """One of a user's recent/frequent foods, kept up to date by backend.frequent_foods."""
+    __tablename__ = "frequent_foods"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    food_key = Column(String)  # "food:<food_id>" for catalog foods, "name:<lowercased name>" otherwise
+    food_id = Column(UUID(as_uuid=True), ForeignKey("food_items.id"), nullable=True)
+    name = Column(String)
+    servings = Column(Float, nullable=True)  # last logged, for catalog foods
+    calories = Column(Integer)  # last logged amounts
+    protein = Column(Integer)
+    carbs = Column(Integer)
+    fats = Column(Integer)
+    rank = Column(Float)  # log2 of the decayed log count, on a time-independent scale
+    last_logged_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("uq_frequent_foods_user_key", "user_id", "food_key", unique=True),
+        Index("ix_frequent_foods_user_rank", "user_id", "rank"),
+    )
+
 # New models for custom workout plans
 class TrainingPlan(Base):
     __tablename__ = "training_plans"
@@ -141,3 +187,110 @@ class FoodItem(Base):
     serving_size = Column(String)  # e.g., "100g", "1 cup"
     serving_size_zh = Column(String, nullable=True)
     category = Column(String, nullable=True)  # e.g., "protein", "carbs", "vegetables"
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    token_hash = Column(LargeBinary(32), primary_key=True)  # sha256 of the token, the token itself is never stored
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), index=True)
+    family_id = Column(UUID(as_uuid=True), index=True)  # every rotation descending from one login
+    expires_at = Column(DateTime)
+    revoked = Column(Boolean, default=False)  # rotated or logged out; kept until expiry to detect reuse
+
+class BackgroundJob(Base):
+    """A unit of deferred work, run by backend.jobs (in-process or by a separate worker)."""
+    __tablename__ = "background_jobs"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    kind = Column(String)  # handler name, e.g. "import_file"
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True, index=True)
+    key = Column(String, nullable=True)  # idempotency key: one queued/running job per key
+    payload = Column(JSON, default={})
+    priority = Column(Integer, default=0)  # higher runs first
+    status = Column(String, default="queued")  # queued / running / done / failed
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_at = Column(DateTime, default=datetime.utcnow)  # not before; pushed back between retries
+    locked_until = Column(DateTime, nullable=True)  # lease of the worker running it
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_background_jobs_claim", "status", "priority", "run_at"),
+        Index(
+            "uq_background_jobs_active_key", "key", unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+class Conversation(Base):
+    """An AI coach conversation: a running summary plus the exchanges (see backend.conversations)."""
+    __tablename__ = "conversations"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    title = Column(String)  # start of the first message
+    summary = Column(String, nullable=True)  # exchanges 1..summarized_turns, condensed
+    summarized_turns = Column(Integer, default=0)
+    turns = Column(Integer, default=0)  # seq of the last exchange
+    bytes = Column(Integer, default=0)  # stored (compressed) size of its exchanges
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_conversations_user_updated", "user_id", "updated_at"),
+    )
+
+class ConversationTurn(Base):
+    """One exchange (user message and reply), zlib-compressed JSON."""
+    __tablename__ = "conversation_turns"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    conversation_id = Column(UUID(as_uuid=True), ForeignKey("conversations.id"))
+    seq = Column(Integer)
+    body = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("uq_conversation_turns_seq", "conversation_id", "seq", unique=True),
+    )
+
+class PersonalRecord(Base):
+    """Best set per user, exercise and rep count (reps = 0: best estimated 1RM); see backend.prs."""
+    __tablename__ = "personal_records"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    exercise_id = Column(UUID(as_uuid=True), ForeignKey("exercises.id"))
+    reps = Column(Integer)
+    weight_kg = Column(Float)
+    set_reps = Column(Integer)  # reps of the record set (differs from reps for the 1RM record)
+    e1rm = Column(Float)
+    set_id = Column(UUID(as_uuid=True), ForeignKey("workout_sets.id"))
+    achieved_at = Column(DateTime)  # start of the set's workout
+
+    __table_args__ = (
+        Index("uq_personal_records_reps", "user_id", "exercise_id", "reps", unique=True),
+    )
+
+class TrainingLoad(Base):
+    """Training load per user and day (see backend.workload)."""
+    __tablename__ = "training_load"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    date = Column(Date)  # day of the workouts' start
+    load = Column(Float, default=0)  # sum of weight x reps x RPE / 10 over working sets
+    sets = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index("uq_training_load_day", "user_id", "date", unique=True),
+    )
+
+class WorkloadState(Base):
+    """Rolling acute (7-day) and chronic (28-day) load sums per user, for the windows ending on as_of."""
+    __tablename__ = "workload_state"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), unique=True)
+    as_of = Column(Date)
+    since = Column(Date)  # first day with load: there is no chronic baseline before CHRONIC_DAYS of history
+    acute = Column(Float, default=0)
+    chronic = Column(Float, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,97 @@
+"""Argon2 password hashing, offloaded to a bounded process pool.
+
+Hashing is deliberately expensive, so running it inline lets a login storm pin every
+worker thread. Requests instead hand the work to a small dedicated process pool and
+give up quickly (HashPoolBusy) when too many are already waiting.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+from passlib.hash import argon2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Argon2 cost parameters. Defaults are passlib's own, so existing hashes stay valid;
+# changing any of them makes old hashes "deprecated" and they are rehashed on next login.
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", str(argon2.default_rounds)))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", str(argon2.memory_cost)))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", str(argon2.parallelism)))
+
+# Per app process, so keep it small: every uvicorn worker has its own pool.
+# 0 workers hashes inline in the calling thread (handy for local dev and scripts)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(max(1, PASSWORD_HASH_WORKERS) * 4)))
+PASSWORD_HASH_WAIT_SECONDS = float(os.getenv("PASSWORD_HASH_WAIT_SECONDS", "2"))
+
+pwd_context = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__time_cost=ARGON2_TIME_COST,
+    argon2__memory_cost=ARGON2_MEMORY_COST,
+    argon2__parallelism=ARGON2_PARALLELISM,
+)
+
+class HashPoolBusy(Exception):
+    """Raised when the hashing pool is saturated and the caller should back off."""
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Spawned, not forked: the app process already runs threads (event loop, job workers)
+                _pool = ProcessPoolExecutor(
+                    max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+def _run(fn, *args):
+    if not _pending.acquire(timeout=PASSWORD_HASH_WAIT_SECONDS):
+        raise HashPoolBusy()
+    try:
+        if PASSWORD_HASH_WORKERS <= 0:
+            return fn(*args)
+        return _get_pool().submit(fn, *args).result()
+    finally:
+        _pending.release()
+
+# Module-level so they can be pickled into the worker processes
+def _hash(password):
+    return pwd_context.hash(password)
+
+def _verify_and_update(password, hashed):
+    try:
+        return pwd_context.verify_and_update(password, hashed)
+    except (ValueError, TypeError):
+        # Not an argon2 hash at all (e.g. Google-only accounts)
+        return False, None
+
+def _load_backend():
+    pwd_context.handler().get_backend()
+
+def warm():
+    """Load the argon2 backend and start a hashing worker before the first login needs them."""
+    _load_backend()
+    if PASSWORD_HASH_WORKERS > 0:
+        _get_pool().submit(_load_backend).result()
+
+def hash_password(password):
+    return _run(_hash, password)
+
+def verify_and_update(password, hashed):
+    """Return (valid, new_hash); new_hash is set when the stored hash uses outdated parameters."""
+    return _run(_verify_and_update, password, hashed)
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
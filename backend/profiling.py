@@ -0,0 +1,186 @@
+"""Opt-in profiling of individual live requests.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` (admin only; the header is
+ignored unless PROFILE_TOKEN is set) or is picked by PROFILE_SAMPLE_RATE. For that request we
+write, under PROFILE_DIR:
+
+- <id>.prof  cProfile stats (event loop thread plus the threadpool thread running a sync endpoint)
+- <id>.json  timing breakdown: auth, db, endpoint, serialization, llm and total
+             (serialization is handler time outside the endpoint and auth, so it also
+             covers request parsing and dependency set-up)
+
+The id is returned in the X-Profile-Id response header. Only one request is profiled at a
+time; others simply run unprofiled, so this is safe to leave enabled in production.
+"""
+import asyncio
+import cProfile
+import functools
+import json
+import os
+import pstats
+import random
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+from .metrics import current_request, route_template
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+
+class Timings:
+    def __init__(self):
+        self.phases = {}
+        self.profiles = []  # extra cProfile runs from threadpool threads
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+current_timings: ContextVar[Optional[Timings]] = ContextVar("current_timings", default=None)
+
+@contextmanager
+def phase(name: str):
+    """Attribute the enclosed block to `name` in the breakdown (no-op unless profiling)."""
+    timings = current_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+def _timed_endpoint(endpoint):
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            with phase("endpoint"):
+                return await endpoint(*args, **kwargs)
+        return wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        timings = current_timings.get()
+        if timings is None:
+            return endpoint(*args, **kwargs)
+        # Sync endpoints run in a threadpool thread the request's profiler cannot see
+        # (on 3.12+ profilers are process-wide, enable() fails and the main one already covers it)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            profiler = None
+        start = time.perf_counter()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            timings.add("endpoint", time.perf_counter() - start)
+            if profiler is not None:
+                profiler.disable()
+                timings.profiles.append(profiler)
+    return wrapper
+
+class ProfiledRoute(APIRoute):
+    """Route class that splits handler time into endpoint and response serialization."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            timings = current_timings.get()
+            if timings is None:
+                return await handler(request)
+            start = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                timings.add("handler", time.perf_counter() - start)
+
+        return profiled_handler
+
+_profile_lock = threading.Lock()
+
+def _wants_profile(scope) -> bool:
+    if PROFILE_TOKEN:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-profile":
+                return secrets.compare_digest(value.decode("latin-1"), PROFILE_TOKEN)
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def _write_profile(profile_id, profilers, report):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stats = pstats.Stats(profilers[0])
+    for extra in profilers[1:]:
+        stats.add(extra)
+    stats.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; must sit inside MetricsMiddleware to read the request's DB time."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope) or not _profile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")[:60]
+            profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{scope['method']}_{slug}"
+            timings = Timings()
+            token = current_timings.set(timings)
+            status_code = 500
+
+            async def send_wrapper(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+                await send(message)
+
+            # Note: the event loop profiler also sees other requests interleaved on the loop
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+                total = time.perf_counter() - start
+                current_timings.reset(token)
+
+            phases = timings.phases
+            stats = current_request.get()
+            report = {
+                "id": profile_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route_template(scope),
+                "status": status_code,
+                "total_ms": round(total * 1000, 2),
+                "auth_ms": round(phases.get("auth", 0.0) * 1000, 2),
+                "db_ms": round(stats.db_time * 1000, 2) if stats else None,
+                "db_queries": stats.queries if stats else None,
+                "endpoint_ms": round(phases.get("endpoint", 0.0) * 1000, 2),
+                "serialization_ms": round(max(0.0, phases.get("handler", 0.0) - phases.get("endpoint", 0.0) - phases.get("auth", 0.0)) * 1000, 2),
+                "llm_ms": round(phases.get("llm", 0.0) * 1000, 2),
+            }
+            await run_in_threadpool(_write_profile, profile_id, [profiler] + timings.profiles, report)
+        finally:
+            _profile_lock.release()
@@ -0,0 +1,169 @@
+"""Personal-record index: the best set per (user, exercise, rep count) plus the best estimated 1RM.
+
+personal_records holds, per user and exercise, one row per rep count from 1 to PR_MAX_REPS
+(the heaviest working set done for exactly that many reps) and one row with reps = 0 for
+the highest estimated 1RM (Epley: weight * (1 + reps / 30)). Each row points at the set that
+set it, dated by its workout's start, and an earlier set keeps the record on a tie.
+
+- record_set()  called by POST /training/set: one indexed read, then an upsert per record the set
+                beats that only wins if it still beats the stored row; returns the new PRs
+- forget_set()  called before a set is deleted: only records held by that set are recomputed
+- rebuild()     recomputes a user's records from their sets (imports, backfill):
+
+    python -m backend.prs rebuild [--email someone@example.com]
+"""
+import argparse
+import os
+from datetime import datetime
+from typing import Iterable, Optional
+
+from sqlalchemy import case, delete, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, upsert
+
+PR_MAX_REPS = int(os.getenv("PR_MAX_REPS", "20"))
+
+E1RM = 0  # reps value of the estimated-1RM record
+
+def e1rm(weight_kg: float, reps: int) -> float:
+    return weight_kg if reps == 1 else weight_kg * (1 + reps / 30)
+
+def counts(weight_kg, reps, is_warmup=False) -> bool:
+    """Whether a set can hold a record: a working set of 1..PR_MAX_REPS reps with weight."""
+    return not is_warmup and bool(weight_kg) and weight_kg > 0 and reps is not None and 1 <= reps <= PR_MAX_REPS
+
+def _score(reps_key: int, weight_kg: float, reps: int) -> float:
+    return e1rm(weight_kg, reps) if reps_key == E1RM else weight_kg
+
+def _stored_score(reps_key: int):
+    """_score() of the stored record, in SQL."""
+    P = models.PersonalRecord
+    if reps_key == E1RM:
+        return case((P.set_reps == 1, P.weight_kg), else_=P.weight_kg * (1 + P.set_reps / 30.0))
+    return P.weight_kg
+
+def _values(workout_set, achieved_at: datetime) -> dict:
+    # workout_set: a WorkoutSets or a row with its id, weight_kg and reps
+    return {
+        "weight_kg": workout_set.weight_kg, "set_reps": workout_set.reps,
+        "e1rm": round(e1rm(workout_set.weight_kg, workout_set.reps), 2),
+        "set_id": workout_set.id, "achieved_at": achieved_at,
+    }
+
+def _held(db: Session, user_id, exercise_id, reps: int) -> dict:
+    """{reps key: (weight_kg, set_reps)} of the records a set of reps could beat."""
+    P = models.PersonalRecord
+    return {
+        reps_key: (weight_kg, set_reps) for reps_key, weight_kg, set_reps in db.execute(
+            select(P.reps, P.weight_kg, P.set_reps)
+            .where(P.user_id == user_id, P.exercise_id == exercise_id, P.reps.in_((reps, E1RM)))
+        )
+    }
+
+def record_set(db: Session, user_id, workout_set: models.WorkoutSets, achieved_at: datetime) -> list:
+    """Update the records a new set beats (staged in db's transaction); returns them as dicts
+    with the previous best, for flagging PRs in the response."""
+    if not counts(workout_set.weight_kg, workout_set.reps, workout_set.is_warmup):
+        return []
+    P = models.PersonalRecord
+    held = _held(db, user_id, workout_set.exercise_id, workout_set.reps)
+    values = _values(workout_set, achieved_at)
+    hits = []
+    for reps_key in (workout_set.reps, E1RM):
+        score = _score(reps_key, workout_set.weight_kg, workout_set.reps)
+        previous = _score(reps_key, *held[reps_key]) if reps_key in held else None
+        if previous is not None and score <= previous + 1e-9:
+            continue
+        if not hits:
+            db.flush()  # the record points at the set
+        # Another request may have written this record since the read: insert or update in one
+        # statement, and only replace a record this set still beats
+        stmt = upsert(db, P).values(user_id=user_id, exercise_id=workout_set.exercise_id, reps=reps_key, **values)
+        written = db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[P.user_id, P.exercise_id, P.reps],
+                set_={field: stmt.excluded[field] for field in values},
+                where=_stored_score(reps_key) + 1e-9 < score,
+            ).returning(P.id)
+        ).first()
+        if written is None:
+            continue
+        hits.append({
+            "kind": "e1rm" if reps_key == E1RM else "rep_max",
+            "reps": workout_set.reps,
+            "weight_kg": workout_set.weight_kg,
+            "e1rm": values["e1rm"],
+            "previous": round(previous, 2) if previous is not None else None,
+        })
+    return hits
+
+def _best_sets(db: Session, user_id, exercise_ids: Optional[Iterable] = None, exclude_set_id=None) -> dict:
+    """{(exercise_id, reps key): set row} over the user's sets, the earliest set winning ties."""
+    S, W = models.WorkoutSets, models.Workouts
+    query = (
+        select(S.id, S.exercise_id, S.weight_kg, S.reps, W.start_time)
+        .join(W, S.workout_id == W.id)
+        .where(W.user_id == user_id, S.is_warmup.isnot(True), S.weight_kg > 0, S.reps.between(1, PR_MAX_REPS))
+        .order_by(W.start_time, S.set_order)
+    )
+    if exercise_ids is not None:
+        query = query.where(S.exercise_id.in_(list(exercise_ids)))
+    if exclude_set_id is not None:
+        query = query.where(S.id != exclude_set_id)
+    best = {}
+    for row in db.execute(query.execution_options(yield_per=5000)):
+        for reps_key in (row.reps, E1RM):
+            held = best.get((row.exercise_id, reps_key))
+            if held is None or _score(reps_key, row.weight_kg, row.reps) > _score(reps_key, held.weight_kg, held.reps) + 1e-9:
+                best[(row.exercise_id, reps_key)] = row
+    return best
+
+def rebuild(db: Session, user_id, exercise_ids: Optional[Iterable] = None, exclude_set_id=None) -> int:
+    """Recompute user_id's records (only for exercise_ids when given); staged in db's transaction."""
+    P = models.PersonalRecord
+    if exercise_ids is not None:
+        exercise_ids = set(exercise_ids)
+        if not exercise_ids:
+            return 0
+    best = _best_sets(db, user_id, exercise_ids, exclude_set_id)
+    stale = delete(P).where(P.user_id == user_id)
+    if exercise_ids is not None:
+        stale = stale.where(P.exercise_id.in_(exercise_ids))
+    db.execute(stale)
+    for (exercise_id, reps_key), row in best.items():
+        db.add(P(user_id=user_id, exercise_id=exercise_id, reps=reps_key, **_values(row, row.start_time)))
+    db.flush()
+    return len(best)
+
+def forget_set(db: Session, user_id, workout_set: models.WorkoutSets):
+    """Before deleting a set: recompute the records it holds from the remaining sets."""
+    held = db.query(models.PersonalRecord.id).filter(
+        models.PersonalRecord.user_id == user_id,
+        models.PersonalRecord.set_id == workout_set.id
+    ).first()
+    if held is not None:
+        rebuild(db, user_id, [workout_set.exercise_id], exclude_set_id=workout_set.id)
+
+def main():
+    parser = argparse.ArgumentParser(description="Personal-record index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = sub.add_parser("rebuild", help="recompute all records from logged sets")
+    rebuild_parser.add_argument("--email", help="only this user")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        query = select(models.User.id)
+        if args.email:
+            query = query.where(models.User.email == args.email)
+        user_ids = db.execute(query).scalars().all()
+    total = 0
+    for user_id in user_ids:
+        with SessionLocal() as db:
+            total += rebuild(db, user_id)
+            db.commit()
+    print(f"{total} records rebuilt for {len(user_ids)} users")
+
+if __name__ == "__main__":
+    main()
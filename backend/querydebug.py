@@ -0,0 +1,100 @@
+"""N+1 query detector and slow-query log.
+
+The detector (QUERY_DEBUG=log or raise, meant for development and tests) counts identical
+SQL statements within one request; once a statement repeats N_PLUS_ONE_THRESHOLD times it
+logs the route and the application stack that issued it, or raises NPlusOneDetected so the
+request (and the test driving it) fails. The slow-query log is always on and logs any
+statement slower than SLOW_QUERY_MS.
+
+Tests can also pin a query count directly:
+
+    with query_budget(engine, 3):
+        client.get("/training/plans/...")
+"""
+import logging
+import os
+import time
+import traceback
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from .metrics import current_request, route_template
+
+logger = logging.getLogger(__name__)
+
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "off").lower()  # off | log | raise
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class NPlusOneDetected(Exception):
+    pass
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+def _app_stack() -> str:
+    """The issuing call stack, trimmed to frames from this application."""
+    frames = [
+        f for f in traceback.extract_stack()[:-3]
+        if f.filename.startswith(_APP_DIR) and not f.filename.endswith("querydebug.py")
+    ]
+    return "".join(traceback.format_list(frames))
+
+def _current_route() -> str:
+    stats = current_request.get()
+    if stats is None or stats.scope is None:
+        return "-"
+    return route_template(stats.scope)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("querydebug_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["querydebug_start_time"].pop()) * 1000
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s\n%s", elapsed_ms, _current_route(), statement, _app_stack()
+        )
+
+    # Bulk writes repeating one executemany per chunk are batched already, not N+1
+    if QUERY_DEBUG == "off" or executemany:
+        return
+    stats = current_request.get()
+    if stats is None:
+        return
+    # Parameters are bound separately, so the statement text is the query's shape
+    count = stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    if count != N_PLUS_ONE_THRESHOLD:
+        return
+    message = (
+        f"Possible N+1 on {_current_route()}: statement ran {count} times in one request\n"
+        f"{statement}\n{_app_stack()}"
+    )
+    if QUERY_DEBUG == "raise":
+        raise NPlusOneDetected(message)
+    logger.warning(message)
+
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+@contextmanager
+def query_budget(engine, max_queries: int):
+    """Fail (QueryBudgetExceeded) if the block issues more than max_queries statements."""
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "after_cursor_execute", _count)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "after_cursor_execute", _count)
+    if len(statements) > max_queries:
+        raise QueryBudgetExceeded(
+            f"Expected at most {max_queries} queries, got {len(statements)}:\n" + "\n".join(statements)
+        )
@@ -0,0 +1,338 @@
+"""Rate limits and admission control, so a few heavy clients cannot starve everyone else.
+
+Token buckets (429 + Retry-After when empty), one budget per endpoint group:
+
+- ai     POST /ai/chat                       per user, and per IP
+- auth   signup, login, logout, google       per IP; failed logins and signups also draw from
+                                             a per-account bucket, which blocks the account's
+                                             logins while empty
+- refresh POST /auth/refresh                 per IP, and per refresh token
+- write  POST/PUT/DELETE on user, training   per user, and per IP
+         and nutrition routes
+
+A budget is "<burst>/<seconds>": up to <burst> requests at once, refilled at that rate.
+Per-IP buckets of the ai, refresh and write budgets are RATE_LIMIT_IP_MULTIPLIER times
+larger, since several users can share one address (refreshes run in the background of every
+open app, so they get their own budget rather than eating into the auth one). Buckets live in-process, or in Redis when CACHE_URL
+points at it (so every worker draws from the same budget). If Redis is unreachable,
+requests are let through rather than failed.
+
+AdmissionMiddleware caps requests in flight per worker (MAX_CONCURRENT_REQUESTS, and
+AI_MAX_CONCURRENT for /ai/chat). A request that cannot get a slot within
+ADMISSION_QUEUE_MS is answered 503 + Retry-After straight away instead of queueing behind
+the threadpool.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+
+from . import auth, cache, metrics
+
+logger = logging.getLogger(__name__)
+
+def _budget(spec: str):
+    burst, seconds = spec.split("/")
+    return float(burst), float(burst) / float(seconds)  # (capacity, tokens per second)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") != "0"
+BUDGETS = {
+    "ai": _budget(os.getenv("RATE_LIMIT_AI", "10/60")),
+    "auth": _budget(os.getenv("RATE_LIMIT_AUTH", "10/60")),
+    "refresh": _budget(os.getenv("RATE_LIMIT_REFRESH", "30/60")),
+    "write": _budget(os.getenv("RATE_LIMIT_WRITE", "120/60")),
+}
+RATE_LIMIT_IP_MULTIPLIER = float(os.getenv("RATE_LIMIT_IP_MULTIPLIER", "5"))
+# Reverse proxies in front of the app that append to X-Forwarded-For (1 on Render)
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "0"))
+RATE_LIMIT_MAX_KEYS = 50_000
+
+# Roughly anyio's default threadpool size: more sync requests than this only queue for a thread
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "40"))
+AI_MAX_CONCURRENT = int(os.getenv("AI_MAX_CONCURRENT", "4"))
+ADMISSION_QUEUE_MS = float(os.getenv("ADMISSION_QUEUE_MS", "100"))
+
+# ---------- Token buckets ----------
+
+class LocalBuckets:
+    """In-process token buckets; the least recently used are dropped beyond max_keys."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def take(self, buckets) -> float:
+        """Take one token from every (key, capacity, rate) bucket, or from none of them.
+
+        Returns 0 when allowed, else the seconds until the emptiest bucket has a token.
+        """
+        now = time.monotonic()
+        with self._lock:
+            states = []
+            wait = 0.0
+            for key, capacity, rate in buckets:
+                state = self._buckets.get(key)
+                if state is None:
+                    state = self._buckets[key] = [capacity, now]
+                state[0] = min(capacity, state[0] + (now - state[1]) * rate)
+                state[1] = now
+                self._buckets.move_to_end(key)
+                if state[0] < 1:
+                    wait = max(wait, (1 - state[0]) / rate)
+                states.append(state)
+            if not wait:
+                for state in states:
+                    state[0] -= 1
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def peek(self, key: str, capacity: float, rate: float) -> float:
+        """Seconds until the bucket has a token (0 when it has one now); takes nothing."""
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None:
+                return 0.0
+            tokens = min(capacity, state[0] + (time.monotonic() - state[1]) * rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / rate
+
+# KEYS: bucket keys; ARGV: now, then capacity and rate per key. Same all-or-nothing rule.
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call('HMGET', key, 't', 'ts')
+    local t = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    t = math.min(capacity, t + math.max(0, now - ts) * rate)
+    if t < 1 then wait = math.max(wait, (1 - t) / rate) end
+    tokens[i] = t
+end
+for i, key in ipairs(KEYS) do
+    local t = tokens[i]
+    if wait == 0 then t = t - 1 end
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    redis.call('HSET', key, 't', tostring(t), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil(capacity / rate * 1000))
+end
+return tostring(wait)
+"""
+
+class RedisBuckets:
+    """Token buckets in Redis, updated atomically by a Lua script and shared by all workers."""
+
+    def __init__(self, client):
+        import redis  # optional dependency, only needed when CACHE_URL points at Redis
+
+        self._errors = (redis.RedisError, OSError)
+        self._client = client
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    def take(self, buckets) -> float:
+        args = [time.time()]
+        for _, capacity, rate in buckets:
+            args += [capacity, rate]
+        try:
+            return float(self._take(keys=[key for key, _, _ in buckets], args=args))
+        except self._errors as e:
+            logger.warning("Rate limit check failed, allowing request: %s", e)
+            return 0.0
+
+    def peek(self, key: str, capacity: float, rate: float) -> float:
+        try:
+            tokens, updated_at = self._client.hmget(key, "t", "ts")
+        except self._errors as e:
+            logger.warning("Rate limit check failed, allowing request: %s", e)
+            return 0.0
+        if tokens is None:
+            return 0.0
+        tokens = min(capacity, float(tokens) + max(0.0, time.time() - float(updated_at or 0)) * rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / rate
+
+def _make_store():
+    if isinstance(cache.backend, cache.RedisCache):
+        return RedisBuckets(cache.backend.redis)
+    return LocalBuckets(RATE_LIMIT_MAX_KEYS)
+
+store = _make_store()
+
+# ---------- Request keys ----------
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_PROXY_HOPS:
+        forwarded = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        # Each trusted proxy appends the address it saw; anything further left is client-supplied
+        if len(forwarded) >= RATE_LIMIT_PROXY_HOPS:
+            return forwarded[-RATE_LIMIT_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+def _token_subject(request: Request):
+    """The user of a valid bearer token; invalid tokens get no per-user bucket (auth rejects them later)."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+async def _account(request: Request, json_field: str = "email"):
+    """The account a login (form username) or signup (JSON email) is aimed at, or another
+    JSON field of the body.
+
+    FastAPI has already read the body by the time dependencies run, so this re-reads
+    Starlette's cached copy.
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return (await request.form()).get("username")
+        if content_type.startswith("application/json"):
+            body = await request.json()
+            return body.get(json_field) if isinstance(body, dict) else None
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return None
+
+_SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+def _too_many(budget: str, wait: float):
+    metrics.RATE_LIMITED.inc(budget)
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many requests, please slow down",
+        headers={"Retry-After": str(math.ceil(wait))},
+    )
+
+def _account_bucket(account: str) -> tuple:
+    capacity, rate = BUDGETS["auth"]
+    return f"rl:auth:account:{account.strip().lower()}", capacity, rate
+
+def auth_failed(account):
+    """Charge a failed login or signup to the account it was aimed at.
+
+    Only failures count, so someone who knows an email cannot lock its owner out with
+    requests that would have succeeded, and the owner's own logins never use it up.
+    """
+    if RATE_LIMIT_ENABLED and isinstance(account, str) and account.strip():
+        store.take([_account_bucket(account)])
+
+def limit(budget: str):
+    """Router/route dependency enforcing one budget."""
+    capacity, rate = BUDGETS[budget]
+
+    async def check(request: Request):
+        if not RATE_LIMIT_ENABLED:
+            return
+        if budget == "write" and request.method in _SAFE_METHODS:
+            return
+        ip = client_ip(request)
+        if budget == "auth":
+            buckets = [(f"rl:auth:ip:{ip}", capacity, rate)]
+            account = await _account(request)
+            if isinstance(account, str) and account.strip():
+                # Too many failures for this account: wait them out (nothing is taken here)
+                wait = store.peek(*_account_bucket(account))
+                if wait:
+                    raise _too_many(budget, wait)
+        elif budget == "refresh":
+            buckets = [(f"rl:refresh:ip:{ip}", capacity * RATE_LIMIT_IP_MULTIPLIER, rate * RATE_LIMIT_IP_MULTIPLIER)]
+            token = await _account(request, "refresh_token")
+            if isinstance(token, str) and token:
+                digest = hashlib.sha256(token.encode()).hexdigest()[:32]
+                buckets.append((f"rl:refresh:token:{digest}", capacity, rate))
+        else:
+            buckets = [(f"rl:{budget}:ip:{ip}", capacity * RATE_LIMIT_IP_MULTIPLIER, rate * RATE_LIMIT_IP_MULTIPLIER)]
+            subject = _token_subject(request)
+            if subject:
+                buckets.append((f"rl:{budget}:user:{subject}", capacity, rate))
+
+        wait = store.take(buckets)
+        if wait:
+            raise _too_many(budget, wait)
+
+    return check
+
+# ---------- Admission control ----------
+
+_EXEMPT_PATHS = {"/", "/metrics"}
+
+def _lanes(path: str):
+    if path == "/ai/chat":
+        return ("ai", "all")
+    return ("all",)
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware capping concurrent requests per worker; sheds load with 503."""
+
+    def __init__(self, app):
+        self.app = app
+        self.limits = {"all": MAX_CONCURRENT_REQUESTS, "ai": AI_MAX_CONCURRENT}
+        self.slots = {lane: asyncio.Semaphore(n) for lane, n in self.limits.items()}
+        self.in_flight = {lane: 0 for lane in self.limits}
+
+    async def _acquire(self, lane: str) -> bool:
+        slots = self.slots[lane]
+        if slots.locked():
+            if not ADMISSION_QUEUE_MS:
+                return False
+            try:
+                await asyncio.wait_for(slots.acquire(), ADMISSION_QUEUE_MS / 1000)
+            except asyncio.TimeoutError:
+                return False
+        else:
+            await slots.acquire()
+        self._track(lane, 1)
+        return True
+
+    def _release(self, lane: str):
+        self.slots[lane].release()
+        self._track(lane, -1)
+
+    def _track(self, lane: str, delta: int):
+        self.in_flight[lane] += delta
+        metrics.IN_FLIGHT.set(self.in_flight[lane], lane)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in _EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        held = []
+        try:
+            for lane in _lanes(scope["path"]):
+                if not await self._acquire(lane):
+                    metrics.ADMISSION_REJECTED.inc(lane)
+                    await _overloaded(send)
+                    return
+                held.append(lane)
+            await self.app(scope, receive, send)
+        finally:
+            for lane in held:
+                self._release(lane)
+
+async def _overloaded(send):
+    body = json.dumps({"detail": "Server busy, please retry"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status.HTTP_503_SERVICE_UNAVAILABLE,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", b"1"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
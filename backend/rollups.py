@@ -0,0 +1,454 @@
+"""Weekly and monthly nutrition/training rollups per user.
+
+One user_rollups row per user and ISO week (Monday start) or calendar month holds the sums
+the summary endpoints need: logged days, calories/protein eaten and targeted, days on
+target, workouts, training days, sets, volume and training minutes. GET /nutrition/summary
+and GET /training/summary read only these rows.
+
+Rows are kept current in the writing transaction. Before each flush a session hook takes
+the sums of every day a DailyLog, Workouts or UserStats change is about to touch (watch());
+the commit recomputes those days and adds the differences to their week and month rows
+with one upsert each. Set changes only move sets and volume, so they are added straight
+from the objects without a snapshot. Sessions that change none of these do no rollup work.
+Code writing with bulk statements calls watch() before them.
+
+A goal change moves every day's targets, and bulk imports touch too many days: touch()
+queues a rollups.refresh job that recomputes the weeks and months covering the range from
+day-level rows instead. While a user's refresh is still queued, later touches widen its
+date range instead of queueing another. The job and the rebuild command below also repair
+rows that concurrent writes to one user's same day have left off.
+
+Rebuild everything (e.g. after changing the adherence rules):
+
+    python -m backend.rollups rebuild [--email someone@example.com]
+"""
+import argparse
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, delete, event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from . import jobs, models
+from .database import SessionLocal, upsert
+
+# A day counts as on target when calories are within 10% of the target and protein reaches 90% of it
+CALORIE_TOLERANCE = 0.10
+PROTEIN_MIN_RATIO = 0.9
+
+DEFAULT_TARGETS = {"calories": 2000, "protein": 150, "carbs": 200, "fats": 60}
+
+def macro_targets(tdee: Optional[float], weight_kg: Optional[float], goal: str, trained: bool) -> dict:
+    """Daily macro targets from the latest body stats, the user's goal and whether they trained."""
+    if tdee is None or weight_kg is None:
+        return dict(DEFAULT_TARGETS)
+    if goal == "cut": target = tdee - 500
+    elif goal == "bulk": target = tdee + 300
+    else: target = tdee
+    target += 200 if trained else -200
+
+    protein = weight_kg * 2.2
+    fats = weight_kg * 0.8
+    carbs = (target - (protein * 4 + fats * 9)) / 4
+    return {
+        "calories": int(target),
+        "protein": int(protein),
+        "carbs": int(carbs),
+        "fats": int(fats)
+    }
+
+# ---------- Periods ----------
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def period_end(period: str, start: date) -> date:
+    if period == "week":
+        return start + timedelta(days=6)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+def _periods(first: date, last: date):
+    """(period, start) of every week and month overlapping [first, last]."""
+    periods = []
+    start = week_start(first)
+    while start <= last:
+        periods.append(("week", start))
+        start += timedelta(days=7)
+    start = month_start(first)
+    while start <= last:
+        periods.append(("month", start))
+        start = period_end("month", start) + timedelta(days=1)
+    return periods
+
+def _as_date(value) -> Optional[date]:
+    if value is None or type(value) is date:
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value)[:10])  # func.date() gives strings on SQLite
+
+# ---------- Day sums ----------
+
+FIELDS = ("days_logged", "calories_sum", "protein_sum", "calories_target_sum", "protein_target_sum",
+          "calorie_days_on_target", "protein_days_on_target",
+          "workouts", "training_days", "sets", "volume_kg", "training_minutes")
+
+def _history_span(db: Session, user_id):
+    firsts, lasts = [], []
+    for column, owner in ((models.DailyLog.date, models.DailyLog.user_id),
+                          (models.Workouts.start_time, models.Workouts.user_id)):
+        low, high = db.execute(select(func.min(column), func.max(column)).where(owner == user_id)).one()
+        if low is not None:
+            firsts.append(_as_date(low))
+            lasts.append(_as_date(high))
+    if not firsts:
+        return None, None
+    return min(firsts), max(lasts)
+
+def _day_sums(db: Session, user_id, first: date, last: date) -> dict:
+    """{day: {field: value}} for the days in [first, last] with food logged or training, from
+    that user's day-level rows. A rollup row is the sum of its days."""
+    span_from = datetime.combine(first, datetime.min.time())
+    day_after = datetime.combine(last + timedelta(days=1), datetime.min.time())
+
+    eaten = {
+        _as_date(day): (calories or 0, protein or 0)
+        for day, calories, protein in db.execute(
+            select(models.DailyLog.date, models.DailyLog.calories_actual, models.DailyLog.protein_actual)
+            .where(models.DailyLog.user_id == user_id,
+                   models.DailyLog.date >= first, models.DailyLog.date <= last)
+        )
+    }
+
+    training = {}  # day -> [workouts, minutes, sets, volume]
+    for start, end in db.execute(
+        select(models.Workouts.start_time, models.Workouts.end_time)
+        .where(models.Workouts.user_id == user_id,
+               models.Workouts.start_time >= span_from, models.Workouts.start_time < day_after)
+    ):
+        day = training.setdefault(start.date(), [0, 0.0, 0, 0.0])
+        day[0] += 1
+        if end is not None and end > start:
+            day[1] += (end - start).total_seconds() / 60
+    workout_day = func.date(models.Workouts.start_time)
+    working = models.WorkoutSets.is_warmup.isnot(True)
+    for day, sets, volume in db.execute(
+        select(workout_day, func.count(models.WorkoutSets.id),
+               func.sum(case((working, models.WorkoutSets.weight_kg * models.WorkoutSets.reps), else_=0)))
+        .join(models.Workouts, models.WorkoutSets.workout_id == models.Workouts.id)
+        .where(models.Workouts.user_id == user_id,
+               models.Workouts.start_time >= span_from, models.Workouts.start_time < day_after)
+        .group_by(workout_day)
+    ):
+        entry = training.setdefault(_as_date(day), [0, 0.0, 0, 0.0])
+        entry[2] += sets
+        entry[3] += volume or 0.0
+
+    # Targets come from the latest body stats on or before each day, so only logged days need them
+    stats, goal = [], "maintain"
+    if any(calories > 0 for calories, _ in eaten.values()):
+        S = models.UserStats
+        before = db.execute(
+            select(S.date, S.tdee_current, S.weight_kg).where(S.user_id == user_id, S.date < first)
+            .order_by(S.date.desc()).limit(1)
+        ).all()
+        within = db.execute(
+            select(S.date, S.tdee_current, S.weight_kg).where(S.user_id == user_id, S.date >= first, S.date <= last)
+            .order_by(S.date)
+        ).all()
+        stats = [(_as_date(day), tdee, weight) for day, tdee, weight in before + within]
+        user = db.get(models.User, user_id)
+        goal = ((user.settings if user else None) or {}).get("goal", "maintain")
+    stat_days = [day for day, _, _ in stats]
+
+    sums = {}
+    for day in set(eaten) | set(training):
+        entry = dict.fromkeys(FIELDS, 0)
+        trained = training.get(day)
+        if trained:
+            entry["workouts"] = trained[0]
+            entry["training_days"] = 1 if trained[0] else 0
+            entry["training_minutes"] = trained[1]
+            entry["sets"] = trained[2]
+            entry["volume_kg"] = trained[3]
+        calories, protein = eaten.get(day, (0, 0))
+        if calories > 0:
+            i = bisect_right(stat_days, day) - 1
+            _, tdee, weight = stats[i] if i >= 0 else (None, None, None)
+            targets = macro_targets(tdee, weight, goal, bool(trained and trained[0]))
+            entry["days_logged"] = 1
+            entry["calories_sum"] = calories
+            entry["protein_sum"] = protein
+            entry["calories_target_sum"] = targets["calories"]
+            entry["protein_target_sum"] = targets["protein"]
+            if abs(calories - targets["calories"]) <= CALORIE_TOLERANCE * targets["calories"]:
+                entry["calorie_days_on_target"] = 1
+            if protein >= PROTEIN_MIN_RATIO * targets["protein"]:
+                entry["protein_days_on_target"] = 1
+        sums[day] = entry
+    return sums
+
+# ---------- Recomputing ----------
+
+def refresh(db: Session, user_id, first: Optional[date] = None, last: Optional[date] = None) -> int:
+    """Recompute the rollups of every week and month overlapping [first, last] (the whole
+    history when first is None) from day-level rows; staged in db's transaction."""
+    R = models.UserRollup
+    if first is None:
+        db.execute(delete(R).where(R.user_id == user_id))
+        first, last = _history_span(db, user_id)
+        if first is None:
+            return 0
+    periods = _periods(first, last)
+    span_start = min(start for _, start in periods)
+    span_end = max(period_end(period, start) for period, start in periods)
+    sums = _day_sums(db, user_id, span_start, span_end)
+
+    rows = []
+    for period, start in periods:
+        row = {
+            "user_id": user_id, "period": period, "period_start": start,
+            **dict.fromkeys(FIELDS, 0), "updated_at": datetime.utcnow(),
+        }
+        day = start
+        while day <= period_end(period, start):
+            for field, value in sums.get(day, {}).items():
+                row[field] += value
+            day += timedelta(days=1)
+        rows.append(row)
+
+    for period in ("week", "month"):
+        starts = [start for p, start in periods if p == period]
+        db.execute(delete(R).where(R.user_id == user_id, R.period == period, R.period_start.in_(starts)))
+    db.execute(insert(R), rows)
+    return len(rows)
+
+# ---------- Keeping rollups current ----------
+
+# Longest range of days watch() snapshots; wider changes go to a rollups.refresh job
+WATCH_MAX_DAYS = 62
+
+_BEFORE = "rollup_days_before"  # {user_id: {day: day sums before this transaction, None if empty}}
+_DIRECT = "rollup_direct"  # {(user_id, day): {field: delta}} from set changes, applied as they are
+_PENDING = "rollup_ranges"  # {user_id: (first, last) or _ALL}: refreshed by a job after the commit
+_ALL = "all"
+
+def watch(db: Session, user_id, first: date, last: Optional[date] = None):
+    """user_id's days [first, last] are about to change in db's transaction: keep their sums as
+    they are now, and the commit adds the difference to the week and month rows. Call it before
+    writing them with bulk statements; the session hook calls it for ORM changes."""
+    if user_id is None or first is None:
+        return
+    last = max(last or first, first)
+    if (last - first).days >= WATCH_MAX_DAYS:
+        touch(db, user_id, first, last)
+        return
+    watched = db.info.setdefault(_BEFORE, {}).setdefault(user_id, {})
+    missing = []
+    day = first
+    while day <= last:
+        if day not in watched:
+            missing.append(day)
+        day += timedelta(days=1)
+    if not missing:
+        return
+    with db.no_autoflush:
+        sums = _day_sums(db, user_id, missing[0], missing[-1])
+    direct = db.info.get(_DIRECT, {})
+    for day in missing:
+        before = sums.get(day)
+        # Set changes already flushed are in these sums: take them out, the difference covers them now
+        applied = direct.pop((user_id, day), None)
+        if applied:
+            before = dict(before or dict.fromkeys(FIELDS, 0))
+            for field, value in applied.items():
+                before[field] -= value
+        watched[day] = before
+
+def touch(db: Session, user_id, first: Optional[date] = None, last: Optional[date] = None):
+    """Refresh user_id's rollups for [first, last] (all history when first is None) in a job once
+    db commits: for goal changes, bulk imports and repair."""
+    ranges = db.info.setdefault(_PENDING, {})
+    current = ranges.get(user_id)
+    if first is None or current == _ALL:
+        ranges[user_id] = _ALL
+    else:
+        last = last or first
+        ranges[user_id] = (min(first, current[0]), max(last, current[1])) if current else (first, last)
+
+def _workout_owner_day(session: Session, workout_set):
+    workout = workout_set.__dict__.get("workout")
+    if workout is None and workout_set.workout_id is not None:
+        workout = session.identity_map.get(session.identity_key(models.Workouts, workout_set.workout_id))
+        if workout is None:
+            workout = next((obj for obj in session.new
+                            if isinstance(obj, models.Workouts) and obj.id == workout_set.workout_id), None)
+    if workout is not None:
+        return workout.user_id, _as_date(workout.start_time)
+    with session.no_autoflush:
+        row = session.execute(
+            select(models.Workouts.user_id, models.Workouts.start_time)
+            .where(models.Workouts.id == workout_set.workout_id)
+        ).first()
+    return (row[0], _as_date(row[1])) if row else (None, None)
+
+def _old(session: Session, obj, attr):
+    """attr's value before this flush, None if unchanged."""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added and inspect(obj).persistent:
+        # Set on an expired object, so the old value was never loaded: the database still has it
+        model = type(obj)
+        with session.no_autoflush:
+            return session.execute(select(getattr(model, attr)).where(model.id == obj.id)).scalar()
+    return None
+
+def _watch_obj(session: Session, obj, changed: bool):
+    if isinstance(obj, models.DailyLog):
+        watch(session, obj.user_id, _as_date(obj.date))
+        if changed:
+            watch(session, obj.user_id, _as_date(_old(session, obj, "date")))
+    elif isinstance(obj, models.Workouts):
+        watch(session, obj.user_id, _as_date(obj.start_time))
+        if changed:
+            watch(session, obj.user_id, _as_date(_old(session, obj, "start_time")))
+    elif isinstance(obj, models.UserStats):
+        # New body stats move the targets of every later day
+        for day in {_as_date(obj.date), _as_date(_old(session, obj, "date") if changed else None)} - {None}:
+            watch(session, obj.user_id, day, date.today())
+    elif isinstance(obj, models.User) and changed:
+        history = inspect(obj).attrs.settings.history
+        if history.has_changes() and (_old(session, obj, "settings") or {}).get("goal") != (obj.settings or {}).get("goal"):
+            touch(session, obj.id)  # a new goal moves every day's targets
+
+def _set_delta(session: Session, obj, sign: int, old: bool = False) -> dict:
+    """What the set adds to its day (sign 1) or takes away (-1); old: as it was before this flush."""
+    def value(attr):
+        if old and inspect(obj).attrs[attr].history.has_changes():
+            return _old(session, obj, attr)
+        return getattr(obj, attr)
+    working = value("is_warmup") is not True
+    return {"sets": sign, "volume_kg": sign * (value("weight_kg") or 0) * (value("reps") or 0) if working else 0.0}
+
+def _note_set(session: Session, obj, sign: int):
+    user_id, day = _workout_owner_day(session, obj)
+    if user_id is None or day in session.info.get(_BEFORE, {}).get(user_id, {}):
+        return  # the day's before/after difference covers it
+    total = session.info.setdefault(_DIRECT, {}).setdefault((user_id, day), dict.fromkeys(("sets", "volume_kg"), 0))
+    deltas = [_set_delta(session, obj, sign)] if sign else [_set_delta(session, obj, -1, old=True), _set_delta(session, obj, 1)]
+    for delta in deltas:
+        for field, value in delta.items():
+            total[field] += value
+
+def _before_flush(session: Session, flush_context, instances):
+    changed = [obj for obj in session.dirty if session.is_modified(obj)]
+    for obj in list(session.new) + list(session.deleted):
+        _watch_obj(session, obj, False)
+    for obj in changed:
+        _watch_obj(session, obj, True)
+    # Sets only add to their day's sets and volume: counted from the objects, no snapshot needed
+    for obj, sign in [(obj, 1) for obj in session.new] + [(obj, -1) for obj in session.deleted] + [(obj, 0) for obj in changed]:
+        if isinstance(obj, models.WorkoutSets):
+            _note_set(session, obj, sign)
+
+def _add(totals: dict, user_id, day: date, delta: dict):
+    for key in (("week", week_start(day)), ("month", month_start(day))):
+        total = totals.setdefault((user_id, *key), dict.fromkeys(FIELDS, 0))
+        for field, value in delta.items():
+            total[field] += value
+
+def _apply(session: Session):
+    """Add this transaction's day differences to the week and month rows."""
+    totals = {}
+    for user_id, before in session.info.pop(_BEFORE, {}).items():
+        days = sorted(before)
+        after = _day_sums(session, user_id, days[0], days[-1])
+        for day in days:
+            old, new = before[day] or {}, after.get(day) or {}
+            _add(totals, user_id, day, {field: new.get(field, 0) - old.get(field, 0) for field in FIELDS})
+    for (user_id, day), delta in session.info.pop(_DIRECT, {}).items():
+        _add(totals, user_id, day, delta)
+
+    R = models.UserRollup
+    now = datetime.utcnow()
+    for (user_id, period, start), delta in totals.items():
+        if not any(delta.values()):
+            continue
+        stmt = upsert(session, R).values(user_id=user_id, period=period, period_start=start, updated_at=now, **delta)
+        session.execute(stmt.on_conflict_do_update(
+            index_elements=[R.user_id, R.period, R.period_start],
+            set_={**{field: getattr(R, field) + stmt.excluded[field] for field in delta}, "updated_at": now},
+        ))
+
+def _schedule(session: Session):
+    ranges = session.info.pop(_PENDING, None)
+    if not ranges:
+        return
+    J = models.BackgroundJob
+    for user_id, span in ranges.items():
+        if user_id is None:
+            continue
+        queued = session.query(J).filter(
+            J.kind == "rollups.refresh", J.user_id == user_id, J.status == "queued"
+        ).first()
+        payload = {"first": None, "last": None} if span == _ALL else {"first": span[0].isoformat(), "last": span[1].isoformat()}
+        if queued is not None:
+            payload = _widen(queued.payload, payload)
+            # Only while still queued: once a worker has claimed it, queue a new one instead
+            if session.execute(
+                update(J).where(J.id == queued.id, J.status == "queued").values(payload=payload)
+                .execution_options(synchronize_session=False)
+            ).rowcount:
+                continue
+        jobs.enqueue(session, "rollups.refresh", payload, user_id=user_id)
+
+def _widen(old: dict, new: dict) -> dict:
+    if old.get("first") is None or new["first"] is None:
+        return {"first": None, "last": None}
+    return {"first": min(old["first"], new["first"]), "last": max(old["last"], new["last"])}
+
+def _before_commit(session: Session):
+    # before_commit runs ahead of the commit's own flush: flush now, so every change is watched
+    # and the watched days read back as they will be committed
+    session.flush()
+    _apply(session)
+    _schedule(session)
+
+def _discard(session: Session):
+    for key in (_BEFORE, _DIRECT, _PENDING):
+        session.info.pop(key, None)
+
+def install(session_factory):
+    event.listen(session_factory, "before_flush", _before_flush)
+    event.listen(session_factory, "before_commit", _before_commit)
+    event.listen(session_factory, "after_commit", _discard)
+    # A rolled back savepoint keeps the outer transaction's snapshots: they still describe its start
+    event.listen(session_factory, "after_soft_rollback",
+                 lambda session, previous: None if previous.nested else _discard(session))
+
+def main():
+    parser = argparse.ArgumentParser(description="Weekly/monthly rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="recompute all rollups from day-level data")
+    rebuild.add_argument("--email", help="only this user")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        query = select(models.User.id)
+        if args.email:
+            query = query.where(models.User.email == args.email)
+        user_ids = db.execute(query).scalars().all()
+    total = 0
+    for user_id in user_ids:
+        with SessionLocal() as db:
+            total += refresh(db, user_id)
+            db.commit()
+    print(f"{total} rollups rebuilt for {len(user_ids)} users")
+
+if __name__ == "__main__":
+    main()
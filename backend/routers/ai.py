@@ -1,15 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import desc
 from datetime import datetime, date, timedelta
-from typing import Optional
+from typing import List, Optional
+from uuid import UUID
 from pydantic import BaseModel
+import hashlib
 import json
+import os
 
-from .. import models, auth
+from .. import models, schemas, auth, profiling, ratelimit, jobs, conversations, cache, log_actions
 from ..database import get_db
 
-router = APIRouter(prefix="/ai", tags=["ai"])
+router = APIRouter(prefix="/ai", tags=["ai"], route_class=profiling.ProfiledRoute)
+
+# The assembled context is cached per user and day under a data version that food, stats,
+# workout and settings writes bump (see cache._keys_for), so follow-up messages skip rebuilding it
+AI_CONTEXT_CACHE_SECONDS = int(os.getenv("AI_CONTEXT_CACHE_SECONDS", "300"))
+# Optional: replay the reply to an identical question asked against the same data version
+AI_RESPONSE_CACHE_SECONDS = int(os.getenv("AI_RESPONSE_CACHE_SECONDS", "0"))  # 0 = off
 
 # ---------- Schemas ----------
 
@@ -19,6 +28,7 @@ class SaveKeyRequest(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     language: Optional[str] = "zh"   # "zh" or "en"
+    conversation_id: Optional[UUID] = None  # continue a conversation; a new one is started when unset
 
 # ---------- Context Builder ----------
 
@@ -87,6 +97,7 @@ def build_context(user: models.User, db: Session) -> str:
     # --- Training (last 5 sessions) ---
     workouts = (
         db.query(models.Workouts)
+        .options(selectinload(models.Workouts.sets).joinedload(models.WorkoutSets.exercise))
         .filter(models.Workouts.user_id == user.id)
         .order_by(desc(models.Workouts.start_time))
         .limit(5)
@@ -105,16 +116,42 @@ def build_context(user: models.User, db: Session) -> str:
     return "\n".join(lines)
 
 
-def build_system_prompt(context: str, language: str) -> str:
+def cached_context(user: models.User, db: Session) -> tuple:
+    """(data version, context) for the user, rebuilt only after their data changed."""
+    version = cache.generation(f"aidata:{user.id}")
+    if AI_CONTEXT_CACHE_SECONDS <= 0:
+        return version, build_context(user, db)
+    key = f"ai-context:{version}:{user.id}:{date.today()}"
+    context = cache.get(key)
+    if context is not None:
+        return version, context.decode()
+    context = build_context(user, db)
+    cache.put(key, context.encode(), AI_CONTEXT_CACHE_SECONDS)
+    return version, context
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(message.casefold().split()).rstrip(" .!?。！？")
+
+
+def reply_cache_key(user_id, version: str, language: str, memory: Optional[str], history: list, message: str) -> str:
+    # The conversation so far is part of the prompt, so it is part of the key too
+    digest = hashlib.sha256(
+        json.dumps([language, memory, history, normalize_message(message)], ensure_ascii=False).encode()
+    ).hexdigest()[:32]
+    return f"ai-reply:{version}:{user_id}:{digest}"
+
+
+def build_system_prompt(context: str, language: str, memory: Optional[str] = None) -> str:
     if language == "zh":
         lang_instruction = "請用繁體中文回覆，語氣親切、專業，像一位健身教練朋友。"
         off_topic = "如果用戶問的不是健身、營養、身體組成或健康相關問題，請禮貌地說你只能回答健身相關問題。"
         log_instruction = (
             "如果用戶說他記錄了某些事情（例如：今天吃了什麼、量了體重、腰圍等），"
-            "請在回覆結尾加入一個 JSON 區塊，格式如下 (不加到回覆文字中):\n"
-            "```log_action\n{\"type\": \"food_log\", \"name\": \"食物名稱\", \"calories\": 數字, \"protein\": 數字, \"carbs\": 數字, \"fats\": 數字}\n```\n"
-            "或\n"
-            "```log_action\n{\"type\": \"body_stat\", \"weight_kg\": 數字, \"waist_cm\": 數字或null}\n```\n"
+            "請在回覆結尾加入一個 JSON 區塊，每一項記錄一行 (不加到回覆文字中):\n"
+            "```log_action\n{\"type\": \"food_log\", \"name\": \"食物名稱\", \"calories\": 數字, \"protein\": 數字, \"carbs\": 數字, \"fats\": 數字}\n"
+            "{\"type\": \"body_stat\", \"weight_kg\": 數字, \"waist_cm\": 數字或null}\n```\n"
+            "只寫用戶實際記錄的項目；吃了多樣食物時，每樣食物各寫一行 food_log。\n"
             "如果無法確定精確數字，就用合理估算。如果用戶沒有提到要記錄任何數據，就不要加 log_action 區塊。"
         )
     else:
@@ -122,20 +159,22 @@ def build_system_prompt(context: str, language: str) -> str:
         off_topic = "If the user asks about anything unrelated to fitness, nutrition, body composition, or health, politely decline and say you only answer fitness-related questions."
         log_instruction = (
             "If the user mentions logging something (e.g. what they ate, their weight, waist measurement), "
-            "append a JSON block at the very end of your reply (not visible in text):\n"
-            "```log_action\n{\"type\": \"food_log\", \"name\": \"food name\", \"calories\": number, \"protein\": number, \"carbs\": number, \"fats\": number}\n```\n"
-            "or\n"
-            "```log_action\n{\"type\": \"body_stat\", \"weight_kg\": number, \"waist_cm\": number or null}\n```\n"
+            "append a JSON block at the very end of your reply (not visible in text), one line per thing logged:\n"
+            "```log_action\n{\"type\": \"food_log\", \"name\": \"food name\", \"calories\": number, \"protein\": number, \"carbs\": number, \"fats\": number}\n"
+            "{\"type\": \"body_stat\", \"weight_kg\": number, \"waist_cm\": number or null}\n```\n"
+            "Only include lines for what the user actually logged, with one food_log line per food when several were eaten.\n"
             "Use reasonable estimates if exact values aren't given. Omit the log_action block if the user isn't logging data."
         )
 
+    memory_block = f"\nSummary of the earlier part of this conversation:\n{memory}\n" if memory else ""
+
     return f"""You are ROBO, an AI fitness coach assistant inside the Workout Monster fitness app.
 {lang_instruction}
 {off_topic}
 
 Here is the user's recent health & fitness data:
 {context}
-
+{memory_block}
 {log_instruction}
 
 Keep replies concise (3-5 sentences max for simple questions, bullet points for advice).
@@ -144,7 +183,7 @@ Keep replies concise (3-5 sentences max for simple questions, bullet points for
 
 # ---------- Endpoints ----------
 
-@router.post("/key")
+@router.post("/key", response_model=schemas.Message)
 def save_api_key(
     body: SaveKeyRequest,
     current_user: models.User = Depends(auth.get_current_user),
@@ -157,7 +196,7 @@ def save_api_key(
     return {"message": "API key saved"}
 
 
-@router.get("/key")
+@router.get("/key", response_model=schemas.ApiKeyStatus)
 def check_api_key(
     current_user: models.User = Depends(auth.get_current_user),
 ):
@@ -165,7 +204,63 @@ def check_api_key(
     return {"has_key": has_key}
 
 
-@router.post("/chat")
+@router.get("/conversations", response_model=List[schemas.ConversationSummary])
+def list_conversations(
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    return (
+        db.query(models.Conversation)
+        .filter(models.Conversation.user_id == current_user.id)
+        .order_by(desc(models.Conversation.updated_at))
+        .all()
+    )
+
+
+@router.get("/conversations/{conversation_id}", response_model=schemas.ConversationDetail)
+def get_conversation(
+    conversation_id: UUID,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    conversation = conversations.get(db, current_user.id, conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    turns = (
+        db.query(models.ConversationTurn)
+        .filter(models.ConversationTurn.conversation_id == conversation.id)
+        .order_by(models.ConversationTurn.seq)
+        .all()
+    )
+    exchanges = []
+    for turn in turns:
+        message, reply = conversations.unpack(turn.body)
+        exchanges.append({"seq": turn.seq, "message": message, "reply": reply, "created_at": turn.created_at})
+    return {
+        "id": conversation.id,
+        "title": conversation.title,
+        "summary": conversation.summary,
+        "turns": conversation.turns,
+        "updated_at": conversation.updated_at,
+        "exchanges": exchanges
+    }
+
+
+@router.delete("/conversations/{conversation_id}", response_model=schemas.Message)
+def delete_conversation(
+    conversation_id: UUID,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    conversation = conversations.get(db, current_user.id, conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    conversations.delete_conversation(db, conversation)
+    db.commit()
+    return {"message": "Conversation deleted"}
+
+
+@router.post("/chat", response_model=schemas.ChatResponse, dependencies=[Depends(ratelimit.limit("ai"))])
 def chat(
     body: ChatRequest,
     current_user: models.User = Depends(auth.get_current_user),
@@ -179,83 +274,59 @@ def chat(
         import google.generativeai as genai
         genai.configure(api_key=api_key)
 
-        context = build_context(current_user, db)
-        system_prompt = build_system_prompt(context, body.language)
-
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            system_instruction=system_prompt,
-        )
-        response = model.generate_content(body.message)
-        full_text = response.text
-
-        # Parse optional log_action block
-        log_action = None
-        if "```log_action" in full_text:
-            try:
-                start = full_text.index("```log_action") + len("```log_action")
-                end = full_text.index("```", start)
-                json_str = full_text[start:end].strip()
-                log_action = json.loads(json_str)
-                # Strip log_action block from visible reply
-                full_text = full_text[:full_text.index("```log_action")].strip()
-            except Exception:
-                pass
-
-        # Execute log_action if present
-        logged = None
-        if log_action:
-            ltype = log_action.get("type")
-            today = date.today()
-            if ltype == "food_log":
-                fl = models.FoodLog(
-                    user_id=current_user.id,
-                    name=log_action.get("name", "AI logged food"),
-                    calories=int(log_action.get("calories", 0)),
-                    protein=int(log_action.get("protein", 0)),
-                    carbs=int(log_action.get("carbs", 0)),
-                    fats=int(log_action.get("fats", 0)),
-                    date=today,
-                    time=datetime.utcnow()
-                )
-                db.add(fl)
-                # Update DailyLog totals
-                dl = db.query(models.DailyLog).filter(
-                    models.DailyLog.user_id == current_user.id,
-                    models.DailyLog.date == today
-                ).first()
-                if dl:
-                    dl.calories_actual = (dl.calories_actual or 0) + fl.calories
-                    dl.protein_actual = (dl.protein_actual or 0) + fl.protein
-                    dl.carbs_actual = (dl.carbs_actual or 0) + fl.carbs
-                    dl.fats_actual = (dl.fats_actual or 0) + fl.fats
-                db.commit()
-                logged = "food_log"
-            elif ltype == "body_stat":
-                st = db.query(models.UserStats).filter(
-                    models.UserStats.user_id == current_user.id,
-                    models.UserStats.date == today
-                ).first()
-                if not st:
-                    # Get current TDEE estimate
-                    settings = current_user.settings or {}
-                    tdee = float(settings.get("tdee", 2000))
-                    st = models.UserStats(
-                        user_id=current_user.id,
-                        date=today,
-                        tdee_current=tdee
-                    )
-                    db.add(st)
-                if log_action.get("weight_kg") is not None:
-                    st.weight_kg = float(log_action["weight_kg"])
-                if log_action.get("waist_cm") is not None:
-                    st.waist_cm = float(log_action["waist_cm"])
-                db.commit()
-                logged = "body_stat"
+        if body.conversation_id:
+            conversation = conversations.get(db, current_user.id, body.conversation_id)
+            if conversation is None:
+                raise HTTPException(status_code=404, detail="Conversation not found")
+        else:
+            conversation = conversations.start(db, current_user.id, body.message)
+
+        version, context = cached_context(current_user, db)
+        history = conversations.window(db, conversation)
+        reply_key = None
+        if AI_RESPONSE_CACHE_SECONDS > 0:
+            reply_key = reply_cache_key(current_user.id, version, body.language, conversation.summary, history, body.message)
+        cached_reply = cache.get(reply_key) if reply_key else None
+
+        actions, rejected = [], 0
+        if cached_reply is not None:
+            full_text = cached_reply.decode()
+        else:
+            system_prompt = build_system_prompt(context, body.language, conversation.summary)
+
+            model = genai.GenerativeModel(
+                model_name="gemini-1.5-flash",
+                system_instruction=system_prompt,
+            )
+            with profiling.phase("llm"):
+                response = model.generate_content(history + [{"role": "user", "parts": [body.message]}])
+            full_text = response.text
+
+            # Parse the log_action blocks (stripped from the visible reply)
+            full_text, actions, rejected = log_actions.parse(full_text)
+            # Replies that log something are never replayed: the same words later mean a new entry
+            if reply_key and not actions and not rejected:
+                cache.put(reply_key, full_text.encode(), AI_RESPONSE_CACHE_SECONDS)
+
+        # The writes run as one background job (backend.tasks) so the reply is not held up by them
+        log_job_id = None
+        if actions:
+            job = jobs.enqueue(
+                db, "ai.log_action",
+                {"actions": [action.model_dump() for action in actions], "date": date.today(), "time": datetime.utcnow()},
+                user_id=current_user.id, priority=jobs.PRIORITY_HIGH,
+            )
+            log_job_id = job.id
+        conversation_id = conversation.id
+        conversations.append(db, conversation, body.message, full_text)
+        db.commit()
 
         return {
             "reply": full_text,
-            "logged": logged
+            "actions": actions,
+            "rejected_actions": rejected,
+            "log_job_id": log_job_id,
+            "conversation_id": conversation_id
         }
 
     except HTTPException:
@@ -2,19 +2,41 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from backend import models, schemas, database
 from backend import auth as auth_logic
+from backend import profiling, ratelimit
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import datetime, timedelta
 import httpx
 
 router = APIRouter(
     prefix="/auth",
-    tags=["auth"]
+    tags=["auth"],
+    route_class=profiling.ProfiledRoute,
 )
 
-@router.post("/signup", response_model=schemas.Token)
+# /refresh has its own budget: silent refreshes from many users behind one IP must not eat the login budget
+_auth_limit = [Depends(ratelimit.limit("auth"))]
+_refresh_limit = [Depends(ratelimit.limit("refresh"))]
+
+def _access_token_for(user: models.User) -> str:
+    access_token_expires = timedelta(minutes=auth_logic.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return auth_logic.create_access_token(
+        data={"sub": user.email}, expires_delta=access_token_expires
+    )
+
+def _issue_tokens(db: Session, user: models.User) -> dict:
+    refresh_token = auth_logic.create_refresh_token(db, user.id)
+    db.commit()
+    return {
+        "access_token": _access_token_for(user),
+        "refresh_token": refresh_token,
+        "token_type": "bearer"
+    }
+
+@router.post("/signup", response_model=schemas.Token, dependencies=_auth_limit)
 def signup(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     db_user = db.query(models.User).filter(models.User.email == user.email).first()
     if db_user:
+        ratelimit.auth_failed(user.email)
         raise HTTPException(status_code=400, detail="Email already registered")
     
     hashed_password = auth_logic.get_password_hash(user.password)
@@ -27,54 +49,91 @@ def signup(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     db.commit()
     db.refresh(new_user)
     
-    access_token_expires = timedelta(minutes=auth_logic.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth_logic.create_access_token(
-        data={"sub": new_user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return _issue_tokens(db, new_user)
 
-@router.post("/login", response_model=schemas.Token)
+@router.post("/login", response_model=schemas.Token, dependencies=_auth_limit)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
     user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth_logic.verify_password(form_data.password, user.password_hash):
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = auth_logic.verify_password_and_update(form_data.password, user.password_hash)
+    if not valid:
+        ratelimit.auth_failed(form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    access_token_expires = timedelta(minutes=auth_logic.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth_logic.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+
+    # Argon2 parameters changed since this hash was made: upgrade it transparently
+    # (committed together with the new refresh token)
+    if new_hash:
+        user.password_hash = new_hash
+
+    return _issue_tokens(db, user)
+
+@router.post("/refresh", response_model=schemas.Token, dependencies=_refresh_limit)
+def refresh(payload: schemas.RefreshTokenRequest, db: Session = Depends(database.get_db)):
+    """Rotate a refresh token into a new access/refresh pair - no password hash involved"""
+    user, refresh_token = auth_logic.rotate_refresh_token(db, payload.refresh_token)
+    return {
+        "access_token": _access_token_for(user),
+        "refresh_token": refresh_token,
+        "token_type": "bearer"
+    }
+
+@router.post("/logout", response_model=schemas.Message, dependencies=_auth_limit)
+def logout(payload: schemas.RefreshTokenRequest, db: Session = Depends(database.get_db)):
+    """Revoke the refresh token (and every rotation of it)"""
+    auth_logic.revoke_refresh_token(db, payload.refresh_token)
+    return {"message": "Logged out"}
 
 from pydantic import BaseModel
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+import hashlib
+import os
+import threading
+import time
+
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v2/userinfo")
+GOOGLE_TOKEN_CACHE_SECONDS = int(os.getenv("GOOGLE_TOKEN_CACHE_SECONDS", "300"))
+GOOGLE_TOKEN_CACHE_SIZE = 10000
 
 class GoogleAuthRequest(BaseModel):
     id_token: str  # This is the access_token from expo-auth-session Google provider
 
-@router.post("/google", response_model=schemas.Token)
-async def google_login(payload: GoogleAuthRequest, db: Session = Depends(database.get_db)):
-    """Exchange Google access token for app JWT"""
-    # Verify with Google's userinfo endpoint
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {payload.id_token}"}
-        )
-    
-    if resp.status_code != 200:
-        raise HTTPException(status_code=401, detail="Invalid Google token")
-    
-    google_user = resp.json()
-    email = google_user.get("email")
-    name = google_user.get("name") or email.split("@")[0]
-    
-    if not email:
-        raise HTTPException(status_code=400, detail="Could not get email from Google")
-    
-    # Find or create user
+# Verified token -> (expires_at, email, name). Keyed by digest so raw tokens are never kept around.
+_google_token_cache = {}
+_google_token_lock = threading.Lock()
+
+def _cached_google_user(token_key: str):
+    with _google_token_lock:
+        entry = _google_token_cache.get(token_key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1], entry[2]
+        _google_token_cache.pop(token_key, None)
+    return None
+
+def _cache_google_user(token_key: str, email: str, name: str):
+    now = time.monotonic()
+    with _google_token_lock:
+        if len(_google_token_cache) >= GOOGLE_TOKEN_CACHE_SIZE:
+            # Drop expired entries first, then the oldest if still full
+            for key in [k for k, v in _google_token_cache.items() if v[0] <= now]:
+                del _google_token_cache[key]
+            if len(_google_token_cache) >= GOOGLE_TOKEN_CACHE_SIZE:
+                del _google_token_cache[next(iter(_google_token_cache))]
+        _google_token_cache[token_key] = (now + GOOGLE_TOKEN_CACHE_SECONDS, email, name)
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Shared, pooled client created in the app lifespan (see main.py)"""
+    client = getattr(request.app.state, "http_client", None)
+    if client is None:
+        client = request.app.state.http_client = httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=3.0))
+    return client
+
+def _google_login_tokens(db: Session, email: str, name: str) -> dict:
     user = db.query(models.User).filter(models.User.email == email).first()
     if not user:
         user = models.User(
@@ -86,10 +145,38 @@ async def google_login(payload: GoogleAuthRequest, db: Session = Depends(databas
         db.add(user)
         db.commit()
         db.refresh(user)
-    
-    access_token_expires = timedelta(minutes=auth_logic.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = auth_logic.create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return _issue_tokens(db, user)
+
+@router.post("/google", response_model=schemas.Token, dependencies=_auth_limit)
+async def google_login(
+    payload: GoogleAuthRequest,
+    db: Session = Depends(database.get_db),
+    client: httpx.AsyncClient = Depends(get_http_client)
+):
+    """Exchange Google access token for app JWT"""
+    token_key = hashlib.sha256(payload.id_token.encode()).hexdigest()
+    cached = _cached_google_user(token_key)
+    if cached:
+        email, name = cached
+    else:
+        # Verify with Google's userinfo endpoint
+        try:
+            resp = await client.get(
+                GOOGLE_USERINFO_URL,
+                headers={"Authorization": f"Bearer {payload.id_token}"}
+            )
+        except httpx.HTTPError:
+            raise HTTPException(status_code=503, detail="Could not reach Google")
+
+        if resp.status_code != 200:
+            raise HTTPException(status_code=401, detail="Invalid Google token")
+
+        google_user = resp.json()
+        email = google_user.get("email")
+        if not email:
+            raise HTTPException(status_code=400, detail="Could not get email from Google")
+        name = google_user.get("name") or email.split("@")[0]
+        _cache_google_user(token_key, email, name)
 
+    # Find or create user (blocking DB work stays off the event loop)
+    return await run_in_threadpool(_google_login_tokens, db, email, name)
@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from .. import models, schemas, auth, database
+from .. import models, schemas, auth, database, profiling, ratelimit, cache, frequent_foods, food_catalog, jobs, rollups, log_actions
 from ..auth import get_current_user
 import datetime
-from sqlalchemy import func
+import json
+from typing import List
+from uuid import UUID, uuid4
+from sqlalchemy import func, insert
 
 router = APIRouter(
     prefix="/nutrition",
-    tags=["nutrition"]
+    tags=["nutrition"],
+    route_class=profiling.ProfiledRoute,
+    dependencies=[Depends(ratelimit.limit("write"))],
 )
 
 @router.post("/log", response_model=schemas.FoodLogResponse)
@@ -47,43 +53,28 @@ def log_food(entry: schemas.FoodLogCreate, current_user: models.User = Depends(g
     daily.protein_actual += entry.protein
     daily.carbs_actual += entry.carbs
     daily.fats_actual += entry.fats
+
+    frequent_foods.record(db, current_user.id, [{
+        "name": entry.name, "calories": entry.calories, "protein": entry.protein, "carbs": entry.carbs, "fats": entry.fats,
+    }], new_log.time)
     
     db.commit()
     db.refresh(new_log)
     return new_log
 
-@router.get("/day")
+@router.get("/day", response_model=schemas.DailyNutrition)
 def get_daily_nutrition(date: datetime.date = None, current_user: models.User = Depends(get_current_user), db: Session = Depends(database.get_db)):
     if not date:
         date = datetime.datetime.utcnow().date()
         
-    # 1. Get Targets (Reuse logic or call internal function)
-    # Copied logic for MVP simplicity (should extract to service)
-    stats = db.query(models.UserStats).filter(models.UserStats.user_id == current_user.id).order_by(models.UserStats.date.desc()).first()
-    
-    targets = {"calories": 2000, "protein": 150, "carbs": 200, "fat": 60}
-    if stats:
-        tdee = stats.tdee_current
-        goal = current_user.settings.get("goal", "maintain")
-        if goal == "cut": target = tdee - 500
-        elif goal == "bulk": target = tdee + 300
-        else: target = tdee
-        
-        # Check workout
-        workout = db.query(models.Workouts).filter(models.Workouts.user_id == current_user.id, func.date(models.Workouts.start_time) == date).first()
-        if workout: target += 200
-        else: target -= 200
-        
-        protein = stats.weight_kg * 2.2
-        fats = stats.weight_kg * 0.8
-        carbs = (target - (protein * 4 + fats * 9)) / 4
-        
-        targets = {
-            "calories": int(target),
-            "protein": int(protein),
-            "carbs": int(carbs),
-            "fats": int(fats)
-        }
+    # 1. Get Targets (cached per user and day; invalidated by new stats, workouts or goal changes)
+    key = f"targets:{cache.generation(f'targets:{current_user.id}')}:{current_user.id}:{date}"
+    targets = cache.get(key)
+    if targets is not None:
+        targets = json.loads(targets)
+    else:
+        targets = _daily_targets(db, current_user, date)
+        cache.put(key, json.dumps(targets).encode())
 
     # 2. Get Actuals
     daily = db.query(models.DailyLog).filter(
@@ -111,19 +102,52 @@ def get_daily_nutrition(date: datetime.date = None, current_user: models.User =
         "logs": logs
     }
 
+@router.get("/summary", response_model=List[schemas.NutritionSummary])
+def get_nutrition_summary(period: str = Query("week", pattern="^(week|month)$"), limit: int = 12,
+                          current_user: models.User = Depends(get_current_user), db: Session = Depends(database.get_db)):
+    """Average intake and target adherence per week or month, most recent first (reads only the rollups)"""
+    rows = db.query(models.UserRollup).filter(
+        models.UserRollup.user_id == current_user.id,
+        models.UserRollup.period == period,
+        models.UserRollup.days_logged > 0
+    ).order_by(models.UserRollup.period_start.desc()).limit(min(limit, 120)).all()
+    return [
+        {
+            "period_start": row.period_start,
+            "days_logged": row.days_logged,
+            "avg_calories": round(row.calories_sum / row.days_logged, 1),
+            "avg_protein": round(row.protein_sum / row.days_logged, 1),
+            "avg_calories_target": round(row.calories_target_sum / row.days_logged, 1),
+            "avg_protein_target": round(row.protein_target_sum / row.days_logged, 1),
+            "calorie_adherence": round(row.calorie_days_on_target / row.days_logged, 3),
+            "protein_adherence": round(row.protein_days_on_target / row.days_logged, 3),
+        }
+        for row in rows
+    ]
+
+def _daily_targets(db: Session, current_user: models.User, date: datetime.date) -> dict:
+    stats = db.query(models.UserStats).filter(models.UserStats.user_id == current_user.id).order_by(models.UserStats.date.desc()).first()
+    if not stats:
+        return dict(rollups.DEFAULT_TARGETS)
+    # Check workout
+    workout = db.query(models.Workouts).filter(models.Workouts.user_id == current_user.id, func.date(models.Workouts.start_time) == date).first()
+    goal = current_user.settings.get("goal", "maintain")
+    return rollups.macro_targets(stats.tdee_current, stats.weight_kg, goal, workout is not None)
+
 # Food Database Endpoints
-from ..seed_foods import foods_data
-from typing import Optional
+from typing import Optional, List
 
-@router.post("/seed_foods")
+@router.post("/seed_foods", response_model=schemas.Message)
 def seed_foods(db: Session = Depends(database.get_db)):
     """Seed the food database with common items"""
+    # Imported here so the seed data is only loaded when seeding, not at every cold start
+    from ..seed_foods import foods_data
+
+    existing = {food.name.lower(): food for food in db.query(models.FoodItem).all() if food.name}
     count = 0
     for food in foods_data:
         # Check if exists by name
-        exists = db.query(models.FoodItem).filter(
-            models.FoodItem.name.ilike(food["name"])
-        ).first()
+        exists = existing.get(food["name"].lower())
         
         if not exists:
             new_food = models.FoodItem(
@@ -138,6 +162,7 @@ def seed_foods(db: Session = Depends(database.get_db)):
                 category=food.get("category")
             )
             db.add(new_food)
+            existing[food["name"].lower()] = new_food
             count += 1
         elif not exists.name_zh and food.get("name_zh"):
             # Update existing with Chinese name if missing
@@ -145,36 +170,70 @@ def seed_foods(db: Session = Depends(database.get_db)):
             exists.serving_size_zh = food.get("serving_size_zh")
             count += 1
     
+    if count and food_catalog.FOOD_CATALOG_PATH:
+        # The mapped catalog file is read-only; rebuild it so the new foods show up
+        jobs.enqueue(db, "food_catalog.build", {}, key="food_catalog.build", priority=jobs.PRIORITY_LOW)
     db.commit()
     return {"message": f"Seeded {count} new or updated food items"}
 
-@router.get("/foods")
+_FOOD_LIST = TypeAdapter(List[schemas.FoodItem])
+_FOOD = TypeAdapter(schemas.FoodItem)
+
+@router.get("/foods", response_model=List[schemas.FoodItem])
 def search_foods(q: Optional[str] = None, category: Optional[str] = None, limit: int = 50, db: Session = Depends(database.get_db)):
     """Search food database"""
-    query = db.query(models.FoodItem)
-    
-    if q:
-        # Search in both English and Chinese names
-        search = f"%{q}%"
-        query = query.filter(
-            (models.FoodItem.name.ilike(search)) | 
-            (models.FoodItem.name_zh.ilike(search))
-        )
-    
-    if category:
-        query = query.filter(models.FoodItem.category == category)
-    
-    return query.limit(limit).all()
+    catalog = food_catalog.current()
+    if catalog is not None:
+        return [food._asdict() for food in catalog.search(q, category, limit)]
 
-@router.get("/foods/{food_id}")
-def get_food(food_id: str, db: Session = Depends(database.get_db)):
+    def build():
+        query = db.query(models.FoodItem)
+        
+        if q:
+            # Search in both English and Chinese names
+            search = f"%{q}%"
+            query = query.filter(
+                (models.FoodItem.name.ilike(search)) | 
+                (models.FoodItem.name_zh.ilike(search))
+            )
+        
+        if category:
+            query = query.filter(models.FoodItem.category == category)
+        
+        return query.limit(limit).all()
+
+    key = f"catalog:foods:{cache.generation('catalog:foods')}:{limit}:{category or ''}:{q or ''}"
+    return cache.cached_response(key, build, _FOOD_LIST)
+
+@router.get("/foods/frequent", response_model=List[schemas.FrequentFood])
+def get_frequent_foods(limit: int = 20, current_user: models.User = Depends(get_current_user), db: Session = Depends(database.get_db)):
+    """The user's recent and frequent foods, most likely next first (one indexed query)"""
+    return frequent_foods.top(db, current_user.id, min(limit, frequent_foods.FREQUENT_FOODS_MAX))
+
+@router.get("/foods/{food_id}", response_model=schemas.FoodItem)
+def get_food(food_id: UUID, db: Session = Depends(database.get_db)):
     """Get specific food item"""
-    food = db.query(models.FoodItem).filter(models.FoodItem.id == food_id).first()
-    if not food:
-        raise HTTPException(status_code=404, detail="Food not found")
-    return food
+    catalog = food_catalog.current()
+    if catalog is not None:
+        food = catalog.get(food_id)
+        if not food:
+            raise HTTPException(status_code=404, detail="Food not found")
+        return food._asdict()
+
+    def build():
+        food = db.query(models.FoodItem).filter(models.FoodItem.id == food_id).first()
+        if not food:
+            raise HTTPException(status_code=404, detail="Food not found")
+        return food
+
+    return cache.cached_response(f"catalog:food:{cache.generation('catalog:foods')}:{food_id}", build, _FOOD)
 
-from uuid import UUID
+def _foods_by_id(db: Session, food_ids) -> dict:
+    """FoodItems (or their catalog-file equivalents) by id; unknown ids are left out"""
+    catalog = food_catalog.current()
+    if catalog is not None:
+        return {food.id: food for food in map(catalog.get, food_ids) if food}
+    return {food.id: food for food in db.query(models.FoodItem).filter(models.FoodItem.id.in_(food_ids))}
 
 @router.post("/log_from_food", response_model=schemas.FoodLogResponse)
 def log_from_food(
@@ -191,7 +250,7 @@ def log_from_food(
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid food ID format")
         
-    food = db.query(models.FoodItem).filter(models.FoodItem.id == food_uuid).first()
+    food = _foods_by_id(db, {food_uuid}).get(food_uuid)
     if not food:
         raise HTTPException(status_code=404, detail="Food not found")
     
@@ -236,13 +295,71 @@ def log_from_food(
     daily.protein_actual += protein
     daily.carbs_actual += carbs
     daily.fats_actual += fats
+
+    frequent_foods.record(db, current_user.id, [{
+        "food_id": food.id, "name": food.name, "servings": servings,
+        "calories": calories, "protein": protein, "carbs": carbs, "fats": fats,
+    }], new_log.time)
     
     db.commit()
     db.refresh(new_log)
     return new_log
 
-@router.delete("/log/{log_id}")
-def delete_food_log(log_id: str, current_user: models.User = Depends(get_current_user), db: Session = Depends(database.get_db)):
+MAX_MEAL_ITEMS = 50
+
+@router.post("/meals", response_model=schemas.MealResponse)
+def log_meal(meal: schemas.MealCreate, current_user: models.User = Depends(get_current_user), db: Session = Depends(database.get_db)):
+    """Log several foods at once: one query for the foods, one bulk insert, one DailyLog update"""
+    if not meal.items or len(meal.items) > MAX_MEAL_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A meal needs 1 to {MAX_MEAL_ITEMS} items")
+
+    food_ids = {item.food_id for item in meal.items if item.food_id is not None}
+    foods = {}
+    if food_ids:
+        foods = _foods_by_id(db, food_ids)
+        missing = food_ids - foods.keys()
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Food not found: {', '.join(sorted(map(str, missing)))}")
+
+    now = datetime.datetime.utcnow()
+    today = now.date()
+    rows = []
+    eaten = []
+    for item in meal.items:
+        if item.food_id is not None:
+            # Same rounding as /log_from_food
+            food = foods[item.food_id]
+            name = food.name
+            macros = (int(food.calories * item.servings), int(food.protein_g * item.servings),
+                      int(food.carbs_g * item.servings), int(food.fat_g * item.servings))
+        else:
+            name = item.name
+            macros = (item.calories, item.protein, item.carbs, item.fats)
+        eaten.append({
+            "food_id": item.food_id, "name": name, "servings": item.servings if item.food_id else None,
+            "calories": macros[0], "protein": macros[1], "carbs": macros[2], "fats": macros[3],
+        })
+        rows.append({
+            "id": uuid4(),
+            "user_id": current_user.id,
+            "name": f"{meal.meal_name}: {name}",
+            "calories": macros[0],
+            "protein": macros[1],
+            "carbs": macros[2],
+            "fats": macros[3],
+            "date": today,
+            "time": now,
+        })
+    db.execute(insert(models.FoodLog), rows)
+
+    totals = {field: sum(row[field] for row in rows) for field in ("calories", "protein", "carbs", "fats")}
+    log_actions.add_to_daily_log(db, current_user.id, today, totals)
+    frequent_foods.record(db, current_user.id, eaten, now)
+    db.commit()
+    return {"logs": rows, "totals": totals}
+
+@router.delete("/log/{log_id}", response_model=schemas.Message)
+def delete_food_log(log_id: UUID, current_user: models.User = Depends(get_current_user), db: Session = Depends(database.get_db)):
     """Delete a food log entry and update daily aggregates"""
     log = db.query(models.FoodLog).filter(
         models.FoodLog.id == log_id,
@@ -263,7 +380,8 @@ def delete_food_log(log_id: str, current_user: models.User = Depends(get_current
         daily.protein_actual = max(0, daily.protein_actual - log.protein)
         daily.carbs_actual = max(0, daily.carbs_actual - log.carbs)
         daily.fats_actual = max(0, daily.fats_actual - log.fats)
-    
+
+    frequent_foods.forget(db, current_user.id, log)
     db.delete(log)
     db.commit()
     return {"message": "Deleted successfully"}
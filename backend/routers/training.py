@@ -1,14 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func
-from backend import models, schemas, database, auth
-from datetime import datetime, timezone
+from backend import models, schemas, database, auth, profiling, ratelimit, cache, rollups, prs, workload
+from datetime import datetime, timedelta, timezone
 from uuid import uuid4, UUID
-from typing import Optional
+from typing import Optional, List
 
 router = APIRouter(
     prefix="/training",
-    tags=["training"]
+    tags=["training"],
+    route_class=profiling.ProfiledRoute,
+    dependencies=[Depends(ratelimit.limit("write"))],
 )
 
 # Seed Exercises (Simple hardcoded list for MVP)
@@ -21,16 +24,16 @@ DEFAULT_EXERCISES = [
     {"name": "Dumbbell Row", "type": "isolation", "primary_muscle": "back"},
 ]
 
-from ..seed_exercises import exercises_data
-
-@router.post("/seed_exercises_extended")
+@router.post("/seed_exercises_extended", response_model=schemas.Message)
 def seed_exercises_extended(db: Session = Depends(database.get_db)):
+    # Imported here so the seed data is only loaded when seeding, not at every cold start
+    from ..seed_exercises import exercises_data
+
+    # One query for the whole catalog instead of one lookup per seed row (case insensitive for safety)
+    existing = {ex.name.lower(): ex for ex in db.query(models.Exercises).all() if ex.name}
     count = 0
     for ex in exercises_data:
-        # Check if exists by name (case insensitive for safety)
-        exists = db.query(models.Exercises).filter(
-            models.Exercises.name.ilike(ex["name"])
-        ).first()
+        exists = existing.get(ex["name"].lower())
         
         if not exists:
             new_ex = models.Exercises(
@@ -41,6 +44,7 @@ def seed_exercises_extended(db: Session = Depends(database.get_db)):
                 equipment=ex.get("equipment")
             )
             db.add(new_ex)
+            existing[ex["name"].lower()] = new_ex
             count += 1
         elif not exists.name_zh and ex.get("name_zh"):
             # Update existing with Chinese name if missing
@@ -50,7 +54,7 @@ def seed_exercises_extended(db: Session = Depends(database.get_db)):
     db.commit()
     return {"message": f"Seeded {count} new or updated exercises"}
 
-@router.get("/plan")
+@router.get("/plan", response_model=schemas.DefaultPlan)
 def get_training_plan(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
     # 1. Ensure exercises exist (Auto-seed if empty for MVP)
     if db.query(models.Exercises).count() == 0:
@@ -76,29 +80,42 @@ def get_training_plan(current_user: models.User = Depends(auth.get_current_user)
 
 @router.post("/session/start", response_model=schemas.Workout) # Need schemas.Workout
 def start_session(plan_id: str, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    # Create a workout session
+    # Create a workout session, scored for readiness from the rolling training load
+    start = datetime.now(timezone.utc)
     new_workout = models.Workouts(
         user_id=current_user.id,
         notes=f"Started {plan_id}",
-        start_time=datetime.now(timezone.utc)
+        start_time=start,
+        readiness_score=workload.readiness(db, current_user, start.date())["score"]
     )
     db.add(new_workout)
     db.commit()
     db.refresh(new_workout)
     return new_workout
 
-@router.post("/set", response_model=schemas.WorkoutSetResponse) # Need schemas
+@router.post("/set", response_model=schemas.WorkoutSetLogged)
 def log_set(set_data: schemas.WorkoutSetCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-    # 1. Log the set
+    workout = db.query(models.Workouts).filter(
+        models.Workouts.id == set_data.workout_id,
+        models.Workouts.user_id == current_user.id
+    ).first()
+    if not workout:
+        raise HTTPException(status_code=404, detail="Workout not found")
+
+    # 1. Log the set, and update the personal-record index in the same transaction
     new_set = models.WorkoutSets(
+        id=uuid4(),
         workout_id=set_data.workout_id,
         exercise_id=set_data.exercise_id,
         set_order=set_data.set_order,
         weight_kg=set_data.weight_kg,
         reps=set_data.reps,
-        rpe=set_data.rpe
+        rpe=set_data.rpe,
+        is_warmup=False
     )
     db.add(new_set)
+    new_prs = prs.record_set(db, current_user.id, new_set, workout.start_time)
+    workload.add_set(db, current_user.id, new_set, workout.start_time.date())
     db.commit()
     
     # 2. Check Logic for Next Set/Session
@@ -109,9 +126,53 @@ def log_set(set_data: schemas.WorkoutSetCreate, current_user: models.User = Depe
     if set_data.rpe is not None and set_data.rpe <= 8.5 and set_data.reps >= 8:
         suggestion = "Consider +2.5kg next set/session"
     
-    return {"set": new_set, "suggestion": suggestion}
+    return {"set": new_set, "suggestion": suggestion, "prs": new_prs}
+
+@router.delete("/set/{set_id}", response_model=schemas.Message)
+def delete_set(set_id: UUID, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    """Delete a logged set; personal records it held fall back to the next best set"""
+    workout_set = (
+        db.query(models.WorkoutSets)
+        .join(models.Workouts, models.WorkoutSets.workout_id == models.Workouts.id)
+        .filter(models.WorkoutSets.id == set_id, models.Workouts.user_id == current_user.id)
+        .first()
+    )
+    if not workout_set:
+        raise HTTPException(status_code=404, detail="Set not found")
+    prs.forget_set(db, current_user.id, workout_set)
+    workload.remove_set(db, current_user.id, workout_set, workout_set.workout.start_time.date())
+    db.delete(workout_set)
+    db.commit()
+    return {"message": "Set deleted"}
+
+@router.get("/readiness", response_model=List[schemas.ReadinessPoint])
+def get_readiness(days: int = Query(28, ge=1, le=180), current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    """Daily readiness (acute:chronic training load, nutrition adherence, weight trend), oldest first"""
+    today = datetime.now(timezone.utc).date()
+    return workload.series(db, current_user, today - timedelta(days=days - 1), today)
 
-@router.post("/session/finish")
+@router.get("/prs", response_model=List[schemas.ExerciseRecords])
+def get_personal_records(exercise_id: Optional[UUID] = None, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    """Personal records per exercise, best estimated 1RM first (reads only the index)"""
+    query = (
+        db.query(models.PersonalRecord, models.Exercises.name)
+        .join(models.Exercises, models.PersonalRecord.exercise_id == models.Exercises.id)
+        .filter(models.PersonalRecord.user_id == current_user.id)
+    )
+    if exercise_id:
+        query = query.filter(models.PersonalRecord.exercise_id == exercise_id)
+    exercises = {}
+    for record, name in query.order_by(models.PersonalRecord.reps):
+        entry = exercises.setdefault(record.exercise_id, {"exercise_id": record.exercise_id, "exercise_name": name, "rep_maxes": []})
+        if record.reps == prs.E1RM:
+            entry.update(e1rm=record.e1rm, e1rm_weight_kg=record.weight_kg, e1rm_reps=record.set_reps,
+                         e1rm_achieved_at=record.achieved_at)
+        else:
+            entry["rep_maxes"].append({"reps": record.reps, "weight_kg": record.weight_kg, "achieved_at": record.achieved_at})
+    # Every set that holds a rep max also sets an e1rm record, so each exercise has one
+    return sorted((e for e in exercises.values() if "e1rm" in e), key=lambda e: e["e1rm"], reverse=True)
+
+@router.post("/session/finish", response_model=schemas.Message)
 def finish_session(workout_id: UUID, db: Session = Depends(database.get_db)):
     workout = db.query(models.Workouts).filter(models.Workouts.id == workout_id).first()
     if workout:
@@ -119,20 +180,27 @@ def finish_session(workout_id: UUID, db: Session = Depends(database.get_db)):
         db.commit()
     return {"message": "Workout finished"}
 
-@router.get("/exercises")
+_EXERCISE_LIST = TypeAdapter(List[schemas.ExerciseSummary])
+_PLAN_DETAIL = TypeAdapter(schemas.PlanDetail)
+
+@router.get("/exercises", response_model=List[schemas.ExerciseSummary])
 def get_exercises(q: Optional[str] = None, limit: int = 50, db: Session = Depends(database.get_db)):
-    query = db.query(models.Exercises)
-    if q:
-        # Simple case-insensitive search
-        search = f"%{q}%"
-        query = query.filter(
-            (models.Exercises.name.ilike(search)) | 
-            (models.Exercises.name_zh.ilike(search))
-        )
-    return query.limit(limit).all()
+    def build():
+        query = db.query(models.Exercises)
+        if q:
+            # Simple case-insensitive search
+            search = f"%{q}%"
+            query = query.filter(
+                (models.Exercises.name.ilike(search)) | 
+                (models.Exercises.name_zh.ilike(search))
+            )
+        return query.limit(limit).all()
+
+    key = f"catalog:exercises:{cache.generation('catalog:exercises')}:{limit}:{q or ''}"
+    return cache.cached_response(key, build, _EXERCISE_LIST)
 
 # Training Plan Management Endpoints
-@router.post("/plans")
+@router.post("/plans", response_model=schemas.TrainingPlanSummary)
 def create_training_plan(
     name: str,
     description: str = "",
@@ -151,7 +219,7 @@ def create_training_plan(
     db.refresh(new_plan)
     return new_plan
 
-@router.get("/plans")
+@router.get("/plans", response_model=List[schemas.TrainingPlanSummary])
 def get_user_plans(
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
@@ -162,7 +230,7 @@ def get_user_plans(
     ).all()
     return plans
 
-@router.get("/plans/{plan_id}")
+@router.get("/plans/{plan_id}", response_model=schemas.PlanDetail)
 def get_plan_details(
     plan_id: str,
     current_user: models.User = Depends(auth.get_current_user),
@@ -171,10 +239,16 @@ def get_plan_details(
     """Get detailed plan with exercises grouped by day"""
     from uuid import UUID
     plan_uuid = UUID(plan_id)
-    
-    plan = db.query(models.TrainingPlan).filter(
+    key = f"plan:{cache.generation(f'plans:{current_user.id}')}:{plan_uuid}"
+    return cache.cached_response(key, lambda: _plan_detail(db, plan_uuid, current_user.id), _PLAN_DETAIL)
+
+def _plan_detail(db: Session, plan_uuid, user_id) -> dict:
+    # Load the plan's exercises and their catalog rows up front instead of one query per row
+    plan = db.query(models.TrainingPlan).options(
+        selectinload(models.TrainingPlan.exercises).joinedload(models.PlanExercise.exercise)
+    ).filter(
         models.TrainingPlan.id == plan_uuid,
-        models.TrainingPlan.user_id == current_user.id
+        models.TrainingPlan.user_id == user_id
     ).first()
     
     if not plan:
@@ -195,6 +269,9 @@ def get_plan_details(
             "reps_max": pe.reps_max,
             "order": pe.order
         })
+    # Rows load in no particular order; a day's exercises are shown in their saved order
+    for exercises in days.values():
+        exercises.sort(key=lambda e: e["order"] if e["order"] is not None else float("inf"))
     
     return {
         "id": str(plan.id),
@@ -204,7 +281,7 @@ def get_plan_details(
         "days": days
     }
 
-@router.post("/plans/{plan_id}/activate")
+@router.post("/plans/{plan_id}/activate", response_model=schemas.Message)
 def activate_plan(
     plan_id: str,
     current_user: models.User = Depends(auth.get_current_user),
@@ -233,7 +310,7 @@ def activate_plan(
     
     return {"message": "Plan activated"}
 
-@router.post("/plans/{plan_id}/exercises")
+@router.post("/plans/{plan_id}/exercises", response_model=schemas.PlanExerciseResponse)
 def add_exercise_to_plan(
     plan_id: str,
     exercise_id: str,
@@ -280,7 +357,7 @@ def add_exercise_to_plan(
     db.refresh(new_exercise)
     return new_exercise
 
-@router.delete("/plans/{plan_id}/exercises/{exercise_id}")
+@router.delete("/plans/{plan_id}/exercises/{exercise_id}", response_model=schemas.Message)
 def remove_exercise_from_plan(
     plan_id: str,
     exercise_id: str,
@@ -306,11 +383,136 @@ def remove_exercise_from_plan(
         models.PlanExercise.id == exercise_uuid,
         models.PlanExercise.plan_id == plan_uuid
     ).delete()
+    # Bulk delete skips the ORM events, so invalidate the cached plan explicitly
+    cache.invalidate_on_commit(db, cache.generation_key(f"plans:{current_user.id}"))
     
     db.commit()
     return {"message": "Exercise removed"}
 
-@router.delete("/plans/{plan_id}")
+def _sync_plan_days(db: Session, plan_uuid, days: dict, rows: list):
+    """Diff the requested days against the existing PlanExercise rows and stage only the changes.
+
+    Rows referenced by id are updated in place (and may move between days), items without an id
+    are inserted, and rows in `rows` that are no longer referenced are deleted. Nothing is committed.
+    """
+    by_id = {pe.id: pe for pe in rows}
+
+    # Validate the whole payload before touching the session
+    seen = set()
+    new_exercise_ids = set()
+    for day in days.values():
+        for item in day.exercises:
+            if item.id is not None:
+                if item.id not in by_id:
+                    raise HTTPException(status_code=400, detail=f"Unknown plan exercise {item.id}")
+                if item.id in seen:
+                    raise HTTPException(status_code=400, detail=f"Duplicate plan exercise {item.id}")
+                seen.add(item.id)
+            if item.id is None or by_id[item.id].exercise_id != item.exercise_id:
+                new_exercise_ids.add(item.exercise_id)
+
+    if new_exercise_ids:
+        found = {
+            row.id for row in db.query(models.Exercises.id).filter(models.Exercises.id.in_(new_exercise_ids))
+        }
+        missing = new_exercise_ids - found
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown exercise {next(iter(missing))}")
+
+    for day_name, day in days.items():
+        for position, item in enumerate(day.exercises, start=1):
+            if item.id is None:
+                db.add(models.PlanExercise(
+                    plan_id=plan_uuid,
+                    exercise_id=item.exercise_id,
+                    day_name=day_name,
+                    day_name_zh=day.day_name_zh,
+                    sets=item.sets,
+                    reps_min=item.reps_min,
+                    reps_max=item.reps_max,
+                    order=position
+                ))
+                continue
+
+            pe = by_id[item.id]
+            changes = {
+                "exercise_id": item.exercise_id,
+                "day_name": day_name,
+                "sets": item.sets,
+                "reps_min": item.reps_min,
+                "reps_max": item.reps_max,
+                "order": position,
+            }
+            if day.day_name_zh is not None:
+                changes["day_name_zh"] = day.day_name_zh
+            for field, value in changes.items():
+                if getattr(pe, field) != value:
+                    setattr(pe, field, value)
+
+    for pe in rows:
+        if pe.id not in seen:
+            db.delete(pe)
+
+@router.put("/plans/{plan_id}/days/{day_name}", response_model=schemas.PlanDetail)
+def update_plan_day(
+    plan_id: str,
+    day_name: str,
+    day: schemas.PlanDayUpdate,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    """Replace, reorder and edit all exercises of one plan day in a single transaction"""
+    plan_uuid = UUID(plan_id)
+
+    plan = db.query(models.TrainingPlan).filter(
+        models.TrainingPlan.id == plan_uuid,
+        models.TrainingPlan.user_id == current_user.id
+    ).first()
+
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found")
+
+    rows = db.query(models.PlanExercise).filter(
+        models.PlanExercise.plan_id == plan_uuid,
+        models.PlanExercise.day_name == day_name
+    ).all()
+
+    _sync_plan_days(db, plan_uuid, {day_name: day}, rows)
+    db.commit()
+    return get_plan_details(plan_id, current_user, db)
+
+@router.put("/plans/{plan_id}", response_model=schemas.PlanDetail)
+def update_plan(
+    plan_id: str,
+    data: schemas.PlanUpdate,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    """Replace a whole plan in a single transaction (days missing from `days` are removed; omit `days` to keep them)"""
+    plan_uuid = UUID(plan_id)
+
+    plan = db.query(models.TrainingPlan).filter(
+        models.TrainingPlan.id == plan_uuid,
+        models.TrainingPlan.user_id == current_user.id
+    ).first()
+
+    if not plan:
+        raise HTTPException(status_code=404, detail="Plan not found")
+
+    if data.name is not None and data.name != plan.name:
+        plan.name = data.name
+    if data.description is not None and data.description != plan.description:
+        plan.description = data.description
+
+    if data.days is not None:
+        rows = db.query(models.PlanExercise).filter(
+            models.PlanExercise.plan_id == plan_uuid
+        ).all()
+        _sync_plan_days(db, plan_uuid, data.days, rows)
+    db.commit()
+    return get_plan_details(plan_id, current_user, db)
+
+@router.delete("/plans/{plan_id}", response_model=schemas.Message)
 def delete_plan(
     plan_id: str,
     current_user: models.User = Depends(auth.get_current_user),
@@ -332,7 +534,7 @@ def delete_plan(
     db.commit()
     return {"message": "Plan deleted"}
 
-@router.get("/exercise/{exercise_id}/history")
+@router.get("/exercise/{exercise_id}/history", response_model=List[schemas.ExerciseHistorySession])
 def get_exercise_history(
     exercise_id: str,
     limit: int = 20,
@@ -389,9 +591,35 @@ def get_exercise_history(
     result = sorted(sessions.values(), key=lambda x: x["date"])[-limit:]
     return result
 
-@router.get("/history")
+@router.get("/summary", response_model=List[schemas.TrainingSummary])
+def get_training_summary(period: str = Query("week", pattern="^(week|month)$"), limit: int = 12,
+                         current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
+    """Workouts, sets, volume and time per week or month, most recent first (reads only the rollups)"""
+    rows = db.query(models.UserRollup).filter(
+        models.UserRollup.user_id == current_user.id,
+        models.UserRollup.period == period,
+        models.UserRollup.workouts > 0
+    ).order_by(models.UserRollup.period_start.desc()).limit(min(limit, 120)).all()
+    return [
+        {
+            "period_start": row.period_start,
+            "workouts": row.workouts,
+            "training_days": row.training_days,
+            "workouts_per_week": round(row.workouts * 7 / _period_days(period, row.period_start), 2),
+            "sets": row.sets,
+            "volume_kg": round(row.volume_kg, 1),
+            "training_minutes": round(row.training_minutes, 1),
+        }
+        for row in rows
+    ]
+
+def _period_days(period: str, start) -> int:
+    return (rollups.period_end(period, start) - start).days + 1
+
+@router.get("/history", response_model=List[schemas.WorkoutHistoryItem])
 def get_workout_history(
     limit: int = 20,
+    offset: int = 0,
     current_user: models.User = Depends(auth.get_current_user),
     db: Session = Depends(database.get_db)
 ):
@@ -400,6 +628,7 @@ def get_workout_history(
         db.query(models.Workouts)
         .filter(models.Workouts.user_id == current_user.id)
         .order_by(models.Workouts.start_time.desc())
+        .offset(offset)
         .limit(limit)
         .all()
     )
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from backend import models, schemas, database, auth
+from backend import models, schemas, database, auth, profiling, ratelimit, export, importer, jobs
 from datetime import datetime, timezone, timedelta
+from typing import List
+import os
+import shutil
+import uuid
 
 router = APIRouter(
     prefix="/user",
-    tags=["user"]
+    tags=["user"],
+    route_class=profiling.ProfiledRoute,
+    dependencies=[Depends(ratelimit.limit("write"))],
 )
 
 # TDEE Calculation Logic (Mifflin-St Jeor)
@@ -27,7 +34,7 @@ def calculate_tdee(age, gender, height, weight, activity_level):
     
     return bmr * multipliers.get(activity_level, 1.2)
 
-@router.put("/onboarding", response_model=schemas.User)
+@router.put("/onboarding", response_model=schemas.UserProfile)
 def onboarding(data: schemas.UserOnboarding, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(database.get_db)):
     tdee = calculate_tdee(data.age, data.gender, data.height_cm, data.weight_kg, data.activity_level)
     
@@ -53,7 +60,7 @@ def onboarding(data: schemas.UserOnboarding, current_user: models.User = Depends
     db.refresh(current_user)
     return current_user
 
-@router.get("/me", response_model=schemas.User)
+@router.get("/me", response_model=schemas.UserProfile)
 def read_users_me(current_user: models.User = Depends(auth.get_current_active_user)):
     return current_user
 
@@ -73,7 +80,7 @@ def log_stats(stats: schemas.UserStatsBase, current_user: models.User = Depends(
     db.refresh(new_stats)
     return new_stats
 
-@router.get("/trends")
+@router.get("/trends", response_model=schemas.WeightTrends)
 def get_trends(current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(database.get_db)):
     # Get last 14 days of stats
     two_weeks_ago = datetime.now(timezone.utc) - timedelta(days=14)
@@ -121,16 +128,99 @@ def get_trends(current_user: models.User = Depends(auth.get_current_active_user)
         "history": [{"date": s.date, "weight": s.weight_kg} for s in stats]
     }
 
-@router.get("/history", response_model=list[schemas.UserStats])
-def get_history(limit: int = 30, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(database.get_db)):
+@router.get("/history", response_model=List[schemas.UserStats])
+def get_history(limit: int = 30, offset: int = 0, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(database.get_db)):
     stats = db.query(models.UserStats).filter(
         models.UserStats.user_id == current_user.id
-    ).order_by(models.UserStats.date.desc()).limit(limit).all()
+    ).order_by(models.UserStats.date.desc()).offset(offset).limit(limit).all()
     return stats
 
+@router.get("/export", response_class=StreamingResponse)
+def export_data(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), current_user: models.User = Depends(auth.get_current_active_user)):
+    # Streams from its own session with server-side cursors; memory does not grow with history
+    media_type, _ = export.FORMATS[format]
+    return StreamingResponse(
+        export.stream_export(current_user.id, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export.export_filename(format)}"'},
+    )
+
+@router.post("/import", response_model=schemas.ImportSummary)
+def import_data(
+    file: UploadFile = File(...),
+    source: str = Query("auto", pattern="^(auto|strong|hevy|mfp)$"),
+    weight_unit: str = Query("kg", pattern="^(kg|lb)$"),
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(database.get_db),
+):
+    # The upload is spooled to disk by Starlette and parsed row by row, so large files are fine
+    try:
+        summary = importer.import_file(db, current_user.id, file.file, source, weight_unit)
+    except importer.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    return summary
+
+@router.post("/import/jobs", response_model=schemas.JobStatus, status_code=202)
+def import_data_in_background(
+    file: UploadFile = File(...),
+    source: str = Query("auto", pattern="^(auto|strong|hevy|mfp)$"),
+    weight_unit: str = Query("kg", pattern="^(kg|lb)$"),
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(database.get_db),
+):
+    # Same import as POST /import, run by a job worker; poll GET /user/jobs/{id} for the summary
+    name = f"{uuid.uuid4().hex}.upload"
+    with open(jobs.job_file(name), "wb") as out:
+        shutil.copyfileobj(file.file, out, 1024 * 1024)
+    job = jobs.enqueue(
+        db, "import_file", {"file": name, "source": source, "weight_unit": weight_unit},
+        user_id=current_user.id, priority=jobs.PRIORITY_LOW,
+    )
+    db.commit()
+    return job
+
+@router.post("/export/jobs", response_model=schemas.JobStatus, status_code=202)
+def export_data_in_background(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: models.User = Depends(auth.get_current_active_user),
+    db: Session = Depends(database.get_db),
+):
+    # Asking again while one is pending returns the pending job
+    job = jobs.enqueue(
+        db, "export", {"format": format},
+        user_id=current_user.id, key=f"export:{current_user.id}:{format}", priority=jobs.PRIORITY_LOW,
+    )
+    db.commit()
+    return job
+
+def _own_job(db: Session, job_id, user_id) -> models.BackgroundJob:
+    job = db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.id == job_id,
+        models.BackgroundJob.user_id == user_id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}", response_model=schemas.JobStatus)
+def get_job(job_id: uuid.UUID, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(database.get_db)):
+    return _own_job(db, job_id, current_user.id)
+
+@router.get("/jobs/{job_id}/download", response_class=FileResponse)
+def download_job_file(job_id: uuid.UUID, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(database.get_db)):
+    job = _own_job(db, job_id, current_user.id)
+    if job.kind != "export" or job.status != "done":
+        raise HTTPException(status_code=409, detail="Export not ready")
+    path = jobs.job_file(job.result["file"])
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Export file has expired")
+    media_type, _ = export.FORMATS[job.result["format"]]
+    return FileResponse(path, media_type=media_type, filename=job.result["filename"])
+
 from uuid import UUID
 
-@router.delete("/history/{log_id}")
+@router.delete("/history/{log_id}", response_model=schemas.Message)
 def delete_history_log(log_id: UUID, current_user: models.User = Depends(auth.get_current_active_user), db: Session = Depends(database.get_db)):
     # 1. Check if log exists and belongs to user
     log = db.query(models.UserStats).filter(
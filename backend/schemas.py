@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, model_validator
+from typing import Optional, List, Dict, Literal, Union
+from datetime import datetime, date
 from uuid import UUID
 
 class UserBase(BaseModel):
@@ -25,6 +25,10 @@ class User(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -74,13 +78,48 @@ class WorkoutSetResponse(BaseModel):
     class Config:
         orm_mode = True
 
+class PersonalRecordHit(BaseModel):
+    kind: str  # "rep_max" (heaviest for this many reps) or "e1rm" (best estimated 1RM)
+    reps: int
+    weight_kg: float
+    e1rm: float
+    previous: Optional[float] = None  # previous best weight (rep_max) or e1rm; None for a first record
+
+class WorkoutSetLogged(BaseModel):
+    set: WorkoutSetResponse
+    suggestion: str
+    prs: List[PersonalRecordHit] = []
+
+class ReadinessPoint(BaseModel):
+    date: date
+    acute_load: float  # last 7 days
+    chronic_load: float  # weekly average over the last 28 days
+    acwr: Optional[float] = None  # acute:chronic workload ratio
+    load_score: Optional[int] = None
+    nutrition_score: Optional[int] = None
+    body_score: Optional[int] = None
+    score: Optional[int] = None  # 0-100; None without any data
+
+class RepMax(BaseModel):
+    reps: int
+    weight_kg: float
+    achieved_at: datetime
+
+class ExerciseRecords(BaseModel):
+    exercise_id: UUID
+    exercise_name: Optional[str] = None
+    e1rm: float
+    e1rm_weight_kg: float  # the set behind the estimate
+    e1rm_reps: int
+    e1rm_achieved_at: datetime
+    rep_maxes: List[RepMax]
+
 class Workout(BaseModel):
     id: UUID
     start_time: datetime
     end_time: Optional[datetime] = None
     notes: Optional[str] = None
-    class Config:
-        orm_mode = True
+    readiness_score: Optional[int] = None
     class Config:
         orm_mode = True
 
@@ -110,3 +149,284 @@ class Exercise(ExerciseBase):
     id: UUID
     class Config:
         orm_mode = True
+
+class PlanExerciseItem(BaseModel):
+    id: Optional[UUID] = None # existing PlanExercise row, omit to insert
+    exercise_id: UUID
+    sets: int = 3
+    reps_min: int = 8
+    reps_max: int = 12
+
+class PlanDayUpdate(BaseModel):
+    day_name_zh: Optional[str] = None
+    exercises: List[PlanExerciseItem] = [] # list position becomes the display order
+
+class PlanUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    days: Optional[Dict[str, PlanDayUpdate]] = None # None leaves the plan's days as they are
+
+# ---------- Slim response models ----------
+# Every endpoint declares one of these so only the listed columns are serialized
+# (straight to JSON bytes by pydantic) instead of whole ORM rows via jsonable_encoder.
+
+class Message(BaseModel):
+    message: str
+
+class UserProfile(UserBase):
+    id: UUID
+    created_at: datetime
+    settings: Optional[dict] = {}
+
+    class Config:
+        orm_mode = True
+
+class WeightPoint(BaseModel):
+    date: date
+    weight: Optional[float] = None
+
+class WeightTrends(BaseModel):
+    current_avg: float
+    previous_avg: float
+    diff_pct: Optional[float] = None
+    trend: str
+    message: str
+    history: List[WeightPoint] = []
+
+class ExerciseSummary(BaseModel):
+    id: UUID
+    name: str
+    name_zh: Optional[str] = None
+    type: Optional[str] = None
+    primary_muscle: Optional[str] = None
+    equipment: Optional[str] = None
+    class Config:
+        orm_mode = True
+
+class DefaultPlanExercise(BaseModel):
+    id: Optional[str] = None
+    name: str
+
+class DefaultPlanDay(BaseModel):
+    id: str
+    name: str
+    exercises: List[DefaultPlanExercise]
+
+class DefaultPlan(BaseModel):
+    days: List[DefaultPlanDay]
+
+class TrainingPlanSummary(BaseModel):
+    id: UUID
+    name: str
+    name_zh: Optional[str] = None
+    description: Optional[str] = None
+    is_active: bool = False
+    created_at: Optional[datetime] = None
+    class Config:
+        orm_mode = True
+
+class PlanExerciseResponse(BaseModel):
+    id: UUID
+    exercise_id: UUID
+    day_name: str
+    day_name_zh: Optional[str] = None
+    sets: int
+    reps_min: int
+    reps_max: int
+    order: int
+    class Config:
+        orm_mode = True
+
+class PlanDayExercise(BaseModel):
+    id: str
+    exercise_id: str
+    name: str
+    name_zh: Optional[str] = None
+    sets: int
+    reps_min: int
+    reps_max: int
+    order: int
+
+class PlanDetail(BaseModel):
+    id: str
+    name: str
+    description: Optional[str] = None
+    is_active: bool
+    days: Dict[str, List[PlanDayExercise]]
+
+class HistorySet(BaseModel):
+    set_order: Optional[int] = None
+    weight_kg: float
+    reps: Optional[int] = None
+    rpe: Optional[float] = None
+
+class ExerciseHistorySession(BaseModel):
+    date: str
+    workout_id: str
+    sets: List[HistorySet]
+    max_weight: float
+    total_volume: float
+
+class WorkoutHistoryItem(BaseModel):
+    id: str
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    notes: Optional[str] = None
+    duration_min: Optional[int] = None
+
+class FoodItem(BaseModel):
+    id: UUID
+    name: str
+    name_zh: Optional[str] = None
+    calories: float
+    protein_g: float
+    carbs_g: float
+    fat_g: float
+    serving_size: Optional[str] = None
+    serving_size_zh: Optional[str] = None
+    category: Optional[str] = None
+    class Config:
+        orm_mode = True
+
+class NutritionSummary(BaseModel):
+    period_start: date
+    days_logged: int
+    avg_calories: float  # per logged day
+    avg_protein: float
+    avg_calories_target: float
+    avg_protein_target: float
+    calorie_adherence: float  # share of logged days within 10% of the calorie target
+    protein_adherence: float  # share of logged days reaching 90% of the protein target
+
+class TrainingSummary(BaseModel):
+    period_start: date
+    workouts: int
+    training_days: int
+    workouts_per_week: float
+    sets: int
+    volume_kg: float
+    training_minutes: float
+
+class FrequentFood(BaseModel):
+    food_id: Optional[UUID] = None  # set for catalog foods: log again with /log_from_food
+    name: str
+    servings: Optional[float] = None
+    calories: int
+    protein: int
+    carbs: int
+    fats: int
+    score: float  # decayed number of times logged
+    last_logged_at: datetime
+
+class Macros(BaseModel):
+    calories: int
+    protein: int
+    carbs: int
+    fats: int
+
+class DailyNutrition(BaseModel):
+    date: date
+    targets: Macros
+    actuals: Macros
+    logs: List[FoodLogResponse]
+
+class MealItem(BaseModel):
+    # Either a catalog food (food_id + servings) or a free-form entry (name + macros)
+    food_id: Optional[UUID] = None
+    servings: float = Field(1, gt=0, le=100)
+    name: Optional[str] = Field(None, min_length=1, max_length=200)
+    calories: Optional[int] = Field(None, ge=0, le=10000)
+    protein: int = Field(0, ge=0, le=1000)
+    carbs: int = Field(0, ge=0, le=1000)
+    fats: int = Field(0, ge=0, le=1000)
+
+    @model_validator(mode="after")
+    def has_a_food(self):
+        if self.food_id is None and (not self.name or self.calories is None):
+            raise ValueError("Each item needs a food_id, or a name and calories")
+        return self
+
+class MealCreate(BaseModel):
+    meal_name: str = "Meal"
+    items: List[MealItem]
+
+class MealResponse(BaseModel):
+    logs: List[FoodLogResponse]
+    totals: Macros
+
+class ApiKeyStatus(BaseModel):
+    has_key: bool
+
+# Actions the AI coach asks to log (parsed from log_action blocks, see backend.log_actions)
+class FoodLogAction(BaseModel):
+    type: Literal["food_log"]
+    name: str = Field("AI logged food", min_length=1, max_length=200)
+    calories: float = Field(0, ge=0, le=10000)
+    protein: float = Field(0, ge=0, le=1000)
+    carbs: float = Field(0, ge=0, le=1000)
+    fats: float = Field(0, ge=0, le=1000)
+
+class BodyStatAction(BaseModel):
+    type: Literal["body_stat"]
+    weight_kg: Optional[float] = Field(None, gt=20, lt=400)
+    waist_cm: Optional[float] = Field(None, gt=30, lt=300)
+    body_fat_pct: Optional[float] = Field(None, gt=2, lt=75)
+
+    @model_validator(mode="after")
+    def has_a_measurement(self):
+        if self.weight_kg is None and self.waist_cm is None and self.body_fat_pct is None:
+            raise ValueError("body_stat needs weight_kg, waist_cm or body_fat_pct")
+        return self
+
+LogAction = Union[FoodLogAction, BodyStatAction]
+
+class ChatResponse(BaseModel):
+    reply: str
+    actions: List[LogAction] = []  # queued, not yet written: log_job_id writes them all together
+    rejected_actions: int = 0  # log_action entries that failed validation
+    log_job_id: Optional[UUID] = None
+    conversation_id: Optional[UUID] = None
+
+class ConversationSummary(BaseModel):
+    id: UUID
+    title: Optional[str] = None
+    turns: int
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class ConversationExchange(BaseModel):
+    seq: int
+    message: str
+    reply: str
+    created_at: datetime
+
+class ConversationDetail(ConversationSummary):
+    summary: Optional[str] = None
+    exchanges: List[ConversationExchange]  # older exchanges may have been folded into the summary
+
+class ImportSummary(BaseModel):
+    source: str
+    rows: int
+    skipped: int
+    workouts: int
+    sets: int
+    food_logs: int
+    created_exercises: List[str]
+    daily_logs_recomputed: int
+    first_date: Optional[date] = None
+    last_date: Optional[date] = None
+
+class JobStatus(BaseModel):
+    id: UUID
+    kind: str
+    status: str  # queued / running / done / failed
+    attempts: int
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+
+    class Config:
+        orm_mode = True
@@ -0,0 +1,110 @@
+"""Application start-up, run from the lifespan in main.py with per-phase timings.
+
+Phases (each logged and exported as app_startup_phase_seconds on /metrics):
+
+- import     module imports up to the app object (measured in main.py)
+- schema     CREATE_TABLES=auto (default) lists existing tables with one query and only
+             creates the missing ones, so a deployed database sees no DDL at all;
+             CREATE_TABLES=off skips the check for deployments that manage schema themselves
+- mappers    configure the ORM mappers now instead of on the first query
+- db_pool    open DB_WARM_CONNECTIONS pooled connections (TLS + auth done up front)
+- catalogs   run the exercise and food catalog queries so their compiled SQL is cached
+- passwords  load the argon2 backend and start one hashing worker
+- food_catalog  map FOOD_CATALOG_PATH, when set
+
+STARTUP_WARMUP=0 skips all but the schema phase (e.g. for one-off scripts or tests).
+
+    python -m backend.startup --create-tables   # schema only, e.g. from a deploy hook
+"""
+import argparse
+import logging
+import os
+import time
+from contextlib import ExitStack, contextmanager
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import configure_mappers
+
+from . import food_catalog, models, passwords, metrics
+from .database import SessionLocal, engine
+
+# Shown next to uvicorn's own "Application startup complete."
+logger = logging.getLogger("uvicorn.error")
+
+CREATE_TABLES = os.getenv("CREATE_TABLES", "auto").lower()  # auto | off
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") != "0"
+DB_WARM_CONNECTIONS = int(os.getenv("DB_WARM_CONNECTIONS", "2"))
+
+class PhaseTimer:
+    def __init__(self):
+        self.phases = {}
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = seconds
+        metrics.STARTUP_PHASES.set(round(seconds, 4), name)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def report(self):
+        total = sum(self.phases.values())
+        metrics.STARTUP_PHASES.set(round(total, 4), "total")
+        logger.info(
+            "Startup %.0f ms (%s)", total * 1000,
+            ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items()),
+        )
+
+def create_missing_tables(bind=engine):
+    """Create only the tables that do not exist yet; returns their names."""
+    existing = set(inspect(bind).get_table_names())
+    missing = [table for table in models.Base.metadata.sorted_tables if table.name not in existing]
+    if missing:
+        models.Base.metadata.create_all(bind=bind, tables=missing, checkfirst=False)
+        logger.info("Created tables: %s", ", ".join(t.name for t in missing))
+    return [t.name for t in missing]
+
+def warm_db_pool(connections: int):
+    # Held open together so the pool really ends up with that many live connections
+    with ExitStack() as stack:
+        for _ in range(connections):
+            stack.enter_context(engine.connect()).execute(text("SELECT 1"))
+
+def warm_catalogs():
+    # Same query shapes as GET /training/exercises and GET /nutrition/foods
+    with SessionLocal() as db:
+        db.query(models.Exercises).limit(50).all()
+        db.query(models.FoodItem).limit(50).all()
+
+def run(timer: PhaseTimer):
+    """Blocking start-up work; called from the lifespan before the app serves requests."""
+    if CREATE_TABLES != "off":
+        with timer.phase("schema"):
+            create_missing_tables()
+    if not STARTUP_WARMUP:
+        return
+    with timer.phase("mappers"):
+        configure_mappers()
+    with timer.phase("db_pool"):
+        warm_db_pool(DB_WARM_CONNECTIONS)
+    with timer.phase("catalogs"):
+        warm_catalogs()
+    with timer.phase("passwords"):
+        passwords.warm()
+    if food_catalog.FOOD_CATALOG_PATH:
+        with timer.phase("food_catalog"):
+            food_catalog.current()
+
+def main():
+    parser = argparse.ArgumentParser(description="Workout Monster start-up tasks")
+    parser.add_argument("--create-tables", action="store_true", help="create any missing tables and exit")
+    args = parser.parse_args()
+    if args.create_tables:
+        print(", ".join(create_missing_tables()) or "Schema up to date")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Background job handlers (see backend.jobs).
+
+- ai.log_action       apply the food_log / body_stat actions parsed from an AI chat reply
+- ai.summarize        fold AI chat exchanges that left the recent window into the conversation summary
+- daily_logs.rebuild  recompute DailyLog totals for a date range from FoodLog and Workouts
+- import_file         import a spooled Strong / Hevy / MyFitnessPal export
+- export              write a full-account export to a file for later download
+- food_catalog.build  rebuild the memory-mapped food catalog file after catalog changes
+- rollups.refresh     recompute a user's weekly/monthly rollups for a date range (all when unset)
+"""
+import os
+import uuid
+from datetime import date, datetime
+
+from pydantic import ValidationError
+
+from . import conversations, export, food_catalog, importer, log_actions, models, rollups
+from .jobs import JobFailed, handler, heartbeat, job_file
+
+@handler("ai.log_action")
+def apply_log_action(db, job):
+    """Payload: {"actions": [...], "date": iso date, "time": iso datetime}, both taken when the
+    user chatted, so a job that runs late still logs to the right day. All actions are applied
+    in the job's one transaction."""
+    try:
+        actions = log_actions.validate(job.payload["actions"])
+    except ValidationError as e:
+        raise JobFailed(f"Invalid log_action: {e.errors(include_url=False)}")
+    logged = log_actions.apply(
+        db, job.user_id, actions,
+        date.fromisoformat(job.payload["date"]), datetime.fromisoformat(job.payload["time"]),
+    )
+    # Not committed here: the job runner commits these writes together with the job's status
+    return {"logged": logged}
+
+@handler("ai.summarize")
+def summarize_conversation(db, job):
+    conversation = db.get(models.Conversation, uuid.UUID(job.payload["conversation_id"]))
+    if conversation is None:
+        return {"summarized": 0}  # deleted or evicted since
+    user = db.get(models.User, job.user_id)
+    api_key = ((user.settings if user else None) or {}).get("gemini_api_key")
+    if not api_key:
+        raise JobFailed("Gemini API key not set")
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    model = genai.GenerativeModel(model_name="gemini-1.5-flash")
+    return {"summarized": conversations.summarize(db, conversation, lambda prompt: model.generate_content(prompt).text)}
+
+@handler("daily_logs.rebuild")
+def rebuild_daily_logs(db, job):
+    first = date.fromisoformat(job.payload["first"])
+    last = date.fromisoformat(job.payload["last"])
+    return {"daily_logs": importer.recompute_daily_logs(db, job.user_id, first, last)}
+
+@handler("import_file")
+def import_file(db, job):
+    """Payload: {"file": spooled upload in JOB_FILES_DIR, "source", "weight_unit"}. The rows are
+    committed by the job runner with the job's status, so a retry after a lost worker or a failed
+    commit imports the file from scratch; the upload is kept for that and purged with the job."""
+    path = job_file(job.payload["file"])
+    try:
+        with open(path, "rb") as f:
+            return importer.import_file(db, job.user_id, f, job.payload["source"], job.payload["weight_unit"],
+                                        on_chunk=heartbeat(job))
+    except FileNotFoundError:
+        raise JobFailed("Uploaded file is no longer available")
+    except importer.ImportFormatError as e:
+        os.remove(path)
+        raise JobFailed(str(e))
+
+@handler("export")
+def export_to_file(db, job):
+    """Payload: {"format": "ndjson" | "csv"}; the result names the file to download."""
+    fmt = job.payload["format"]
+    name = f"{job.id}.{export.FORMATS[fmt][1]}"
+    size = 0
+    with open(job_file(name), "wb") as out:
+        for chunk in export.stream_export(job.user_id, fmt):
+            out.write(chunk)
+            size += len(chunk)
+    return {"file": name, "format": fmt, "bytes": size, "filename": export.export_filename(fmt)}
+
+@handler("food_catalog.build")
+def build_food_catalog(db, job):
+    # Workers pick up the new file by its modification time
+    return {"foods": food_catalog.build()}
+
+@handler("rollups.refresh")
+def refresh_rollups(db, job):
+    first, last = job.payload.get("first"), job.payload.get("last")
+    return {"rollups": rollups.refresh(
+        db, job.user_id,
+        date.fromisoformat(first) if first else None,
+        date.fromisoformat(last) if last else None,
+    )}
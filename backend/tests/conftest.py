@@ -0,0 +1,101 @@
+"""Test fixtures: the app against a throwaway SQLite database, no outside services.
+
+    python -m pytest backend/tests
+"""
+import os
+import tempfile
+
+# Before anything imports backend.database: a fresh database, and nothing running in the background
+_db_dir = tempfile.mkdtemp(prefix="workout-monster-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault("STARTUP_WARMUP", "0")
+os.environ.setdefault("JOB_WORKERS", "0")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("CACHE_URL", "memory")
+# Cheap hashes: the tests log in a lot
+os.environ.setdefault("ARGON2_TIME_COST", "1")
+os.environ.setdefault("ARGON2_MEMORY_COST", "1024")
+os.environ.setdefault("ARGON2_PARALLELISM", "1")
+
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import cache, database, models
+from backend.main import app
+
+PASSWORD = "correct horse battery"
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def db():
+    with database.SessionLocal() as session:
+        yield session
+
+@pytest.fixture
+def cold_cache():
+    """Start from an empty shared cache, so every read goes to the database."""
+    cache.backend.clear()
+
+@pytest.fixture
+def user(client):
+    """A new account and its auth headers."""
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    resp = client.post("/auth/signup", json={"email": email, "password": PASSWORD, "display_name": "Test"})
+    assert resp.status_code == 200, resp.text
+    with database.SessionLocal() as session:
+        user_id = session.query(models.User.id).filter(models.User.email == email).scalar()
+    return {
+        "id": user_id,
+        "email": email,
+        "headers": {"Authorization": f"Bearer {resp.json()['access_token']}"},
+    }
+
+@pytest.fixture
+def run_jobs():
+    """Run every due background job in this process (JOB_WORKERS=0 keeps the workers off)."""
+    from backend import jobs
+    jobs._load_handlers()
+
+    def run():
+        ran = 0
+        while jobs.run_one():
+            ran += 1
+        return ran
+    return run
+
+class FakeGemini:
+    """Stands in for google.generativeai: records every prompt and answers from a script."""
+
+    def __init__(self):
+        self.calls = []  # (system_instruction, contents) per generate_content
+        self.replies = []  # answered in order; "Reply <n>" once empty
+
+    def configure(self, api_key=None):
+        pass
+
+    def GenerativeModel(self, model_name, system_instruction=None):
+        fake = self
+
+        class Model:
+            def generate_content(self, contents):
+                fake.calls.append((system_instruction, contents))
+                text = fake.replies.pop(0) if fake.replies else f"Reply {len(fake.calls)}"
+                return type("Response", (), {"text": text})()
+        return Model()
+
+@pytest.fixture
+def gemini(monkeypatch, client, user):
+    """The fake model, with user's API key saved."""
+    import google.generativeai as genai
+    fake = FakeGemini()
+    monkeypatch.setattr(genai, "configure", fake.configure)
+    monkeypatch.setattr(genai, "GenerativeModel", fake.GenerativeModel)
+    assert client.post("/ai/key", json={"api_key": "test-key"}, headers=user["headers"]).status_code == 200
+    return fake
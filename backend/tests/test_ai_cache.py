@@ -0,0 +1,84 @@
+"""AI chat caching: the context is rebuilt only after the user's data changes, and optional reply replay."""
+import pytest
+
+from backend.routers import ai
+
+@pytest.fixture
+def builds(monkeypatch, cold_cache):
+    """How many times the context was built."""
+    count = {"n": 0}
+    real = ai.build_context
+
+    def counting(user, db):
+        count["n"] += 1
+        return real(user, db)
+
+    monkeypatch.setattr(ai, "build_context", counting)
+    return count
+
+def _chat(client, user, message, conversation_id=None):
+    resp = client.post("/ai/chat", json={"message": message, "language": "en", "conversation_id": conversation_id},
+                       headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+def test_context_follows_the_data_version(client, user, gemini, builds):
+    conversation_id = _chat(client, user, "Hi")["conversation_id"]
+    _chat(client, user, "How am I doing?", conversation_id)
+    _chat(client, user, "And in a new conversation?")
+    assert builds["n"] == 1
+
+    client.post("/nutrition/log", json={"name": "Salmon bowl", "calories": 650, "protein": 40, "carbs": 60, "fats": 22},
+                headers=user["headers"])
+    _chat(client, user, "What did I eat?", conversation_id)
+    assert builds["n"] == 2
+    assert "Salmon bowl" in gemini.calls[-1][0]
+
+    client.post("/user/stats", json={"weight_kg": 81.5}, headers=user["headers"])
+    _chat(client, user, "My weight?", conversation_id)
+    assert builds["n"] == 3
+    assert "weight=81.5kg" in gemini.calls[-1][0]
+
+    # Data the context does not show leaves it cached
+    client.post("/training/plans", params={"name": "Not in the context"}, headers=user["headers"])
+    _chat(client, user, "Anything else?", conversation_id)
+    assert builds["n"] == 3
+
+def test_context_cache_can_be_turned_off(client, user, gemini, builds, monkeypatch):
+    monkeypatch.setattr(ai, "AI_CONTEXT_CACHE_SECONDS", 0)
+    _chat(client, user, "Hi")
+    _chat(client, user, "Hi")
+    assert builds["n"] == 2
+
+def test_replies_are_not_replayed_by_default(client, user, gemini, cold_cache):
+    _chat(client, user, "How much protein should I eat?")
+    _chat(client, user, "How much protein should I eat?")
+    assert len(gemini.calls) == 2
+
+def test_reply_replay(client, user, gemini, cold_cache, monkeypatch):
+    monkeypatch.setattr(ai, "AI_RESPONSE_CACHE_SECONDS", 60)
+    first = _chat(client, user, "How much protein should I eat?")
+    # Same question up to case, spacing and punctuation, asked in a new conversation
+    again = _chat(client, user, "how much  protein should I eat")
+    assert len(gemini.calls) == 1
+    assert again["reply"] == first["reply"]
+
+    # A different prompt: the conversation so far is part of it
+    _chat(client, user, "How much protein should I eat?", first["conversation_id"])
+    assert len(gemini.calls) == 2
+
+    # New data means a new answer
+    client.post("/nutrition/log", json={"name": "Steak", "calories": 500, "protein": 50, "carbs": 0, "fats": 30},
+                headers=user["headers"])
+    _chat(client, user, "How much protein should I eat?")
+    assert len(gemini.calls) == 3
+
+def test_replies_that_log_are_not_replayed(client, user, gemini, cold_cache, monkeypatch):
+    monkeypatch.setattr(ai, "AI_RESPONSE_CACHE_SECONDS", 60)
+    logging_reply = ('Logged it!\n```log_action\n{"type": "food_log", "name": "Banana", "calories": 105, '
+                     '"protein": 1, "carbs": 27, "fats": 0}\n```')
+    gemini.replies.extend([logging_reply, logging_reply])
+    first = _chat(client, user, "I ate a banana")
+    second = _chat(client, user, "I ate a banana")
+    assert len(gemini.calls) == 2
+    assert first["log_job_id"] and second["log_job_id"] and first["log_job_id"] != second["log_job_id"]
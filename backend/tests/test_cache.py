@@ -0,0 +1,202 @@
+"""Shared cache: keys dropped after the commit that changes them, and the Redis backend's near-cache."""
+import queue
+import threading
+import time
+import uuid
+
+import pytest
+import redis
+from sqlalchemy import update
+
+from backend import cache, models
+
+def _exercise_names(client, q):
+    return [e["name"] for e in client.get("/training/exercises", params={"q": q}).json()]
+
+def test_catalog_page_follows_orm_writes(client, db, cold_cache):
+    tag = uuid.uuid4().hex[:8]
+    db.add(models.Exercises(name=f"Cache Row {tag}", type="compound"))
+    db.commit()
+    assert _exercise_names(client, tag) == [f"Cache Row {tag}"]
+
+    # A bulk statement skips the session hook, so the cached page is still served
+    db.execute(update(models.Exercises).where(models.Exercises.name == f"Cache Row {tag}")
+               .values(name=f"Cache Row {tag} bulk"))
+    db.commit()
+    assert _exercise_names(client, tag) == [f"Cache Row {tag}"]
+
+    # An ORM write starts a new catalog generation
+    db.add(models.Exercises(name=f"Cache Row {tag} 2", type="isolation"))
+    db.commit()
+    assert sorted(_exercise_names(client, tag)) == [f"Cache Row {tag} 2", f"Cache Row {tag} bulk"]
+
+def test_user_lookup_follows_profile_changes(client, user, db, cold_cache):
+    assert client.get("/user/me", headers=user["headers"]).json()["display_name"] == "Test"
+    account = db.get(models.User, user["id"])
+    account.display_name = "Renamed"
+    db.commit()
+    assert client.get("/user/me", headers=user["headers"]).json()["display_name"] == "Renamed"
+
+def test_plan_detail_follows_plan_rows(client, user, db, cold_cache):
+    exercise = models.Exercises(name=f"Cache Plan Lift {uuid.uuid4().hex[:8]}", type="compound")
+    db.add(exercise)
+    db.commit()
+    plan_id = client.post("/training/plans", params={"name": "Cached"}, headers=user["headers"]).json()["id"]
+    assert client.get(f"/training/plans/{plan_id}", headers=user["headers"]).json()["days"] == {}
+
+    # The row's owner is looked up through its plan
+    db.add(models.PlanExercise(plan_id=uuid.UUID(plan_id), exercise_id=exercise.id, day_name="Push",
+                               sets=3, reps_min=8, reps_max=12, order=1))
+    db.commit()
+    days = client.get(f"/training/plans/{plan_id}", headers=user["headers"]).json()["days"]
+    assert [e["exercise_id"] for e in days["Push"]] == [str(exercise.id)]
+
+def test_rollback_drops_pending_invalidations(client, db, cold_cache):
+    key = cache.generation_key("catalog:exercises")
+    token = cache.generation("catalog:exercises")
+    db.add(models.Exercises(name=f"Never Saved {uuid.uuid4().hex[:8]}", type="compound"))
+    db.flush()
+    db.rollback()
+    assert cache.generation("catalog:exercises") == token
+
+    cache.invalidate_on_commit(db, key)
+    db.commit()
+    assert cache.generation("catalog:exercises") != token
+
+def test_local_cache_evicts_and_expires(monkeypatch):
+    local = cache.LocalCache(max_entries=2)
+    local.set("a", b"1", None)
+    local.set("b", b"2", None)
+    local.get("a")  # a is now the most recently used
+    local.set("c", b"3", None)
+    assert (local.get("a"), local.get("b"), local.get("c")) == (b"1", None, b"3")
+
+    now = time.monotonic()
+    local.set("short", b"4", 5)
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now + 10)
+    assert local.get("short") is None
+    assert local.get("c") == b"3"  # no TTL: still there
+
+# ---------- Redis backend, against an in-process stand-in ----------
+
+class FakeRedisServer:
+    """The little of Redis the cache uses: GET/SET PX/DEL, and PUBLISH to subscribers."""
+
+    def __init__(self):
+        self.data = {}
+        self.subscribers = []
+        self.down = False
+        self.lock = threading.Lock()
+
+    def client(self, url, **options):
+        return FakeRedis(self)
+
+    def check(self):
+        if self.down:
+            raise redis.ConnectionError("connection refused")
+
+    def drop_subscriptions(self):
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for inbox in subscribers:
+            inbox.put(None)
+
+class FakeRedis:
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+
+    def get(self, key):
+        self.server.check()
+        return self.server.data.get(key)
+
+    def set(self, key, value, px=None):
+        self.server.check()
+        self.server.data[key] = value
+        self.last_px = px
+
+    def delete(self, *keys):
+        self.server.check()
+        for key in keys:
+            self.server.data.pop(key, None)
+
+    def publish(self, channel, message):
+        self.server.check()
+        with self.server.lock:
+            subscribers = list(self.server.subscribers)
+        for inbox in subscribers:
+            inbox.put({"type": "message", "channel": channel, "data": message.encode()})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.server)
+
+class FakePubSub:
+    def __init__(self, server: FakeRedisServer):
+        self.server = server
+        self.inbox = queue.Queue()
+
+    def subscribe(self, channel):
+        self.server.check()
+        with self.server.lock:
+            self.server.subscribers.append(self.inbox)
+
+    def listen(self):
+        while True:
+            message = self.inbox.get()
+            if message is None:
+                raise redis.ConnectionError("subscription dropped")
+            yield message
+
+    def close(self):
+        pass
+
+def _eventually(check, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    server = FakeRedisServer()
+    monkeypatch.setattr(redis.Redis, "from_url", server.client)
+    return server
+
+@pytest.fixture
+def workers(redis_server):
+    """Two workers' caches on the same server, both subscribed."""
+    first, second = cache.RedisCache("redis://fake/0"), cache.RedisCache("redis://fake/0")
+    first.get("warmup")
+    second.get("warmup")
+    _eventually(lambda: len(redis_server.subscribers) == 2)
+    return first, second
+
+def test_redis_delete_reaches_every_near_cache(redis_server, workers):
+    first, second = workers
+    first.set("user:a", b"v1", 60)
+    assert first.redis.last_px == 60000
+    assert second.get("user:a") == b"v1"
+
+    # The second worker answers from its near-cache without asking the server
+    redis_server.data["user:a"] = b"changed behind its back"
+    assert second.get("user:a") == b"v1"
+
+    first.delete(["user:a"])
+    _eventually(lambda: second.near.get("user:a") is None)
+    assert "user:a" not in redis_server.data
+    assert second.get("user:a") is None
+
+def test_redis_lost_subscription_clears_the_near_cache(redis_server, workers):
+    first, second = workers
+    first.set("catalog:x", b"v1", None)
+    assert second.get("catalog:x") == b"v1"
+
+    # A delete published while unsubscribed would be missed, so nothing near-cached is trusted
+    redis_server.drop_subscriptions()
+    _eventually(lambda: second.near.get("catalog:x") is None)
+
+def test_redis_errors_are_misses(redis_server, workers):
+    first, _ = workers
+    redis_server.down = True
+    first.set("targets:x", b"v1", 60)
+    assert first.get("targets:x") is None
+    first.delete(["targets:x"])  # logged, not raised
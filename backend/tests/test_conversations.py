@@ -0,0 +1,96 @@
+"""AI coach memory: the recent window, summaries of what left it, and eviction of old conversations."""
+import os
+import uuid
+
+import pytest
+
+from backend import conversations, models
+
+@pytest.fixture
+def small_memory(monkeypatch):
+    monkeypatch.setattr(conversations, "AI_MEMORY_WINDOW", 2)
+    monkeypatch.setattr(conversations, "AI_MEMORY_SUMMARY_BATCH", 2)
+
+def _chat(client, user, message, conversation_id=None):
+    resp = client.post("/ai/chat", json={"message": message, "language": "en", "conversation_id": conversation_id},
+                       headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+    return resp.json()["conversation_id"]
+
+def _user_turns(contents) -> list:
+    return [part["parts"][0] for part in contents if part["role"] == "user"]
+
+def test_window_and_summary(client, user, gemini, run_jobs, small_memory):
+    conversation_id = _chat(client, user, "Message 1")
+    for n in (2, 3, 4):
+        _chat(client, user, f"Message {n}", conversation_id)
+    # Only the last two exchanges are sent back verbatim
+    assert _user_turns(gemini.calls[-1][1]) == ["Message 2", "Message 3", "Message 4"]
+
+    # Exchanges 1 and 2 have left the window: one summary call on just those
+    gemini.replies.append("Wants to bench 100kg.")
+    run_jobs()
+    summary_prompt = gemini.calls[-1][1]
+    assert "User: Message 1" in summary_prompt and "User: Message 2" in summary_prompt
+    assert "Message 3" not in summary_prompt
+
+    detail = client.get(f"/ai/conversations/{conversation_id}", headers=user["headers"]).json()
+    assert (detail["summary"], detail["turns"]) == ("Wants to bench 100kg.", 4)
+    assert [e["message"] for e in detail["exchanges"]] == [f"Message {n}" for n in (1, 2, 3, 4)]
+
+    _chat(client, user, "Message 5", conversation_id)
+    system_instruction, contents = gemini.calls[-1]
+    assert "Wants to bench 100kg." in system_instruction
+    assert _user_turns(contents) == ["Message 3", "Message 4", "Message 5"]
+
+def test_least_recently_used_conversations_are_evicted(client, user, db, gemini, monkeypatch):
+    monkeypatch.setattr(conversations, "AI_MEMORY_MAX_CONVERSATIONS", 2)
+    first = _chat(client, user, "First")
+    second = _chat(client, user, "Second")
+    _chat(client, user, "First again", first)  # now the most recent
+    third = _chat(client, user, "Third")
+
+    listed = client.get("/ai/conversations", headers=user["headers"]).json()
+    assert [c["id"] for c in listed] == [third, first]
+    assert client.get(f"/ai/conversations/{second}", headers=user["headers"]).status_code == 404
+    assert db.query(models.ConversationTurn).filter(models.ConversationTurn.conversation_id == uuid.UUID(second)).count() == 0
+
+def _exchange(db, conversation):
+    # Random text: every exchange stores about the same number of bytes
+    conversations.append(db, conversation, os.urandom(1000).hex(), "ok")
+    db.commit()
+
+def test_byte_budget_evicts_then_trims_summarized_turns(user, db, monkeypatch):
+    old = conversations.start(db, user["id"], "Old")
+    _exchange(db, old)
+    db.refresh(old)
+    old_id = old.id
+    monkeypatch.setattr(conversations, "AI_MEMORY_MAX_BYTES", int(old.bytes * 2.5))
+    current = conversations.start(db, user["id"], "Current")
+    _exchange(db, current)
+    _exchange(db, current)
+    # Old plus two exchanges of the current one exceed the budget: old goes
+    assert conversations.get(db, user["id"], old_id) is None
+
+    current.summarized_turns = 1
+    db.commit()
+    _exchange(db, current)
+    # Still over with the current conversation alone: its summarized exchange is dropped
+    db.refresh(current)
+    seqs = [t.seq for t in db.query(models.ConversationTurn)
+            .filter(models.ConversationTurn.conversation_id == current.id).order_by(models.ConversationTurn.seq)]
+    assert (seqs, current.turns) == ([2, 3], 3)
+    stored = sum(len(t.body) for t in db.query(models.ConversationTurn)
+                 .filter(models.ConversationTurn.conversation_id == current.id))
+    assert current.bytes == stored
+
+def test_delete_and_other_users(client, user, gemini):
+    conversation_id = _chat(client, user, "Hello")
+    other = client.post("/auth/signup", json={"email": f"other-{conversation_id[:8]}@example.com",
+                                               "password": "correct horse battery", "display_name": "Other"}).json()
+    other_headers = {"Authorization": f"Bearer {other['access_token']}"}
+    assert client.get(f"/ai/conversations/{conversation_id}", headers=other_headers).status_code == 404
+    assert client.delete(f"/ai/conversations/{conversation_id}", headers=other_headers).status_code == 404
+
+    assert client.delete(f"/ai/conversations/{conversation_id}", headers=user["headers"]).status_code == 200
+    assert client.get("/ai/conversations", headers=user["headers"]).json() == []
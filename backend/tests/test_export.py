@@ -0,0 +1,100 @@
+"""GET /user/export and the export job: full-account export in both formats."""
+import csv
+import io
+import json
+import uuid
+import zipfile
+
+from backend import export, models
+
+SECRET = "AIza-test-secret-key-123"
+
+def _export(client, user, fmt):
+    resp = client.get("/user/export", params={"format": fmt}, headers=user["headers"])
+    assert resp.status_code == 200
+    return resp.content
+
+def test_api_key_is_never_exported(client, user):
+    assert client.post("/ai/key", json={"api_key": SECRET}, headers=user["headers"]).status_code == 200
+
+    ndjson = _export(client, user, "ndjson")
+    assert SECRET.encode() not in ndjson
+    profile = next(r for r in map(json.loads, ndjson.decode().splitlines()) if r["type"] == "profile")
+    assert "gemini_api_key" not in (profile["settings"] or {})
+
+    archive = zipfile.ZipFile(io.BytesIO(_export(client, user, "csv")))
+    for name in archive.namelist():
+        assert SECRET.encode() not in archive.read(name), name
+
+def _history(client, user, db):
+    """A little of everything the export covers."""
+    headers = user["headers"]
+    exercise = models.Exercises(name=f"Export Row {uuid.uuid4().hex[:8]}", type="compound")
+    db.add(exercise)
+    db.commit()
+    client.post("/user/stats", json={"weight_kg": 81.5, "tdee_current": 2700}, headers=headers)
+    workout = client.post("/training/session/start", params={"plan_id": "pull"}, headers=headers).json()
+    for order in range(1, 4):
+        client.post("/training/set", json={"workout_id": workout["id"], "exercise_id": str(exercise.id),
+                                           "set_order": order, "weight_kg": 60 + order, "reps": 10, "rpe": 7},
+                    headers=headers)
+    client.post("/nutrition/log", json={"name": "Lunch: 麻婆豆腐", "calories": 650, "protein": 35, "carbs": 40, "fats": 30},
+                headers=headers)
+    plan_id = client.post("/training/plans", params={"name": "Pull day"}, headers=headers).json()["id"]
+    client.put(f"/training/plans/{plan_id}", json={"days": {"Pull": {"exercises": [{"exercise_id": str(exercise.id)}]}}},
+               headers=headers)
+    return exercise
+
+def _ndjson_records(client, user) -> dict:
+    records = {}
+    for line in _export(client, user, "ndjson").decode().splitlines():
+        record = json.loads(line)
+        records.setdefault(record.pop("type"), []).append(record)
+    return records
+
+def _csv_records(content: bytes) -> dict:
+    archive = zipfile.ZipFile(io.BytesIO(content))
+    return {
+        name[:-len(".csv")]: list(csv.DictReader(io.StringIO(archive.read(name).decode())))
+        for name in archive.namelist()
+    }
+
+def test_export_round_trip(client, user, db, monkeypatch):
+    exercise = _history(client, user, db)
+    # Small batches and chunks, so rows cross batch and chunk boundaries
+    monkeypatch.setattr(export, "YIELD_PER", 2)
+    monkeypatch.setattr(export, "CHUNK_BYTES", 256)
+
+    records = _ndjson_records(client, user)
+    assert [r["email"] for r in records["profile"]] == [user["email"]]
+    assert len(records["workout_sets"]) == 3
+    assert {r["exercise_name"] for r in records["workout_sets"]} == {exercise.name}
+    assert [r["name"] for r in records["food_log"]] == ["Lunch: 麻婆豆腐"]
+    assert records["daily_log"][0]["calories_actual"] == 650
+    assert [r["weight_kg"] for r in records["user_stats"]] == [81.5]
+    assert [r["exercise_name"] for r in records["plan_exercises"]] == [exercise.name]
+
+    # Every exported row is the stored one
+    workout_ids = {str(w.id) for w in db.query(models.Workouts).filter(models.Workouts.user_id == user["id"])}
+    assert {r["id"] for r in records["workouts"]} == workout_ids
+    assert {r["workout_id"] for r in records["workout_sets"]} == workout_ids
+
+    # The zip has the same datasets and rows
+    tables = _csv_records(_export(client, user, "csv"))
+    assert set(tables) == set(records)
+    for name, rows in records.items():
+        assert [row["id"] for row in tables[name]] == [str(r["id"]) for r in rows], name
+    assert tables["food_log"][0]["name"] == "Lunch: 麻婆豆腐"
+
+def test_export_job_file_matches_the_stream(client, user, db, run_jobs):
+    _history(client, user, db)
+    job = client.post("/user/export/jobs", params={"format": "ndjson"}, headers=user["headers"]).json()
+    # Asking again while it is pending returns the same job
+    again = client.post("/user/export/jobs", params={"format": "ndjson"}, headers=user["headers"]).json()
+    assert again["id"] == job["id"]
+
+    assert client.get(f"/user/jobs/{job['id']}/download", headers=user["headers"]).status_code == 409
+    run_jobs()
+    download = client.get(f"/user/jobs/{job['id']}/download", headers=user["headers"])
+    assert download.status_code == 200
+    assert download.content == _export(client, user, "ndjson")
@@ -0,0 +1,87 @@
+"""Memory-mapped food catalog: search, lookups and the endpoints give what the database query gives."""
+import uuid
+
+import pytest
+
+from backend import food_catalog, models
+
+@pytest.fixture
+def foods(client, db):
+    tag = uuid.uuid4().hex[:6]
+    rows = [
+        models.FoodItem(name=f"Greek Yogurt {tag}", name_zh="希腊酸奶", calories=59, protein_g=10, carbs_g=3.6,
+                        fat_g=0.4, serving_size="100g", serving_size_zh="100克", category="dairy"),
+        models.FoodItem(name=f"yogurt drink {tag}", name_zh=None, calories=70, protein_g=3, carbs_g=12,
+                        fat_g=1.5, serving_size="1 cup", category="dairy"),
+        models.FoodItem(name=f"Brown Rice {tag}", name_zh="糙米饭", calories=112, protein_g=2.6, carbs_g=23.5,
+                        fat_g=0.9, serving_size="100g", category="carbs"),
+        models.FoodItem(name=f"Mystery Bar {tag}", name_zh="能量棒", calories=200, protein_g=20, carbs_g=22,
+                        fat_g=7, serving_size="1 bar", category=None),
+    ]
+    db.add_all(rows)
+    db.commit()
+    return {"tag": tag, "rows": rows}
+
+@pytest.fixture
+def catalog(foods, tmp_path):
+    path = str(tmp_path / "foods.bin")
+    food_catalog.build(path)
+    return food_catalog.FoodCatalog(path)
+
+def _ilike(db, q=None, category=None) -> list:
+    """The database search, unlimited, as the endpoint runs it without a catalog file."""
+    query = db.query(models.FoodItem)
+    if q:
+        query = query.filter(models.FoodItem.name.ilike(f"%{q}%") | models.FoodItem.name_zh.ilike(f"%{q}%"))
+    if category:
+        query = query.filter(models.FoodItem.category == category)
+    return query.all()
+
+@pytest.mark.parametrize("query", [
+    "{tag}", "{upper}", "yogurt {tag}", "YOGURT", "ogur", "酸奶", "米", "Bar {tag}",
+    "{tag}希腊",  # runs on from the name into name_zh: neither column matches
+    "no such food {tag}",
+])
+@pytest.mark.parametrize("category", [None, "dairy", "carbs", "unknown"])
+def test_search_matches_ilike(db, foods, catalog, query, category):
+    q = query.format(tag=foods["tag"], upper=foods["tag"].upper())
+    found = catalog.search(q, category, limit=100000)
+    assert sorted(str(f.id) for f in found) == sorted(str(f.id) for f in _ilike(db, q, category))
+    # Alphabetical, one hit per record even when both names match
+    names = [f.name.lower() for f in found]
+    assert names == sorted(names) and len(set(f.id for f in found)) == len(found)
+
+def test_browse_and_limit(db, foods, catalog):
+    assert len(catalog) == db.query(models.FoodItem).count()
+    assert len(catalog.search(None, "dairy", limit=100000)) == len(_ilike(db, category="dairy"))
+    first_two = catalog.search(foods["tag"], limit=2)
+    assert [f.name for f in first_two] == [f"Brown Rice {foods['tag']}", f"Greek Yogurt {foods['tag']}"]
+
+def test_lookup_returns_every_field(foods, catalog):
+    for row in foods["rows"]:
+        food = catalog.get(row.id)
+        assert food == food_catalog.CatalogFood(row.id, row.name, row.name_zh, row.calories, row.protein_g,
+                                                row.carbs_g, row.fat_g, row.serving_size, row.serving_size_zh,
+                                                row.category)
+    assert catalog.get(uuid.uuid4()) is None
+
+def test_endpoints_serve_from_the_file(client, user, db, foods, catalog, monkeypatch):
+    monkeypatch.setattr(food_catalog, "FOOD_CATALOG_PATH", catalog.path)
+    monkeypatch.setattr(food_catalog, "_current", None)
+    monkeypatch.setattr(food_catalog, "_checked_at", 0.0)
+    tag = foods["tag"]
+    # Added after the build: not in the file until the next one
+    db.add(models.FoodItem(name=f"Late Yogurt {tag}", calories=60, protein_g=5, carbs_g=5, fat_g=1))
+    db.commit()
+
+    listed = client.get("/nutrition/foods", params={"q": "yogurt " + tag, "limit": 100000}).json()
+    assert [f["name"] for f in listed] == [f"Greek Yogurt {tag}"]
+
+    rice = foods["rows"][2]
+    assert client.get(f"/nutrition/foods/{rice.id}").json()["name_zh"] == "糙米饭"
+    assert client.get(f"/nutrition/foods/{uuid.uuid4()}").status_code == 404
+
+    # The catalog file also supplies the macros of logged meals
+    meal = client.post("/nutrition/meals", json={"items": [{"food_id": str(rice.id), "servings": 2}]},
+                       headers=user["headers"]).json()
+    assert meal["totals"] == {"calories": 224, "protein": 5, "carbs": 47, "fats": 1}
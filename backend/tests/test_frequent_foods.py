@@ -0,0 +1,80 @@
+"""Recent & frequent foods: decayed ranking, and deleted logs taken back out."""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import frequent_foods, models
+
+NOW = datetime(2024, 6, 1, 12)
+
+def _entry(name, calories=100):
+    return {"name": name, "calories": calories, "protein": 0, "carbs": 0, "fats": 0}
+
+def _log(client, user, name, calories=100):
+    resp = client.post("/nutrition/log", json={"name": name, "calories": calories, "protein": 5, "carbs": 10, "fats": 2},
+                       headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+    return resp.json()["id"]
+
+def _frequent(client, user):
+    return [(f["name"], f["score"]) for f in client.get("/nutrition/foods/frequent", headers=user["headers"]).json()]
+
+def test_recent_logs_outrank_older_ones(user, db):
+    user_id = user["id"]
+    month_ago = NOW - timedelta(days=30)
+    frequent_foods.record(db, user_id, [_entry("Porridge")] * 3, month_ago)
+    frequent_foods.record(db, user_id, [_entry("Eggs")] * 2, NOW)
+    frequent_foods.record(db, user_id, [_entry("Toast")], NOW - timedelta(days=1))
+    db.commit()
+
+    ranked = frequent_foods.top(db, user_id, now=NOW)
+    assert [f["name"] for f in ranked] == ["Eggs", "Toast", "Porridge"]
+    half_life = frequent_foods.FREQUENT_FOODS_HALF_LIFE_DAYS
+    assert [f["score"] for f in ranked] == pytest.approx(
+        [2, 2 ** (-1 / half_life), 3 * 2 ** (-30 / half_life)], abs=1e-3)
+
+    # The stored rank orders the foods the same way whenever it is read
+    later = frequent_foods.top(db, user_id, now=NOW + timedelta(days=90))
+    assert [f["name"] for f in later] == ["Eggs", "Toast", "Porridge"]
+
+def test_endpoints_count_every_food(client, user, db):
+    food = models.FoodItem(name=f"Frequent Chicken {uuid.uuid4().hex[:8]}", calories=165, protein_g=31,
+                           carbs_g=0, fat_g=3.6, serving_size="100g")
+    db.add(food)
+    db.commit()
+    for _ in range(3):
+        _log(client, user, "Oats")
+    _log(client, user, "eggs ")
+    resp = client.post("/nutrition/meals", json={"meal_name": "Dinner", "items": [
+        {"food_id": str(food.id)}, {"food_id": str(food.id), "servings": 2}, {"name": "Eggs", "calories": 150},
+    ]}, headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+
+    # Names are matched case- and space-insensitively; the latest spelling and portion are shown
+    frequent = client.get("/nutrition/foods/frequent", headers=user["headers"]).json()
+    assert [(f["name"], round(f["score"])) for f in frequent] == [("Oats", 3), (food.name, 2), ("Eggs", 2)]
+    assert (frequent[1]["food_id"], frequent[1]["servings"], frequent[1]["calories"]) == (str(food.id), 2, 330)
+    assert frequent[2]["calories"] == 150
+
+def test_deleted_logs_are_taken_back_out(client, user):
+    first, second = _log(client, user, "Oats"), _log(client, user, "Oats")
+    _log(client, user, "Banana")
+    meal = client.post("/nutrition/meals", json={"meal_name": "Lunch", "items": [{"name": "Rice", "calories": 200}]},
+                       headers=user["headers"]).json()
+
+    assert client.delete(f"/nutrition/log/{first}", headers=user["headers"]).status_code == 200
+    assert dict(_frequent(client, user))["Oats"] == pytest.approx(1, abs=1e-3)
+
+    # A meal's log is stored as "Lunch: Rice" and still finds its food
+    assert client.delete(f"/nutrition/log/{meal['logs'][0]['id']}", headers=user["headers"]).status_code == 200
+    assert client.delete(f"/nutrition/log/{second}", headers=user["headers"]).status_code == 200
+    assert [name for name, _ in _frequent(client, user)] == ["Banana"]
+
+def test_each_user_keeps_the_top_foods(user, db, monkeypatch):
+    monkeypatch.setattr(frequent_foods, "FREQUENT_FOODS_MAX", 2)
+    frequent_foods.record(db, user["id"], [_entry("Rare")], NOW - timedelta(days=60))
+    frequent_foods.record(db, user["id"], [_entry("Daily")] * 2, NOW)
+    frequent_foods.record(db, user["id"], [_entry("New")], NOW)
+    db.commit()
+    assert [f["name"] for f in frequent_foods.top(db, user["id"], now=NOW)] == ["Daily", "New"]
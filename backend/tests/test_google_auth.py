@@ -0,0 +1,78 @@
+"""POST /auth/google against a local stand-in for Google's userinfo endpoint."""
+import httpx
+import pytest
+
+from backend.main import app
+from backend.routers import auth as auth_router
+
+class FakeGoogle:
+    """userinfo stand-in: known tokens map to a profile, anything else is rejected like Google does."""
+
+    def __init__(self):
+        self.profiles = {}
+        self.calls = 0
+        self.down = False
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        assert str(request.url) == auth_router.GOOGLE_USERINFO_URL
+        if self.down:
+            raise httpx.ConnectError("connection refused", request=request)
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        profile = self.profiles.get(token) if scheme == "Bearer" else None
+        if profile is None:
+            return httpx.Response(401, json={"error": "invalid_token"})
+        return httpx.Response(200, json=profile)
+
+@pytest.fixture
+def google(client):
+    fake = FakeGoogle()
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+    app.dependency_overrides[auth_router.get_http_client] = lambda: http_client
+    auth_router._google_token_cache.clear()
+    yield fake
+    app.dependency_overrides.pop(auth_router.get_http_client, None)
+    auth_router._google_token_cache.clear()
+
+def _login(client, token):
+    return client.post("/auth/google", json={"id_token": token})
+
+def test_verified_token_is_cached(client, google):
+    google.profiles["token-1"] = {"email": "gina@example.com", "name": "Gina"}
+
+    first = _login(client, "token-1")
+    assert first.status_code == 200, first.text
+    assert first.json()["access_token"] and first.json()["refresh_token"]
+    assert google.calls == 1
+
+    # Same token again: served from the cache, Google is not asked twice
+    second = _login(client, "token-1")
+    assert second.status_code == 200
+    assert google.calls == 1
+
+def test_cache_entries_expire(client, google, monkeypatch):
+    google.profiles["token-2"] = {"email": "exp@example.com"}
+    monkeypatch.setattr(auth_router, "GOOGLE_TOKEN_CACHE_SECONDS", 0)
+
+    assert _login(client, "token-2").status_code == 200
+    assert _login(client, "token-2").status_code == 200
+    assert google.calls == 2
+
+def test_rejected_token_is_not_cached(client, google):
+    assert _login(client, "bad-token").status_code == 401
+    assert _login(client, "bad-token").status_code == 401
+    assert google.calls == 2
+
+def test_google_unreachable(client, google):
+    google.profiles["token-3"] = {"email": "down@example.com"}
+    google.down = True
+    assert _login(client, "token-3").status_code == 503
+
+    # A failed call caches nothing: once Google is back, the token verifies
+    google.down = False
+    assert _login(client, "token-3").status_code == 200
+    assert google.calls == 2
+
+def test_profile_without_email(client, google):
+    google.profiles["token-4"] = {"name": "No Email"}
+    assert _login(client, "token-4").status_code == 400
@@ -0,0 +1,107 @@
+"""POST /user/import and the import_file job: dedup on re-import, and one transaction per import."""
+from datetime import date, datetime, timedelta
+
+from backend import importer, jobs, models
+
+STRONG = """Date,Workout Name,Duration,Exercise Name,Set Order,Weight,Reps,Distance,Seconds,Notes,Workout Notes,RPE
+2024-01-02 07:30:00,Push,1h 5m,Bench Press (Barbell),W,40,10,0,0,,,
+2024-01-02 07:30:00,Push,1h 5m,Bench Press (Barbell),1,80,5,0,0,,,8
+2024-01-02 07:30:00,Push,1h 5m,Bench Press (Barbell),2,80,5,0,0,,,8.5
+2024-01-04 18:00:00,Pull,45m,Pull Up,1,0,8,0,0,,,
+2024-01-04 18:00:00,Pull,45m,Rowing Machine,1,0,,2000,480,,,
+"""
+
+MFP = """Date,Meal,Calories,Fat (g),Carbohydrates (g),Protein (g)
+2024-01-02,Breakfast,500,15,60,30
+2024-01-02,Dinner,900,30,80,70
+2024-01-03,Lunch,700,20,90,40
+"""
+
+def _import(client, user, text, name="export.csv", path="/user/import"):
+    return client.post(path, files={"file": (name, text.encode(), "text/csv")}, headers=user["headers"])
+
+def _counts(db, user_id):
+    workouts = db.query(models.Workouts).filter(models.Workouts.user_id == user_id).count()
+    sets = (db.query(models.WorkoutSets).join(models.Workouts, models.WorkoutSets.workout_id == models.Workouts.id)
+            .filter(models.Workouts.user_id == user_id).count())
+    foods = db.query(models.FoodLog).filter(models.FoodLog.user_id == user_id).count()
+    return workouts, sets, foods
+
+def test_reimport_is_skipped(client, user, db):
+    first = _import(client, user, STRONG)
+    assert first.status_code == 200, first.text
+    summary = first.json()
+    assert (summary["source"], summary["workouts"], summary["sets"], summary["skipped"]) == ("strong", 2, 4, 1)
+    assert _counts(db, user["id"]) == (2, 4, 0)
+
+    again = _import(client, user, STRONG).json()
+    assert (again["workouts"], again["sets"], again["skipped"]) == (0, 0, 5)
+    assert _counts(db, user["id"]) == (2, 4, 0)
+
+    warmups = (db.query(models.WorkoutSets).join(models.Workouts, models.WorkoutSets.workout_id == models.Workouts.id)
+               .filter(models.Workouts.user_id == user["id"], models.WorkoutSets.is_warmup.is_(True)).count())
+    assert warmups == 1
+
+def test_food_import_recomputes_daily_logs(client, user, db):
+    summary = _import(client, user, MFP).json()
+    assert (summary["source"], summary["food_logs"]) == ("mfp", 3)
+    assert _import(client, user, MFP).json()["food_logs"] == 0
+
+    logs = {log.date: log for log in db.query(models.DailyLog).filter(models.DailyLog.user_id == user["id"])}
+    assert (logs[date(2024, 1, 2)].calories_actual, logs[date(2024, 1, 2)].protein_actual) == (1400, 100)
+    assert logs[date(2024, 1, 3)].calories_actual == 700
+    assert _counts(db, user["id"]) == (0, 0, 3)
+
+def test_unrecognised_file(client, user, db):
+    resp = _import(client, user, "name,value\na,1\n")
+    assert resp.status_code == 400
+    assert _counts(db, user["id"]) == (0, 0, 0)
+
+def test_job_import_is_committed_by_the_runner(client, user, db, run_jobs, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_SECONDS", 0)
+    real_recompute = importer.recompute_daily_logs
+
+    def fail_at_the_end(*args):
+        raise RuntimeError("database went away")
+
+    # The rows are written, then the import fails: nothing of it may stay behind
+    monkeypatch.setattr(importer, "recompute_daily_logs", fail_at_the_end)
+    run_jobs()
+    job = _import(client, user, STRONG, path="/user/import/jobs").json()
+    assert jobs.run_one()
+    status = client.get(f"/user/jobs/{job['id']}", headers=user["headers"]).json()
+    assert status["status"] == "queued" and "database went away" in status["error"]
+    assert _counts(db, user["id"]) == (0, 0, 0)
+
+    # The retry imports the whole file once
+    monkeypatch.setattr(importer, "recompute_daily_logs", real_recompute)
+    run_jobs()
+    status = client.get(f"/user/jobs/{job['id']}", headers=user["headers"]).json()
+    assert status["status"] == "done"
+    assert (status["result"]["workouts"], status["result"]["sets"]) == (2, 4)
+    assert _counts(db, user["id"]) == (2, 4, 0)
+
+class _Postgres:
+    class dialect:
+        name = "postgresql"
+
+def test_heartbeat_extends_the_lease(user, db, monkeypatch):
+    job = jobs.enqueue(db, "import_file", {}, user_id=user["id"])
+    job.status = "running"
+    job.locked_until = datetime.utcnow() + timedelta(seconds=5)
+    db.commit()
+
+    beat = jobs.heartbeat(job)
+    beat()  # too early: the lease is still fresh
+    db.refresh(job)
+    assert job.locked_until < datetime.utcnow() + timedelta(seconds=10)
+
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 60)
+    monkeypatch.setattr(jobs, "engine", _Postgres)  # SQLite skips the renewal: it has one writer at a time
+    monkeypatch.setattr(jobs.time, "monotonic", lambda: float("inf"))
+    beat()
+    db.refresh(job)
+    assert job.locked_until > datetime.utcnow() + timedelta(seconds=30)
+
+    job.status = "done"
+    db.commit()
@@ -0,0 +1,126 @@
+"""Background job queue: retries with backoff, permanent failures, idempotency keys and leases."""
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import jobs, models
+
+# Ahead of anything other tests left queued
+FIRST = 1000
+
+@pytest.fixture
+def kind(client, monkeypatch):
+    """A job kind whose handler follows the script: an exception to raise, or a result to return.
+    (client: the app's startup creates the tables.)"""
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    script = []
+
+    def run(db, job):
+        step = script.pop(0)
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+    monkeypatch.setitem(jobs._HANDLERS, name, run)
+    monkeypatch.setattr(jobs, "JOB_RETRY_SECONDS", 100)
+    return name, script
+
+def _run_now(db, job):
+    """Make the job due and run it; returns when it was run."""
+    job.run_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    ran_at = datetime.utcnow()
+    assert jobs.run_one()
+    db.refresh(job)
+    return ran_at
+
+def test_retries_back_off_then_succeed(db, kind):
+    name, script = kind
+    script.extend([RuntimeError("flaky"), RuntimeError("flaky"), {"ok": True}])
+    job = jobs.enqueue(db, name, {}, priority=FIRST, max_attempts=3)
+    db.commit()
+
+    for attempt in (1, 2):
+        ran_at = _run_now(db, job)
+        assert (job.status, job.attempts, job.error) == ("queued", attempt, "RuntimeError: flaky")
+        delay = (job.run_at - ran_at).total_seconds()
+        assert 100 * 2 ** (attempt - 1) <= delay < 100 * 2 ** (attempt - 1) + 5
+        # Not due yet: another worker polling now finds nothing of this job
+        assert job.locked_until is None
+
+    _run_now(db, job)
+    assert (job.status, job.attempts, job.result, job.error) == ("done", 3, {"ok": True}, None)
+    assert job.finished_at is not None
+
+def test_gives_up_after_max_attempts(db, kind):
+    name, script = kind
+    script.extend([RuntimeError("down"), RuntimeError("still down")])
+    job = jobs.enqueue(db, name, {}, priority=FIRST, max_attempts=2)
+    db.commit()
+    _run_now(db, job)
+    _run_now(db, job)
+    assert (job.status, job.attempts, job.error) == ("failed", 2, "RuntimeError: still down")
+
+def test_job_failed_is_not_retried(db, kind):
+    name, script = kind
+    script.append(jobs.JobFailed("bad payload"))
+    job = jobs.enqueue(db, name, {}, priority=FIRST, max_attempts=5)
+    db.commit()
+    _run_now(db, job)
+    assert (job.status, job.attempts, job.error) == ("failed", 1, "JobFailed: bad payload")
+
+def test_key_returns_the_active_job(db, kind):
+    name, script = kind
+    key = f"{name}:user"
+    job = jobs.enqueue(db, name, {"n": 1}, key=key, priority=FIRST)
+    db.commit()
+    assert jobs.enqueue(db, name, {"n": 2}, key=key).id == job.id
+
+    script.append("done")
+    _run_now(db, job)
+    assert job.status == "done"
+    # Once the job finished, the same key queues a new one
+    again = jobs.enqueue(db, name, {"n": 3}, key=key, priority=FIRST)
+    db.commit()
+    assert again.id != job.id
+    assert db.query(models.BackgroundJob).filter(models.BackgroundJob.key == key).count() == 2
+    again.status = "done"
+    db.commit()
+
+def test_handler_writes_roll_back_with_a_failure(db, kind, user):
+    name, script = kind
+    stats_id = uuid.uuid4()
+
+    def write_then_fail(session, job):
+        session.add(models.UserStats(id=stats_id, user_id=user["id"], weight_kg=70))
+        session.flush()
+        raise RuntimeError("after the write")
+
+    jobs._HANDLERS[name] = write_then_fail
+    job = jobs.enqueue(db, name, {}, priority=FIRST, max_attempts=1)
+    db.commit()
+    _run_now(db, job)
+    assert job.status == "failed"
+    assert db.get(models.UserStats, stats_id) is None
+
+def test_expired_lease_is_claimed_again(db, kind):
+    name, script = kind
+    script.append("resumed")
+    job = jobs.enqueue(db, name, {}, priority=FIRST, max_attempts=2)
+    job.status, job.attempts = "running", 1  # its worker died mid-run
+    job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert jobs.run_one()
+    db.refresh(job)
+    assert (job.status, job.attempts, job.result) == ("done", 2, "resumed")
+
+    # A job that keeps killing its worker is given up on instead of run again
+    stuck = jobs.enqueue(db, name, {}, priority=FIRST, max_attempts=2)
+    stuck.status, stuck.attempts = "running", 2
+    stuck.locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert jobs.run_one()
+    db.refresh(stuck)
+    assert (stuck.status, stuck.attempts) == ("failed", 3)
+    assert "Abandoned" in stuck.error
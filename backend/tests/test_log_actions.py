@@ -0,0 +1,103 @@
+"""log_action blocks in AI replies: parsing, rejection, and the ai.log_action job that writes them."""
+import json
+from datetime import date, datetime
+
+from backend import jobs, log_actions, models
+
+def _reply(*lines, text="Nice work!"):
+    return text + "\n```log_action\n" + "\n".join(lines) + "\n```"
+
+def test_parse_every_line():
+    reply, actions, rejected = log_actions.parse(_reply(
+        '{"type": "food_log", "name": "eggs", "calories": 150, "protein": 12, "carbs": 1, "fats": 10}',
+        '{"type": "food_log", "name": "rice", "calories": 200, "protein": 4, "carbs": 45, "fats": 0},',
+        '{"type": "body_stat", "weight_kg": 80}',
+    ))
+    assert reply == "Nice work!"
+    assert [a.type for a in actions] == ["food_log", "food_log", "body_stat"]
+    assert [a.name for a in actions[:2]] == ["eggs", "rice"]
+    assert rejected == 0
+
+def test_parse_array_and_several_blocks():
+    first = json.dumps([{"type": "food_log", "name": "oats", "calories": 300}, {"type": "body_stat", "waist_cm": 85}])
+    text = _reply(first) + "\n" + _reply('{"type": "food_log", "name": "apple", "calories": 80}', text="")
+    _, actions, rejected = log_actions.parse(text)
+    assert [getattr(a, "name", None) for a in actions] == ["oats", None, "apple"]
+    assert rejected == 0
+
+def test_rejected_lines_are_counted_not_applied():
+    _, actions, rejected = log_actions.parse(_reply(
+        '{"type": "food_log", "name": "toast", "calories": 120}',
+        "not json at all",
+        '{"type": "food_log", "name": "pizza", "calories": -5}',  # out of bounds
+        '{"type": "body_stat"}',  # no measurement
+        '{"type": "workout", "minutes": 30}',  # unknown type
+    ))
+    assert [a.name for a in actions] == ["toast"]
+    assert rejected == 4
+
+def test_unterminated_block_is_still_stripped():
+    reply, actions, _ = log_actions.parse('Logged it.\n```log_action\n{"type": "body_stat", "weight_kg": 81}')
+    assert reply == "Logged it."
+    assert len(actions) == 1
+
+def test_parse_caps_actions():
+    line = '{"type": "food_log", "name": "grape", "calories": 3}'
+    _, actions, rejected = log_actions.parse(_reply(*[line] * (log_actions.MAX_ACTIONS + 3)))
+    assert len(actions) == log_actions.MAX_ACTIONS
+    assert rejected == 3
+
+def _enqueue(db, user_id, lines, day):
+    _, actions, _ = log_actions.parse(_reply(*lines))
+    job = jobs.enqueue(db, "ai.log_action",
+                       {"actions": [a.model_dump() for a in actions], "date": day, "time": datetime.utcnow()},
+                       user_id=user_id)
+    db.commit()
+    return job.id
+
+def test_job_writes_everything(client, user, db, run_jobs):
+    day = date(2024, 3, 4)
+    job_id = _enqueue(db, user["id"], [
+        '{"type": "food_log", "name": "eggs", "calories": 150, "protein": 12, "carbs": 1, "fats": 10}',
+        '{"type": "food_log", "name": "rice", "calories": 200.4, "protein": 4, "carbs": 45, "fats": 0}',
+        '{"type": "body_stat", "weight_kg": 80, "waist_cm": 84}',
+    ], day)
+
+    # Nothing is written until the job runs
+    assert db.query(models.FoodLog).filter(models.FoodLog.user_id == user["id"]).count() == 0
+    status = client.get(f"/user/jobs/{job_id}", headers=user["headers"]).json()
+    assert status["status"] == "queued"
+
+    run_jobs()
+    status = client.get(f"/user/jobs/{job_id}", headers=user["headers"]).json()
+    assert status["status"] == "done"
+    assert [entry["type"] for entry in status["result"]["logged"]] == ["food_log", "food_log", "body_stat"]
+
+    foods = db.query(models.FoodLog).filter(models.FoodLog.user_id == user["id"]).all()
+    assert sorted(f.name for f in foods) == ["eggs", "rice"]
+    assert all(f.date == day for f in foods)
+    log = db.query(models.DailyLog).filter(models.DailyLog.user_id == user["id"], models.DailyLog.date == day).one()
+    assert (log.calories_actual, log.protein_actual, log.carbs_actual, log.fats_actual) == (350, 16, 46, 10)
+    stats = db.query(models.UserStats).filter(models.UserStats.user_id == user["id"], models.UserStats.date == day).one()
+    assert (stats.weight_kg, stats.waist_cm) == (80, 84)
+
+def test_second_job_adds_to_the_day(user, db, run_jobs):
+    day = date(2024, 3, 5)
+    _enqueue(db, user["id"], ['{"type": "food_log", "name": "oats", "calories": 300, "protein": 10}'], day)
+    run_jobs()
+    _enqueue(db, user["id"], ['{"type": "food_log", "name": "milk", "calories": 100, "protein": 8}'], day)
+    run_jobs()
+    log = db.query(models.DailyLog).filter(models.DailyLog.user_id == user["id"], models.DailyLog.date == day).one()
+    assert (log.calories_actual, log.protein_actual) == (400, 18)
+
+def test_invalid_payload_fails_without_writing(client, user, db, run_jobs):
+    job = jobs.enqueue(db, "ai.log_action",
+                       {"actions": [{"type": "food_log", "name": "ok", "calories": 10},
+                                    {"type": "food_log", "calories": -1}],
+                        "date": date(2024, 3, 6), "time": datetime.utcnow()},
+                       user_id=user["id"])
+    db.commit()
+    run_jobs()
+    status = client.get(f"/user/jobs/{job.id}", headers=user["headers"]).json()
+    assert status["status"] == "failed"
+    assert db.query(models.FoodLog).filter(models.FoodLog.user_id == user["id"]).count() == 0
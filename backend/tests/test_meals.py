@@ -0,0 +1,80 @@
+"""POST /nutrition/meals: item validation, and the day's totals after several meals."""
+import uuid
+
+import pytest
+
+from backend import models
+from backend.routers import nutrition
+
+FIELDS = ("calories", "protein", "carbs", "fats")
+
+@pytest.fixture
+def chicken(client, db):
+    food = models.FoodItem(name=f"Chicken Breast {uuid.uuid4().hex[:8]}", calories=165, protein_g=31,
+                           carbs_g=0, fat_g=3.6, serving_size="100g", category="protein")
+    db.add(food)
+    db.commit()
+    return food
+
+def _day(client, user):
+    resp = client.get("/nutrition/day", headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+def test_meal_totals_reach_the_day(client, user, chicken):
+    resp = client.post("/nutrition/meals", json={"meal_name": "Lunch", "items": [
+        {"food_id": str(chicken.id), "servings": 1.5},
+        {"name": "Rice", "calories": 200, "carbs": 45, "protein": 4},
+    ]}, headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+    meal = resp.json()
+    # Catalog macros scaled by servings and truncated, as /log_from_food does
+    assert [(log["name"], [log[f] for f in FIELDS]) for log in meal["logs"]] == [
+        (f"Lunch: {chicken.name}", [247, 46, 0, 5]),
+        ("Lunch: Rice", [200, 4, 45, 0]),
+    ]
+    assert meal["totals"] == {"calories": 447, "protein": 50, "carbs": 45, "fats": 5}
+
+    # A second meal and a single log add to the same day
+    client.post("/nutrition/meals", json={"items": [{"name": "Apple", "calories": 95, "carbs": 25}]},
+                headers=user["headers"])
+    client.post("/nutrition/log", json={"name": "Shake", "calories": 120, "protein": 24, "carbs": 3, "fats": 1},
+                headers=user["headers"])
+    day = _day(client, user)
+    assert day["actuals"] == {"calories": 662, "protein": 74, "carbs": 73, "fats": 6}
+    assert len(day["logs"]) == 4
+    assert {f: sum(log[f] for log in day["logs"]) for f in FIELDS} == day["actuals"]
+
+@pytest.mark.parametrize("item", [
+    {},
+    {"name": "No calories"},
+    {"calories": 100},
+    {"name": "", "calories": 100},
+    {"name": "Negative", "calories": 100, "protein": -1},
+    {"name": "Huge", "calories": 10001},
+    {"name": "Macro typo", "calories": 100, "fats": 5000},
+    {"food_id": str(uuid.uuid4()), "servings": 0},
+    {"food_id": str(uuid.uuid4()), "servings": 101},
+])
+def test_invalid_items_are_rejected(client, user, item):
+    resp = client.post("/nutrition/meals", json={"items": [{"name": "Fine", "calories": 100}, item]},
+                       headers=user["headers"])
+    assert resp.status_code == 422, resp.text
+    assert _day(client, user)["logs"] == []
+
+@pytest.mark.parametrize("count", [0, nutrition.MAX_MEAL_ITEMS + 1])
+def test_item_count_is_bounded(client, user, count):
+    items = [{"name": f"Bite {i}", "calories": 10} for i in range(count)]
+    resp = client.post("/nutrition/meals", json={"items": items}, headers=user["headers"])
+    assert resp.status_code == 400
+    assert _day(client, user)["logs"] == []
+
+def test_unknown_food_logs_nothing(client, user, chicken):
+    missing = str(uuid.uuid4())
+    resp = client.post("/nutrition/meals", json={"items": [
+        {"food_id": str(chicken.id)}, {"food_id": missing},
+    ]}, headers=user["headers"])
+    assert resp.status_code == 404
+    assert missing in resp.json()["detail"]
+    day = _day(client, user)
+    assert day["logs"] == [] and day["actuals"]["calories"] == 0
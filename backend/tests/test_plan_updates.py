@@ -0,0 +1,83 @@
+"""PUT /training/plans/{id} and /plans/{id}/days/{day}: diffed saves, reordering, and all-or-nothing."""
+import uuid
+
+import pytest
+
+from backend import models
+
+@pytest.fixture
+def plan(client, user, db):
+    exercises = [models.Exercises(name=f"Plan Lift {uuid.uuid4().hex[:8]}", type="compound") for _ in range(4)]
+    db.add_all(exercises)
+    db.commit()
+    ids = [str(e.id) for e in exercises]
+    plan_id = client.post("/training/plans", params={"name": "Split"}, headers=user["headers"]).json()["id"]
+    resp = client.put(f"/training/plans/{plan_id}", json={"days": {
+        "Push": {"exercises": [{"exercise_id": ids[0]}, {"exercise_id": ids[1], "sets": 4}]},
+        "Pull": {"exercises": [{"exercise_id": ids[2]}]},
+    }}, headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+    return {"id": plan_id, "exercise_ids": ids, "detail": resp.json()}
+
+def _row_ids(detail, day):
+    return [e["id"] for e in detail["days"][day]]
+
+def test_reorder_keeps_rows(client, user, plan):
+    push = plan["detail"]["days"]["Push"]
+    resp = client.put(f"/training/plans/{plan['id']}/days/Push", json={"exercises": [
+        {"id": push[1]["id"], "exercise_id": push[1]["exercise_id"], "sets": 5},
+        {"id": push[0]["id"], "exercise_id": push[0]["exercise_id"]},
+    ]}, headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+    detail = resp.json()
+    assert _row_ids(detail, "Push") == [push[1]["id"], push[0]["id"]]
+    assert [(e["order"], e["sets"]) for e in detail["days"]["Push"]] == [(1, 5), (2, 3)]
+    # Other days are untouched by a one-day save
+    assert _row_ids(detail, "Pull") == _row_ids(plan["detail"], "Pull")
+
+def test_whole_plan_diff(client, user, plan):
+    ids = plan["exercise_ids"]
+    push, pull = plan["detail"]["days"]["Push"], plan["detail"]["days"]["Pull"]
+    resp = client.put(f"/training/plans/{plan['id']}", json={"name": "Renamed", "days": {
+        # Push[1] moves to Legs, Push[0] is dropped, Pull keeps its row, Legs gets a new one
+        "Pull": {"exercises": [{"id": pull[0]["id"], "exercise_id": pull[0]["exercise_id"]}]},
+        "Legs": {"exercises": [{"exercise_id": ids[3]},
+                               {"id": push[1]["id"], "exercise_id": push[1]["exercise_id"], "sets": 4}]},
+    }}, headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+    detail = resp.json()
+    assert detail["name"] == "Renamed"
+    assert set(detail["days"]) == {"Pull", "Legs"}
+    assert _row_ids(detail, "Pull") == [pull[0]["id"]]
+    legs = detail["days"]["Legs"]
+    assert [e["exercise_id"] for e in legs] == [ids[3], push[1]["exercise_id"]]
+    assert legs[1]["id"] == push[1]["id"] and legs[1]["order"] == 2
+
+def test_omitted_days_are_kept(client, user, plan):
+    resp = client.put(f"/training/plans/{plan['id']}", json={"description": "Four days"}, headers=user["headers"])
+    assert resp.status_code == 200
+    assert resp.json()["days"] == plan["detail"]["days"]
+
+@pytest.mark.parametrize("problem", ["unknown exercise", "unknown row", "duplicate row"])
+def test_invalid_payload_changes_nothing(client, user, plan, problem):
+    push = plan["detail"]["days"]["Push"]
+    bad_item = {
+        "unknown exercise": {"exercise_id": str(uuid.uuid4())},
+        "unknown row": {"id": str(uuid.uuid4()), "exercise_id": plan["exercise_ids"][0]},
+        "duplicate row": {"id": push[0]["id"], "exercise_id": push[0]["exercise_id"]},
+    }[problem]
+    resp = client.put(f"/training/plans/{plan['id']}", json={"name": "Should not stick", "days": {
+        "Push": {"exercises": [{"id": push[0]["id"], "exercise_id": push[0]["exercise_id"], "sets": 9}, bad_item]},
+    }}, headers=user["headers"])
+    assert resp.status_code == 400, resp.text
+
+    after = client.get(f"/training/plans/{plan['id']}", headers=user["headers"]).json()
+    assert after["name"] == "Split"
+    assert after["days"] == plan["detail"]["days"]
+
+def test_other_users_plan(client, user, plan):
+    other = client.post("/auth/signup", json={"email": f"{uuid.uuid4().hex[:12]}@example.com",
+                                               "password": "correct horse battery", "display_name": "Other"}).json()
+    resp = client.put(f"/training/plans/{plan['id']}", json={"name": "Mine now"},
+                      headers={"Authorization": f"Bearer {other['access_token']}"})
+    assert resp.status_code == 404
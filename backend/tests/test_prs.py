@@ -0,0 +1,82 @@
+"""Personal records: set logging, fallback when a record set is deleted, and racing writers."""
+import uuid
+from datetime import datetime
+
+import pytest
+
+from backend import database, models, prs
+
+@pytest.fixture
+def lift(client, user, db):
+    exercise = models.Exercises(name=f"PR Squat {uuid.uuid4().hex[:8]}", type="compound")
+    db.add(exercise)
+    db.commit()
+    workout = client.post("/training/session/start", params={"plan_id": "lower_a"}, headers=user["headers"]).json()
+    return {"exercise_id": str(exercise.id), "workout_id": workout["id"]}
+
+def _log(client, user, lift, weight, reps, order=1):
+    resp = client.post("/training/set", json={**lift, "set_order": order, "weight_kg": weight, "reps": reps, "rpe": 8},
+                       headers=user["headers"])
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+def _records(client, user, lift) -> dict:
+    [entry] = client.get("/training/prs", params={"exercise_id": lift["exercise_id"]}, headers=user["headers"]).json()
+    return entry
+
+def test_new_records_are_flagged(client, user, lift):
+    first = _log(client, user, lift, 100, 5)
+    assert {(pr["kind"], pr["previous"]) for pr in first["prs"]} == {("rep_max", None), ("e1rm", None)}
+
+    # Same weight again: the earlier set keeps both records
+    assert _log(client, user, lift, 100, 5, order=2)["prs"] == []
+
+    heavier = _log(client, user, lift, 105, 5, order=3)
+    assert {(pr["kind"], pr["previous"]) for pr in heavier["prs"]} == {("rep_max", 100), ("e1rm", round(100 * (1 + 5 / 30), 2))}
+
+    # A new rep count is a rep max, but its e1rm does not beat 105 x 5
+    triple = _log(client, user, lift, 110, 3, order=4)
+    assert [pr["kind"] for pr in triple["prs"]] == ["rep_max"]
+
+    records = _records(client, user, lift)
+    assert {(r["reps"], r["weight_kg"]) for r in records["rep_maxes"]} == {(5, 105), (3, 110)}
+    assert (records["e1rm_weight_kg"], records["e1rm_reps"]) == (105, 5)
+
+def test_deleting_a_record_set_falls_back(client, user, lift):
+    _log(client, user, lift, 100, 5)
+    best = _log(client, user, lift, 110, 5, order=2)
+    _log(client, user, lift, 90, 8, order=3)
+
+    assert client.delete(f"/training/set/{best['set']['id']}", headers=user["headers"]).status_code == 200
+    records = _records(client, user, lift)
+    assert {(r["reps"], r["weight_kg"]) for r in records["rep_maxes"]} == {(5, 100), (8, 90)}
+    # 100 x 5 (e1rm 116.7) still beats 90 x 8 (114)
+    assert (records["e1rm_weight_kg"], records["e1rm_reps"]) == (100, 5)
+
+def test_deleting_the_only_set_drops_its_records(client, user, lift):
+    only = _log(client, user, lift, 80, 5)
+    assert client.delete(f"/training/set/{only['set']['id']}", headers=user["headers"]).status_code == 200
+    assert client.get("/training/prs", params={"exercise_id": lift["exercise_id"]}, headers=user["headers"]).json() == []
+
+def _set(db, lift, weight, reps, order):
+    workout_set = models.WorkoutSets(id=uuid.uuid4(), workout_id=uuid.UUID(lift["workout_id"]),
+                                     exercise_id=uuid.UUID(lift["exercise_id"]), set_order=order,
+                                     weight_kg=weight, reps=reps, rpe=8, is_warmup=False)
+    db.add(workout_set)
+    return workout_set
+
+def test_racing_writers_do_not_conflict(client, user, lift, monkeypatch):
+    """Both requests read "no record yet"; the second must neither fail nor replace a better record."""
+    _log(client, user, lift, 120, 5)  # already committed by the "other" request
+    monkeypatch.setattr(prs, "_held", lambda *args: {})  # what this request read before that commit
+
+    with database.SessionLocal() as db:
+        weaker = _set(db, lift, 100, 5, order=2)
+        assert prs.record_set(db, user["id"], weaker, datetime.utcnow()) == []
+        stronger = _set(db, lift, 130, 5, order=3)
+        assert len(prs.record_set(db, user["id"], stronger, datetime.utcnow())) == 2
+        db.commit()
+
+    records = _records(client, user, lift)
+    assert [(r["reps"], r["weight_kg"]) for r in records["rep_maxes"]] == [(5, 130)]
+    assert records["e1rm_weight_kg"] == 130
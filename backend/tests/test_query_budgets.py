@@ -0,0 +1,82 @@
+"""Query counts of the hot read paths, pinned with querydebug.query_budget.
+
+Each budget is what the endpoint issues today with a cold cache. The data has several
+workouts, sets and exercises, so a per-row query (an N+1) pushes the count past its budget.
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from backend import models
+from backend.database import engine
+from backend.querydebug import query_budget
+from backend.routers.ai import build_context
+
+WORKOUTS = 5
+EXERCISES = 4
+SETS_PER_EXERCISE = 3
+
+@pytest.fixture
+def history(user, db):
+    """A plan, a few weeks of workouts, weigh-ins and food logs for the test user."""
+    user_id = user["id"]
+    exercises = [models.Exercises(name=f"Lift {user_id.hex[:8]} {i}", type="compound") for i in range(EXERCISES)]
+    db.add_all(exercises)
+    plan = models.TrainingPlan(user_id=user_id, name="Upper/Lower", is_active=True)
+    db.add(plan)
+    db.flush()
+    for day_index, day_name in enumerate(("Upper", "Lower")):
+        for order, exercise in enumerate(exercises, start=1):
+            db.add(models.PlanExercise(plan_id=plan.id, exercise_id=exercise.id, day_name=day_name,
+                                       sets=3, reps_min=8, reps_max=12, order=order))
+    today = date.today()
+    for i in range(WORKOUTS):
+        start = datetime.combine(today - timedelta(days=2 * i + 1), datetime.min.time()) + timedelta(hours=18)
+        workout = models.Workouts(user_id=user_id, start_time=start, end_time=start + timedelta(hours=1))
+        db.add(workout)
+        db.flush()
+        for exercise in exercises:
+            for set_order in range(1, SETS_PER_EXERCISE + 1):
+                db.add(models.WorkoutSets(workout_id=workout.id, exercise_id=exercise.id, set_order=set_order,
+                                          weight_kg=60 + set_order * 5, reps=8, rpe=8, is_warmup=False))
+    for i in range(7):
+        day = today - timedelta(days=i)
+        db.add(models.UserStats(user_id=user_id, date=day, weight_kg=80 - i * 0.1, tdee_current=2500))
+        db.add(models.DailyLog(user_id=user_id, date=day, calories_actual=2300, protein_actual=160,
+                               carbs_actual=250, fats_actual=70))
+        for meal in ("Breakfast", "Dinner"):
+            db.add(models.FoodLog(user_id=user_id, date=day, time=datetime.combine(day, datetime.min.time()),
+                                  name=f"{meal}: Oats", calories=400, protein=20, carbs=60, fats=8))
+    db.commit()
+    return {"plan_id": str(plan.id), "exercise_id": str(exercises[0].id)}
+
+def test_build_context(user, history, db, cold_cache):
+    account = db.get(models.User, user["id"])
+    with query_budget(engine, 5):
+        context = build_context(account, db)
+    assert context.count("Session ") == WORKOUTS
+
+def test_plan_details(client, user, history, cold_cache):
+    with query_budget(engine, 3):
+        resp = client.get(f"/training/plans/{history['plan_id']}", headers=user["headers"])
+    assert resp.status_code == 200
+    assert [len(day) for day in resp.json()["days"].values()] == [EXERCISES, EXERCISES]
+
+def test_workout_history(client, user, history, cold_cache):
+    with query_budget(engine, 2):
+        resp = client.get("/training/history", headers=user["headers"])
+    assert resp.status_code == 200
+    assert len(resp.json()) == WORKOUTS
+
+def test_exercise_history(client, user, history, cold_cache):
+    with query_budget(engine, 2):
+        resp = client.get(f"/training/exercise/{history['exercise_id']}/history", headers=user["headers"])
+    assert resp.status_code == 200
+    assert len(resp.json()) == WORKOUTS
+    assert all(len(session["sets"]) == SETS_PER_EXERCISE for session in resp.json())
+
+def test_body_stats_history(client, user, history, cold_cache):
+    with query_budget(engine, 2):
+        resp = client.get("/user/history", headers=user["headers"])
+    assert resp.status_code == 200
+    assert len(resp.json()) == 7
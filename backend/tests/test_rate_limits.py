@@ -0,0 +1,93 @@
+"""Token-bucket rate limits (429 + Retry-After) and admission control (503)."""
+import asyncio
+
+import pytest
+
+from backend import ratelimit
+from backend.main import app
+
+PASSWORD = "correct horse battery"
+
+@pytest.fixture
+def limits(monkeypatch):
+    """Rate limits on, with fresh in-process buckets."""
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(ratelimit, "store", ratelimit.LocalBuckets(1000))
+
+def _login(client, email, password, ip="10.0.0.1"):
+    # The test client's address is fixed, so vary it the way a proxy would
+    return client.post("/auth/login", data={"username": email, "password": password},
+                       headers={"X-Forwarded-For": ip})
+
+@pytest.fixture
+def proxied(monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_PROXY_HOPS", 1)
+
+def test_429_with_retry_after(client, user, limits, proxied):
+    capacity = int(ratelimit.BUDGETS["auth"][0])
+    codes = [_login(client, user["email"], PASSWORD).status_code for _ in range(capacity + 1)]
+    assert codes[:capacity] == [200] * capacity
+    assert codes[-1] == 429
+    resp = _login(client, user["email"], PASSWORD)
+    assert int(resp.headers["Retry-After"]) >= 1
+
+def test_successful_logins_do_not_lock_the_account(client, user, limits, proxied):
+    # Plenty of good logins from many addresses: the account's own bucket is never touched
+    for i in range(3 * int(ratelimit.BUDGETS["auth"][0])):
+        assert _login(client, user["email"], PASSWORD, ip=f"10.1.{i}.1").status_code == 200
+
+def test_failed_logins_lock_the_account(client, user, limits, proxied):
+    capacity = int(ratelimit.BUDGETS["auth"][0])
+    for i in range(capacity):
+        assert _login(client, user["email"], "wrong", ip=f"10.2.{i}.1").status_code == 401
+    # From yet another address, even the right password waits out the failures
+    blocked = _login(client, user["email"], PASSWORD, ip="10.3.0.1")
+    assert blocked.status_code == 429 and "Retry-After" in blocked.headers
+    assert _login(client, "someone-else@example.com", "wrong", ip="10.3.0.2").status_code == 401
+
+def test_refresh_has_its_own_budget(client, limits, proxied):
+    capacity = int(ratelimit.BUDGETS["auth"][0])
+    signups = [client.post("/auth/signup", json={"email": f"nat{i}@example.com", "password": PASSWORD},
+                           headers={"X-Forwarded-For": "10.9.9.9"}).json() for i in range(capacity)]
+    # The auth budget of this address is spent; its users' refreshes still go through
+    for tokens in signups:
+        resp = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]},
+                           headers={"X-Forwarded-For": "10.9.9.9"})
+        assert resp.status_code == 200
+
+def test_write_budget_is_per_user(client, user, limits, monkeypatch):
+    monkeypatch.setitem(ratelimit.BUDGETS, "write", (2.0, 2.0 / 60))
+    # Budgets are read when a route's dependency is built, so go through limit() directly
+    check = ratelimit.limit("write")
+
+    class Request:
+        method = "POST"
+        headers = {"authorization": user["headers"]["Authorization"]}
+        client = type("Client", (), {"host": "10.4.0.1"})()
+
+    asyncio.run(check(Request()))
+    asyncio.run(check(Request()))
+    with pytest.raises(Exception) as limited:
+        asyncio.run(check(Request()))
+    assert limited.value.status_code == 429
+    Request.method = "GET"
+    asyncio.run(check(Request()))  # reads are never limited
+
+def _admission():
+    layer = app.middleware_stack
+    while not isinstance(layer, ratelimit.AdmissionMiddleware):
+        layer = layer.app
+    return layer
+
+def test_503_when_saturated(client, user, monkeypatch):
+    admission = _admission()
+    monkeypatch.setattr(ratelimit, "ADMISSION_QUEUE_MS", 0)
+    monkeypatch.setitem(admission.slots, "all", asyncio.Semaphore(0))  # every slot taken
+
+    resp = client.get("/user/me", headers={**user["headers"], "Origin": "http://localhost:8081"})
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    # Shed inside CORS, so a browser can read the 503 and retry
+    assert resp.headers["access-control-allow-origin"]
+    # Health and metrics are never shed
+    assert client.get("/").status_code == 200
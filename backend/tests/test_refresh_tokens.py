@@ -0,0 +1,61 @@
+"""Rotating refresh tokens: every refresh swaps the token, and a reused token revokes its whole family."""
+import pytest
+from fastapi import HTTPException
+
+from backend import auth, database, models
+
+def _refresh(client, token):
+    return client.post("/auth/refresh", json={"refresh_token": token})
+
+def _signup_tokens(client, email):
+    resp = client.post("/auth/signup", json={"email": email, "password": "correct horse battery"})
+    assert resp.status_code == 200
+    return resp.json()
+
+def test_refresh_rotates(client):
+    first = _signup_tokens(client, "rotate@example.com")
+    second = _refresh(client, first["refresh_token"])
+    assert second.status_code == 200
+    assert second.json()["refresh_token"] != first["refresh_token"]
+    assert client.get("/user/me", headers={"Authorization": f"Bearer {second.json()['access_token']}"}).status_code == 200
+    assert _refresh(client, second.json()["refresh_token"]).status_code == 200
+
+def test_reuse_revokes_the_family(client):
+    first = _signup_tokens(client, "reuse@example.com")["refresh_token"]
+    second = _refresh(client, first).json()["refresh_token"]
+
+    # The rotated-away token comes back: refused, and the live token of that login dies with it
+    assert _refresh(client, first).status_code == 401
+    assert _refresh(client, second).status_code == 401
+
+def test_other_logins_survive_reuse(client):
+    tokens = _signup_tokens(client, "two-devices@example.com")["refresh_token"]
+    other = client.post("/auth/login", data={"username": "two-devices@example.com",
+                                             "password": "correct horse battery"}).json()["refresh_token"]
+    _refresh(client, tokens)
+    assert _refresh(client, tokens).status_code == 401
+    assert _refresh(client, other).status_code == 200
+
+def test_logout_revokes(client):
+    token = _signup_tokens(client, "logout@example.com")["refresh_token"]
+    assert client.post("/auth/logout", json={"refresh_token": token}).status_code == 200
+    assert _refresh(client, token).status_code == 401
+
+def test_unknown_token(client):
+    assert _refresh(client, "not-a-token").status_code == 401
+
+def test_concurrent_refresh_counts_as_reuse(client):
+    token = _signup_tokens(client, "race@example.com")["refresh_token"]
+    with database.SessionLocal() as slow, database.SessionLocal() as fast:
+        # The slow request has read the token as live...
+        seen = slow.query(models.RefreshToken).filter(
+            models.RefreshToken.token_hash == auth._refresh_digest(token)
+        ).one()
+        assert not seen.revoked
+        # ...when the fast one rotates it
+        _, rotated = auth.rotate_refresh_token(fast, token)
+        with pytest.raises(HTTPException) as refused:
+            auth.rotate_refresh_token(slow, token)
+        assert refused.value.status_code == 401
+    # The loser's view of the race is treated as reuse: the winner's token is revoked too
+    assert _refresh(client, rotated).status_code == 401
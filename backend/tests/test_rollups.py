@@ -0,0 +1,132 @@
+"""Rollups kept current in the writing transaction match a recompute from day-level rows."""
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from backend import database, models, rollups
+from backend.database import engine
+
+def _rows(db, user_id) -> dict:
+    rows = db.query(models.UserRollup).filter(models.UserRollup.user_id == user_id).all()
+    return {
+        (row.period, row.period_start): {field: getattr(row, field) for field in rollups.FIELDS}
+        for row in rows if any(getattr(row, field) for field in rollups.FIELDS)
+    }
+
+def _recomputed(user_id) -> dict:
+    with database.SessionLocal() as session:
+        rollups.refresh(session, user_id)
+        rows = _rows(session, user_id)
+        session.rollback()
+    return rows
+
+def _assert_current(db, user_id):
+    db.expire_all()
+    stored, expected = _rows(db, user_id), _recomputed(user_id)
+    assert stored.keys() == expected.keys()
+    for key, values in expected.items():
+        assert stored[key] == pytest.approx(values), key
+
+def _queued_refreshes(db, user_id) -> int:
+    J = models.BackgroundJob
+    return db.query(J).filter(J.kind == "rollups.refresh", J.user_id == user_id, J.status == "queued").count()
+
+@pytest.fixture
+def exercise(db):
+    row = models.Exercises(name=f"Rollup Press {datetime.utcnow().timestamp()}", type="compound")
+    db.add(row)
+    db.commit()
+    return row.id
+
+def test_logging_keeps_rollups_exact(client, user, db, exercise, run_jobs):
+    headers = user["headers"]
+    assert client.post("/user/stats", json={"weight_kg": 80, "tdee_current": 2600}, headers=headers).status_code == 200
+    _assert_current(db, user["id"])
+
+    workout = client.post("/training/session/start", params={"plan_id": "upper_a"}, headers=headers).json()
+    set_ids = []
+    for order, weight in enumerate((60, 70, 80), start=1):
+        resp = client.post("/training/set", json={"workout_id": workout["id"], "exercise_id": str(exercise),
+                                                   "set_order": order, "weight_kg": weight, "reps": 8, "rpe": 8},
+                           headers=headers)
+        assert resp.status_code == 200, resp.text
+        set_ids.append(resp.json()["set"]["id"])
+    _assert_current(db, user["id"])
+    assert client.delete(f"/training/set/{set_ids[0]}", headers=headers).status_code == 200
+    assert client.post("/training/session/finish", params={"workout_id": workout["id"]}, headers=headers).status_code == 200
+    _assert_current(db, user["id"])
+
+    logged = client.post("/nutrition/log", json={"name": "Lunch", "calories": 900, "protein": 60, "carbs": 90, "fats": 30},
+                         headers=headers).json()
+    client.post("/nutrition/log", json={"name": "Snack", "calories": 300, "protein": 20, "carbs": 30, "fats": 10},
+                headers=headers)
+    resp = client.post("/nutrition/meals", json={"meal_name": "Dinner", "items": [
+        {"name": "Steak", "calories": 1100, "protein": 90}, {"name": "Rice", "calories": 300, "carbs": 60},
+    ]}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    _assert_current(db, user["id"])
+    assert client.delete(f"/nutrition/log/{logged['id']}", headers=headers).status_code == 200
+    _assert_current(db, user["id"])
+
+    # None of this needed a recompute job
+    assert _queued_refreshes(db, user["id"]) == 0
+
+    stored = _rows(db, user["id"])
+    week = stored[("week", rollups.week_start(date.today()))]
+    assert week["workouts"] == 1 and week["sets"] == 2 and week["volume_kg"] == pytest.approx((70 + 80) * 8)
+    assert week["days_logged"] == 1 and week["calories_sum"] == 1700
+
+def test_backdated_orm_writes(user, db, exercise):
+    """Workouts and sets added, moved and deleted through the session, in past weeks."""
+    user_id = user["id"]
+    monday = rollups.week_start(date.today()) - timedelta(days=14)
+    start = datetime.combine(monday, datetime.min.time()) + timedelta(hours=7)
+    workout = models.Workouts(user_id=user_id, start_time=start, end_time=start + timedelta(minutes=50))
+    db.add(workout)
+    db.add_all([models.WorkoutSets(workout=workout, exercise_id=exercise, set_order=i, weight_kg=100, reps=5,
+                                   is_warmup=(i == 1)) for i in range(1, 4)])
+    db.add(models.DailyLog(user_id=user_id, date=monday, calories_actual=2400, protein_actual=170,
+                           carbs_actual=250, fats_actual=70))
+    db.commit()
+    _assert_current(db, user_id)
+
+    # Move the workout to the previous week and change a set
+    workout.start_time = start - timedelta(days=3)
+    workout.end_time = workout.start_time + timedelta(minutes=40)
+    workout.sets[1].reps = 3
+    db.commit()
+    _assert_current(db, user_id)
+
+    db.add(models.UserStats(user_id=user_id, date=monday - timedelta(days=1), weight_kg=90, tdee_current=2300))
+    db.delete(workout.sets[2])
+    db.commit()
+    _assert_current(db, user_id)
+    assert _queued_refreshes(db, user_id) == 0
+
+def test_goal_change_is_recomputed_by_a_job(client, user, db, run_jobs):
+    headers = user["headers"]
+    client.post("/nutrition/log", json={"name": "Lunch", "calories": 2000, "protein": 150, "carbs": 200, "fats": 60},
+                headers=headers)
+    resp = client.put("/user/onboarding", json={"age": 30, "gender": "male", "height_cm": 180, "weight_kg": 80,
+                                                "activity_level": "moderate", "goal": "cut"}, headers=headers)
+    assert resp.status_code == 200, resp.text
+    assert _queued_refreshes(db, user["id"]) == 1
+
+    run_jobs()
+    assert _queued_refreshes(db, user["id"]) == 0
+    _assert_current(db, user["id"])
+
+def test_other_commits_do_no_rollup_work(client, user):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        resp = client.post("/training/plans", params={"name": "Plain"}, headers=user["headers"])
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert resp.status_code == 200, resp.text
+    assert not [s for s in statements if "user_rollups" in s or "background_jobs" in s]
@@ -0,0 +1,76 @@
+"""Rolling acute/chronic load sums: kept incrementally, they match a scan of the day rows."""
+from datetime import date, timedelta
+
+import pytest
+
+from backend import database, models, workload
+
+START = date(2024, 5, 1)
+
+def _state(db, user_id):
+    db.expire_all()
+    return db.query(models.WorkloadState).filter(models.WorkloadState.user_id == user_id).one()
+
+def _assert_matches_scan(db, user_id, day):
+    acute, chronic, _ = workload.current(db, user_id, day)
+    assert (acute, chronic) == pytest.approx(workload._sums_from_days(db, user_id, day))
+
+def test_sums_follow_adds_and_moves(user, db):
+    user_id = user["id"]
+    workload.add(db, user_id, START, 1000)
+    assert workload.current(db, user_id, START) == (1000, 1000, START)
+
+    # Days inside and outside the windows, a day added twice, and a set taken back
+    for offset, load in ((2, 500), (2, 250), (9, 800), (20, 300), (31, 400)):
+        workload.add(db, user_id, START + timedelta(days=offset), load)
+        _assert_matches_scan(db, user_id, START + timedelta(days=offset))
+    workload.add(db, user_id, START + timedelta(days=20), -300, -1)
+    db.commit()
+
+    for offset in (31, 32, 40, 60, 100):
+        _assert_matches_scan(db, user_id, START + timedelta(days=offset))
+    db.commit()
+
+    day_row = db.query(models.TrainingLoad).filter(models.TrainingLoad.user_id == user_id,
+                                                    models.TrainingLoad.date == START + timedelta(days=2)).one()
+    assert (day_row.load, day_row.sets) == (750, 2)
+    assert workload.history_start(db, user_id) == START
+
+def test_past_days_leave_the_state(user, db):
+    user_id = user["id"]
+    for offset in range(0, 40, 3):
+        workload.add(db, user_id, START + timedelta(days=offset), 100 + offset)
+    workload.current(db, user_id, START + timedelta(days=39))
+    _assert_matches_scan(db, user_id, START + timedelta(days=10))
+    assert _state(db, user_id).as_of == START + timedelta(days=39)
+
+    # A set logged for a past day inside the windows is added to the current sums
+    workload.add(db, user_id, START + timedelta(days=35), 90)
+    _assert_matches_scan(db, user_id, START + timedelta(days=39))
+
+def test_baseline_starts_at_the_first_load(user, db):
+    user_id = user["id"]
+    workload.add(db, user_id, START + timedelta(days=5), 200)
+    assert workload.current(db, user_id, START + timedelta(days=6))[2] == START + timedelta(days=5)
+    # An earlier day logged later moves the baseline back
+    workload.add(db, user_id, START + timedelta(days=1), 100)
+    assert _state(db, user_id).since == START + timedelta(days=1)
+
+def test_concurrently_built_state_is_reused(user, db, monkeypatch):
+    """Both requests find no state; the one that inserts second must read the other's row, not fail."""
+    user_id = user["id"]
+    workload.add(db, user_id, START, 500)
+    db.commit()
+    scan = workload._sums_from_days
+
+    def other_request_first(session, uid, day):
+        monkeypatch.setattr(workload, "_sums_from_days", scan)
+        with database.SessionLocal() as other:
+            workload.current(other, uid, day)
+            other.commit()
+        return scan(session, uid, day)
+
+    monkeypatch.setattr(workload, "_sums_from_days", other_request_first)
+    assert workload.current(db, user_id, START) == (500, 500, START)
+    db.commit()
+    assert db.query(models.WorkloadState).filter(models.WorkloadState.user_id == user_id).count() == 1
@@ -0,0 +1,331 @@
+"""Training load and readiness from the acute:chronic workload ratio.
+
+Every working set adds load = weight_kg * reps * RPE / 10 (RPE 7.5 when not given) to its
+day in training_load. Per user, workload_state keeps the rolling sums of the last 7 days
+(acute) and 28 days (chronic) up to as_of: a new set adds to them, a deleted one subtracts,
+and moving as_of forward reads only the days that slid into or out of each window, so
+nothing ever rescans the user's history.
+
+The readiness score (0-100) weighs, over the parts that have data:
+
+- load       60%  acute load vs. the chronic weekly average: 100 between 0.8 and 1.3,
+                  falling to 0 at 2.0, and slowly below 0.8 (detraining); left out until
+                  the user has CHRONIC_DAYS of load history, as there is no baseline before
+- nutrition  25%  last 7 logged days on calorie/protein target (same rules as backend.rollups)
+- body       15%  weight trend over 14 days: losing more than 1% a week lowers it
+
+POST /training/session/start stores it on the workout; GET /training/readiness returns it
+per day. Imports call recompute() for the days they touched. Backfill existing data with
+
+    python -m backend.workload rebuild [--email someone@example.com]
+"""
+import argparse
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from . import models, rollups
+from .database import SessionLocal, upsert
+
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+DEFAULT_RPE = 7.5
+
+WEIGHTS = {"load": 0.60, "nutrition": 0.25, "body": 0.15}
+SWEET_SPOT = (0.8, 1.3)
+MAX_WEEKLY_LOSS = 0.01  # share of body weight
+
+def set_load(weight_kg, reps, rpe, is_warmup=False) -> float:
+    if is_warmup or not weight_kg or not reps or weight_kg <= 0 or reps <= 0:
+        return 0.0
+    return weight_kg * reps * (rpe or DEFAULT_RPE) / 10
+
+def _as_date(value) -> Optional[date]:
+    if value is None or type(value) is date:
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value)[:10])  # func.date() gives strings on SQLite
+
+def _day_loads(db: Session, user_id, first: date, last: date) -> dict:
+    return {
+        _as_date(day): load or 0.0 for day, load in db.execute(
+            select(models.TrainingLoad.date, models.TrainingLoad.load).where(
+                models.TrainingLoad.user_id == user_id,
+                models.TrainingLoad.date >= first, models.TrainingLoad.date <= last
+            )
+        )
+    }
+
+def _window_sums(loads: dict, day: date) -> tuple:
+    acute = sum(load for d, load in loads.items() if day - timedelta(days=ACUTE_DAYS) < d <= day)
+    chronic = sum(load for d, load in loads.items() if day - timedelta(days=CHRONIC_DAYS) < d <= day)
+    return acute, chronic
+
+def _sums_from_days(db: Session, user_id, day: date) -> tuple:
+    return _window_sums(_day_loads(db, user_id, day - timedelta(days=CHRONIC_DAYS - 1), day), day)
+
+def _first_day(db: Session, user_id) -> Optional[date]:
+    T = models.TrainingLoad
+    return _as_date(db.execute(select(func.min(T.date)).where(T.user_id == user_id, T.load > 0)).scalar())
+
+def history_start(db: Session, user_id) -> Optional[date]:
+    """The user's first day with training load."""
+    since = db.execute(select(models.WorkloadState.since).where(models.WorkloadState.user_id == user_id)).first()
+    return _as_date(since[0]) if since is not None and since[0] is not None else _first_day(db, user_id)
+
+# ---------- Keeping the sums current ----------
+
+def current(db: Session, user_id, day: date) -> tuple:
+    """(acute, chronic, first day with load) for the windows ending on day, moving the state forward to it."""
+    S = models.WorkloadState
+    for _ in range(3):
+        state = db.execute(select(S.as_of, S.since, S.acute, S.chronic).where(S.user_id == user_id)).first()
+        if state is None:
+            acute, chronic = _sums_from_days(db, user_id, day)
+            since = _first_day(db, user_id)
+            # A concurrent request may build the state first: keep its row and read that instead
+            if db.execute(
+                upsert(db, S).values(user_id=user_id, as_of=day, since=since, acute=acute, chronic=chronic,
+                                     updated_at=datetime.utcnow())
+                .on_conflict_do_nothing(index_elements=[S.user_id]).returning(S.id)
+            ).first() is not None:
+                return acute, chronic, since
+            continue
+        as_of, since = _as_date(state.as_of), _as_date(state.since)
+        if as_of == day:
+            return state.acute, state.chronic, since
+        if as_of > day:
+            return (*_sums_from_days(db, user_id, day), since)  # a past day: leave the state where it is
+        if (day - as_of).days >= CHRONIC_DAYS:
+            acute, chronic = _sums_from_days(db, user_id, day)
+        else:
+            # Only the days leaving or entering a window change the sums
+            gap = (day - as_of).days
+            entering = [as_of + timedelta(days=i + 1) for i in range(gap)]
+            leaving_acute = [d - timedelta(days=ACUTE_DAYS) for d in entering]
+            leaving_chronic = [d - timedelta(days=CHRONIC_DAYS) for d in entering]
+            loads = {
+                _as_date(d): load or 0.0 for d, load in db.execute(
+                    select(models.TrainingLoad.date, models.TrainingLoad.load).where(
+                        models.TrainingLoad.user_id == user_id,
+                        models.TrainingLoad.date.in_(entering + leaving_acute + leaving_chronic)
+                    )
+                )
+            }
+            added = sum(loads.get(d, 0.0) for d in entering)
+            acute = state.acute + added - sum(loads.get(d, 0.0) for d in leaving_acute)
+            chronic = state.chronic + added - sum(loads.get(d, 0.0) for d in leaving_chronic)
+        # Conditional on as_of, so a concurrent move forward wins and this one retries
+        if db.execute(
+            update(S).where(S.user_id == user_id, S.as_of == as_of)
+            .values(as_of=day, acute=acute, chronic=chronic, updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount:
+            return acute, chronic, since
+    return (*_sums_from_days(db, user_id, day), _first_day(db, user_id))
+
+def add(db: Session, user_id, day: date, load: float, sets: int = 1):
+    """Add a day's load (negative to take it back); staged in db's transaction."""
+    if not load and not sets:
+        return
+    T, S = models.TrainingLoad, models.WorkloadState
+    # Insert or increment in one statement, so concurrent sets for the same day neither lose an
+    # update nor collide on the day's unique row
+    stmt = upsert(db, T).values(user_id=user_id, date=day, load=load, sets=sets)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[T.user_id, T.date],
+        set_={"load": T.load + stmt.excluded.load, "sets": T.sets + stmt.excluded.sets},
+    ))
+    for _ in range(3):
+        state = db.execute(select(S.as_of, S.since).where(S.user_id == user_id)).first()
+        if state is None:
+            return  # the state is built from the day rows when first needed
+        as_of, since = _as_date(state.as_of), _as_date(state.since)
+        if load > 0 and (since is None or day < since):
+            db.execute(update(S).where(S.user_id == user_id, or_(S.since.is_(None), S.since > day))
+                       .values(since=day).execution_options(synchronize_session=False))
+        if day > as_of:
+            current(db, user_id, day)  # moving forward picks up the new day row
+            return
+        acute = load if day > as_of - timedelta(days=ACUTE_DAYS) else 0.0
+        chronic = load if day > as_of - timedelta(days=CHRONIC_DAYS) else 0.0
+        if not chronic:
+            return
+        if db.execute(
+            update(S).where(S.user_id == user_id, S.as_of == as_of)
+            .values(acute=S.acute + acute, chronic=S.chronic + chronic)
+            .execution_options(synchronize_session=False)
+        ).rowcount:
+            return
+    db.execute(delete(S).where(S.user_id == user_id))  # rebuilt from the day rows next time
+
+def add_set(db: Session, user_id, workout_set: models.WorkoutSets, day: date):
+    load = set_load(workout_set.weight_kg, workout_set.reps, workout_set.rpe, workout_set.is_warmup)
+    if load:
+        add(db, user_id, day, load)
+
+def remove_set(db: Session, user_id, workout_set: models.WorkoutSets, day: date):
+    load = set_load(workout_set.weight_kg, workout_set.reps, workout_set.rpe, workout_set.is_warmup)
+    if load:
+        add(db, user_id, day, -load, -1)
+
+def recompute(db: Session, user_id, first: Optional[date] = None, last: Optional[date] = None) -> int:
+    """Rebuild the day loads for [first, last] (all history when first is None) from the sets;
+    staged in db's transaction."""
+    T, S, W, WS = models.TrainingLoad, models.WorkloadState, models.Workouts, models.WorkoutSets
+    workout_day = func.date(W.start_time)
+    query = (
+        select(workout_day, func.count(WS.id),
+               func.sum(WS.weight_kg * WS.reps * func.coalesce(func.nullif(WS.rpe, 0), DEFAULT_RPE) / 10))
+        .join(W, WS.workout_id == W.id)
+        .where(W.user_id == user_id, WS.is_warmup.isnot(True), WS.weight_kg > 0, WS.reps > 0)
+        .group_by(workout_day)
+    )
+    stale = delete(T).where(T.user_id == user_id)
+    if first is not None:
+        query = query.where(W.start_time >= datetime.combine(first, datetime.min.time()),
+                            W.start_time < datetime.combine(last + timedelta(days=1), datetime.min.time()))
+        stale = stale.where(T.date >= first, T.date <= last)
+    rows = [
+        {"user_id": user_id, "date": _as_date(day), "sets": sets, "load": load or 0.0}
+        for day, sets, load in db.execute(query)
+    ]
+    db.execute(stale)
+    if rows:
+        db.execute(insert(T), rows)
+    db.execute(delete(S).where(S.user_id == user_id))
+    return len(rows)
+
+# ---------- Readiness ----------
+
+def load_score(acute: float, chronic: float) -> Optional[float]:
+    if chronic <= 0:
+        return None  # no baseline yet
+    ratio = acute / (chronic * ACUTE_DAYS / CHRONIC_DAYS)
+    low, high = SWEET_SPOT
+    if ratio < low:
+        return 100 - (low - ratio) * 50
+    if ratio <= high:
+        return 100.0
+    return max(0.0, 100 - (ratio - high) * 100 / (2.0 - high))
+
+def nutrition_score(days: list) -> Optional[float]:
+    """days: (calories, protein, targets) per logged day."""
+    if not days:
+        return None
+    points = 0.0
+    for calories, protein, targets in days:
+        if abs(calories - targets["calories"]) <= rollups.CALORIE_TOLERANCE * targets["calories"]:
+            points += 0.5
+        if protein >= rollups.PROTEIN_MIN_RATIO * targets["protein"]:
+            points += 0.5
+    return 100 * points / len(days)
+
+def body_score(weights: list) -> Optional[float]:
+    """weights: (date, weight_kg) over the last two weeks, oldest first."""
+    if len(weights) < 2 or (weights[-1][0] - weights[0][0]).days < 5:
+        return None
+    (first_day, first), (last_day, last) = weights[0], weights[-1]
+    weekly_loss = (first - last) / first / ((last_day - first_day).days / 7)
+    if weekly_loss <= MAX_WEEKLY_LOSS:
+        return 100.0
+    return max(0.0, 100 - (weekly_loss - MAX_WEEKLY_LOSS) * 5000)  # 2% a week: 50
+
+def combine(parts: dict) -> Optional[int]:
+    present = {name: value for name, value in parts.items() if value is not None}
+    if not present:
+        return None
+    total = sum(WEIGHTS[name] for name in present)
+    return round(sum(WEIGHTS[name] * value for name, value in present.items()) / total)
+
+def _inputs(db: Session, user: models.User, first: date, last: date) -> dict:
+    """Everything the scores of [first, last] need, in four bounded queries."""
+    user_id = user.id
+    loads = _day_loads(db, user_id, first - timedelta(days=CHRONIC_DAYS - 1), last)
+    eaten = {
+        _as_date(day): (calories or 0, protein or 0) for day, calories, protein in db.execute(
+            select(models.DailyLog.date, models.DailyLog.calories_actual, models.DailyLog.protein_actual).where(
+                models.DailyLog.user_id == user_id,
+                models.DailyLog.date > first - timedelta(days=ACUTE_DAYS), models.DailyLog.date <= last
+            )
+        )
+    }
+    stat = models.UserStats
+    columns = (stat.date, stat.tdee_current, stat.weight_kg)
+    window_start = first - timedelta(days=14)
+    stats = db.execute(
+        select(*columns).where(stat.user_id == user_id, stat.date < window_start)
+        .order_by(stat.date.desc()).limit(1)
+    ).all()[::-1] + db.execute(
+        select(*columns).where(stat.user_id == user_id, stat.date >= window_start, stat.date <= last)
+        .order_by(stat.date)
+    ).all()
+    stats = [(_as_date(day), tdee, weight) for day, tdee, weight in stats]
+    goal = (user.settings or {}).get("goal", "maintain")
+    return {"loads": loads, "eaten": eaten, "stats": stats, "stat_days": [s[0] for s in stats], "goal": goal}
+
+def _point(inputs: dict, day: date, sums: Optional[tuple] = None) -> dict:
+    acute, chronic = sums or _window_sums(inputs["loads"], day)
+    since = inputs["since"]
+    baseline = since is not None and (day - since).days + 1 >= CHRONIC_DAYS
+    stats, stat_days = inputs["stats"], inputs["stat_days"]
+    logged = []
+    for offset in range(ACUTE_DAYS):
+        d = day - timedelta(days=offset)
+        calories, protein = inputs["eaten"].get(d, (0, 0))
+        if calories > 0:
+            i = bisect_right(stat_days, d) - 1
+            _, tdee, weight = stats[i] if i >= 0 else (None, None, None)
+            targets = rollups.macro_targets(tdee, weight, inputs["goal"], inputs["loads"].get(d, 0) > 0)
+            logged.append((calories, protein, targets))
+    weights = [(d, w) for d, _, w in stats if w and day - timedelta(days=14) <= d <= day]
+    parts = {"load": load_score(acute, chronic) if baseline else None, "nutrition": nutrition_score(logged), "body": body_score(weights)}
+    weekly_chronic = chronic * ACUTE_DAYS / CHRONIC_DAYS
+    return {
+        "date": day,
+        "acute_load": round(acute, 1),
+        "chronic_load": round(weekly_chronic, 1),
+        "acwr": round(acute / weekly_chronic, 2) if baseline and weekly_chronic > 0 else None,
+        "load_score": round(parts["load"]) if parts["load"] is not None else None,
+        "nutrition_score": round(parts["nutrition"]) if parts["nutrition"] is not None else None,
+        "body_score": round(parts["body"]) if parts["body"] is not None else None,
+        "score": combine(parts),
+    }
+
+def readiness(db: Session, user: models.User, day: date) -> dict:
+    """Today's readiness, from the incrementally kept load sums."""
+    acute, chronic, since = current(db, user.id, day)
+    inputs = _inputs(db, user, day, day)
+    inputs["since"] = since
+    return _point(inputs, day, (acute, chronic))
+
+def series(db: Session, user: models.User, first: date, last: date) -> list:
+    inputs = _inputs(db, user, first, last)
+    inputs["since"] = history_start(db, user.id)
+    return [_point(inputs, first + timedelta(days=i)) for i in range((last - first).days + 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Training load and readiness")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="recompute all day loads from logged sets")
+    rebuild.add_argument("--email", help="only this user")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        query = select(models.User.id)
+        if args.email:
+            query = query.where(models.User.email == args.email)
+        user_ids = db.execute(query).scalars().all()
+    total = 0
+    for user_id in user_ids:
+        with SessionLocal() as db:
+            total += recompute(db, user_id)
+            db.commit()
+    print(f"{total} training days rebuilt for {len(user_ids)} users")
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,7 @@ export default function AICoach() {
     const [messages, setMessages] = useState([]);
     const [input, setInput] = useState('');
     const [loading, setLoading] = useState(false);
+    const conversationId = useRef(null);  // the server keeps the conversation's memory
     const lang = i18n.locale?.startsWith('zh') ? 'zh' : 'en';
 
     useEffect(() => {
@@ -52,6 +53,21 @@ export default function AICoach() {
         }
     };
 
+    // What the log job wrote, or null if it failed or is still not done after ~10 s
+    const waitForLogJob = async (jobId) => {
+        for (let i = 0; i < 20; i++) {
+            await new Promise(resolve => setTimeout(resolve, 500));
+            try {
+                const { data: job } = await api.get(`/user/jobs/${jobId}`);
+                if (job.status === 'done') return job.result?.logged || [];
+                if (job.status === 'failed') return null;
+            } catch (e) {
+                return null;
+            }
+        }
+        return null;
+    };
+
     const sendMessage = async (text) => {
         const userText = (text || input).trim();
         if (!userText) return;
@@ -61,15 +77,26 @@ export default function AICoach() {
         setLoading(true);
 
         try {
-            const res = await api.post('/ai/chat', { message: userText, language: lang });
-            const { reply, logged } = res.data;
+            const res = await api.post('/ai/chat', { message: userText, language: lang, conversation_id: conversationId.current });
+            const { reply, log_job_id, conversation_id } = res.data;
+            conversationId.current = conversation_id;
 
             setMessages(prev => [...prev, { role: 'assistant', text: reply }]);
 
-            if (logged === 'food_log') {
-                setMessages(prev => [...prev, { role: 'system', text: i18n.t('ai_logged_food') }]);
-            } else if (logged === 'body_stat') {
-                setMessages(prev => [...prev, { role: 'system', text: i18n.t('ai_logged_body') }]);
+            // The actions are only queued: confirm them once the log job has written them
+            if (log_job_id) {
+                const logged = await waitForLogJob(log_job_id);
+                if (logged === null) {
+                    setMessages(prev => [...prev, { role: 'system', text: `⚠️ ${i18n.t('ai_log_failed')}` }]);
+                } else {
+                    const foods = logged.filter(a => a.type === 'food_log').map(a => a.name);
+                    if (foods.length) {
+                        setMessages(prev => [...prev, { role: 'system', text: `${i18n.t('ai_logged_food')} (${foods.join(', ')})` }]);
+                    }
+                    if (logged.some(a => a.type === 'body_stat')) {
+                        setMessages(prev => [...prev, { role: 'system', text: i18n.t('ai_logged_body') }]);
+                    }
+                }
             }
         } catch (e) {
             const errMsg = e?.response?.data?.detail || 'Error contacting AI.';
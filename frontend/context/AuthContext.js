@@ -22,6 +22,7 @@ export const AuthProvider = ({ children }) => {
             const token = response.data.access_token;
             setUserToken(token);
             await SecureStore.setItemAsync('userToken', token);
+            await SecureStore.setItemAsync('refreshToken', response.data.refresh_token);
             await _fetchUserInfo(token);
             return true;
         } catch (error) {
@@ -36,6 +37,7 @@ export const AuthProvider = ({ children }) => {
             const token = response.data.access_token;
             setUserToken(token);
             await SecureStore.setItemAsync('userToken', token);
+            await SecureStore.setItemAsync('refreshToken', response.data.refresh_token);
             await _fetchUserInfo(token);
             return true;
         } catch (error) {
@@ -50,6 +52,7 @@ export const AuthProvider = ({ children }) => {
             const token = response.data.access_token;
             setUserToken(token);
             await SecureStore.setItemAsync('userToken', token);
+            await SecureStore.setItemAsync('refreshToken', response.data.refresh_token);
             await _fetchUserInfo(token);
             return true;
         } catch (error) {
@@ -59,9 +62,18 @@ export const AuthProvider = ({ children }) => {
     };
 
     const logout = async () => {
+        try {
+            const refreshToken = await SecureStore.getItemAsync('refreshToken');
+            if (refreshToken) {
+                await api.post('/auth/logout', { refresh_token: refreshToken });
+            }
+        } catch (error) {
+            console.log('Logout error', error);
+        }
         setUserToken(null);
         setUserInfo(null);
         await SecureStore.deleteItemAsync('userToken');
+        await SecureStore.deleteItemAsync('refreshToken');
     };
 
     const _fetchUserInfo = async (token) => {
@@ -29,4 +29,43 @@ api.interceptors.request.use(
   }
 );
 
+// On 401, swap the refresh token for a new access token and retry once.
+// A single in-flight refresh is shared so concurrent requests don't rotate the token twice.
+let refreshPromise = null;
+
+const refreshAccessToken = async () => {
+  const refreshToken = await SecureStore.getItemAsync('refreshToken');
+  if (!refreshToken) {
+    throw new Error('No refresh token');
+  }
+  const response = await axios.post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken });
+  await SecureStore.setItemAsync('userToken', response.data.access_token);
+  await SecureStore.setItemAsync('refreshToken', response.data.refresh_token);
+  return response.data.access_token;
+};
+
+api.interceptors.response.use(
+  (response) => response,
+  async (error) => {
+    const original = error.config;
+    const isAuthCall = original && original.url && original.url.startsWith('/auth/');
+    if (error.response && error.response.status === 401 && original && !original._retried && !isAuthCall) {
+      original._retried = true;
+      try {
+        if (!refreshPromise) {
+          refreshPromise = refreshAccessToken().finally(() => {
+            refreshPromise = null;
+          });
+        }
+        const token = await refreshPromise;
+        original.headers.Authorization = `Bearer ${token}`;
+        return api(original);
+      } catch (refreshError) {
+        console.log('Token refresh failed', refreshError);
+      }
+    }
+    return Promise.reject(error);
+  }
+);
+
 export default api;
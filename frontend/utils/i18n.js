@@ -132,6 +132,7 @@ const translations = {
         ai_btn_goals: "🎯 Weekly Goals",
         ai_logged_food: "✅ Food logged automatically!",
         ai_logged_body: "✅ Body stats logged automatically!",
+        ai_log_failed: "Could not log that automatically, please log it by hand.",
         ai_key_label: "Gemini API Key",
         ai_key_placeholder: "Enter your Gemini API key...",
         ai_key_save: "Save Key",
@@ -271,6 +272,7 @@ const translations = {
         ai_btn_goals: "🎯 本週目標",
         ai_logged_food: "✅ 飲食已自動記錄！",
         ai_logged_body: "✅ 身體數據已自動記錄！",
+        ai_log_failed: "無法自動記錄，請手動記錄。",
         ai_key_label: "Gemini API Key",
         ai_key_placeholder: "輸入你的 Gemini API Key...",
         ai_key_save: "儲存",